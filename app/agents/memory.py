@@ -0,0 +1,157 @@
+import asyncio
+import time
+import uuid
+
+from app.core.config import MEMORY_MAX_TURNS, MEMORY_RECENT_TURNS, MEMORY_FOLD_TOKENS
+from app.storage import add_merge, get_user, update_user
+
+# --- CONVERSATION MEMORY ---
+# Each user record carries {"summary": str, "turns": [...], ...}.
+# Turns older than the last MEMORY_RECENT_TURNS are folded into the rolling
+# summary by a background model call once they exceed MEMORY_FOLD_TOKENS or
+# the buffer reaches MEMORY_MAX_TURNS, so the prompt only ever carries the
+# summary plus the recent turns. Only a fold removes turns: nothing leaves
+# the buffer unsummarized unless folds keep failing and it reaches twice
+# MEMORY_MAX_TURNS.
+# Turns are append-only, with a unique id and a timestamp, because any
+# worker may take a chat's next message (sharding only splits reminders).
+# The store merges two copies (_merge) instead of keeping the last one
+# flushed: turns are unioned, and the newer summary wins along with the ids
+# it folded ("folded"), so a turn only the other copy had comes back to be
+# folded later. forget() drops every turn before its "cleared" time.
+
+_FOLDED_KEPT = 4 * MEMORY_MAX_TURNS  # folded ids remembered, so a stale copy cannot bring them back
+_folding = {}  # chat_id -> running fold task, at most one per chat
+_last_at = 0.0
+
+
+def estimate_tokens(text):
+    """Cheap local estimate (~4 characters per token for English)."""
+    return (len(text) + 3) // 4
+
+
+def _now():
+    """time.time(), but strictly increasing, so turns keep their order."""
+    global _last_at
+    _last_at = max(time.time(), _last_at + 1e-6)
+    return _last_at
+
+
+def _shape(memory):
+    """A stored memory (or None, or the older format) with every key set."""
+    memory = memory or {}
+    return {"summary": memory.get("summary", ""),
+            "summary_at": memory.get("summary_at", 0.0),
+            "folded": list(memory.get("folded", [])),
+            "cleared": memory.get("cleared"),
+            "turns": sorted(memory.get("turns", []), key=lambda t: t.get("at", 0.0))}
+
+
+def _merge(stored, local):
+    """Both copies' turns, minus the ones the newer summary folded or that
+    came before the latest forget()."""
+    stored, local = _shape(stored), _shape(local)
+    newer = local if local["summary_at"] >= stored["summary_at"] else stored
+    cleared = max((c for c in (stored["cleared"], local["cleared"]) if c is not None), default=None)
+    if newer["cleared"] != cleared:
+        newer = {**newer, "summary": ""}  # folded before a forget() it had not seen yet
+    gone = set(newer["folded"])
+    turns = {}
+    for turn in stored["turns"] + local["turns"]:
+        if turn["id"] not in gone and (cleared is None or turn.get("at", 0.0) > cleared):
+            turns[turn["id"]] = turn
+    return {**newer, "cleared": cleared, "turns": sorted(turns.values(), key=lambda t: t.get("at", 0.0))}
+
+
+add_merge("memory", _merge)
+
+
+def _load(chat_id):
+    user = get_user(chat_id) or {}
+    return _shape(user.get("memory"))
+
+
+def remember(chat_id, role, text):
+    """Appends one turn ("user" or "coach"); schedule_fold() makes room."""
+    memory = _load(chat_id)
+    memory["turns"].append({"id": uuid.uuid4().hex[:12], "at": _now(), "role": role, "text": text})
+    if len(memory["turns"]) > 2 * MEMORY_MAX_TURNS:
+        # Last resort while the summarizer is down: bound the row
+        print(f"⚠️ Memory for {chat_id} is not being folded, dropping its oldest turn")
+        dropped = memory["turns"][:-2 * MEMORY_MAX_TURNS]
+        memory["folded"] = (memory["folded"] + [t["id"] for t in dropped])[-_FOLDED_KEPT:]
+        memory["turns"] = memory["turns"][-2 * MEMORY_MAX_TURNS:]
+    update_user(chat_id, memory=memory)
+
+
+def forget(chat_id):
+    """Drops the conversation, e.g. when the user sets a new goal."""
+    now = _now()
+    update_user(chat_id, memory={**_shape(None), "summary_at": now, "cleared": now})
+
+
+def render(chat_id):
+    """The conversation block for a prompt: rolling summary + last K turns."""
+    memory = _load(chat_id)
+    recent = memory["turns"][-MEMORY_RECENT_TURNS:]
+    if not memory["summary"] and not recent:
+        return ""
+    lines = ["CONVERSATION SO FAR:"]
+    if memory["summary"]:
+        lines.append(f"Summary of earlier messages: {memory['summary']}")
+    for turn in recent:
+        speaker = "User" if turn["role"] == "user" else "You"
+        lines.append(f"{speaker}: {turn['text']}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _fold_candidates(memory):
+    older = memory["turns"][:-MEMORY_RECENT_TURNS]
+    if (len(memory["turns"]) < MEMORY_MAX_TURNS
+            and sum(estimate_tokens(t["text"]) for t in older) <= MEMORY_FOLD_TOKENS):
+        return []
+    return older
+
+
+def schedule_fold(chat_id, summarize):
+    """Starts a background fold if the old turns are over budget or the
+    buffer is full.
+
+    `summarize` is an async callable taking a prompt and returning text."""
+    if chat_id in _folding or not _fold_candidates(_load(chat_id)):
+        return
+    task = asyncio.get_running_loop().create_task(_fold(chat_id, summarize))
+    _folding[chat_id] = task
+    task.add_done_callback(lambda _: _folding.pop(chat_id, None))
+
+
+def inflight():
+    """Folds still running (for a graceful shutdown to wait on)."""
+    return list(_folding.values())
+
+
+async def _fold(chat_id, summarize):
+    memory = _load(chat_id)
+    older = _fold_candidates(memory)
+    if not older:
+        return
+    transcript = "\n".join(f"{'User' if t['role'] == 'user' else 'Coach'}: {t['text']}" for t in older)
+    prompt = ("Update the running summary of a coaching chat.\n"
+              f"Current summary: {memory['summary'] or '(none)'}\n"
+              f"New messages:\n{transcript}\n\n"
+              "Return the updated summary in under 80 words. Keep goals, agreed times and "
+              "open questions. PLAIN TEXT ONLY.")
+    try:
+        summary = (await summarize(prompt)).strip()
+    except Exception as e:
+        print(f"⚠️ Memory fold failed for {chat_id}: {e}")
+        return
+
+    # Re-read: new turns may have arrived while the model was working.
+    folded = {t["id"] for t in older}
+    memory = _load(chat_id)
+    memory["summary"] = summary
+    memory["summary_at"] = _now()
+    memory["folded"] = (memory["folded"] + list(folded))[-_FOLDED_KEPT:]
+    memory["turns"] = [t for t in memory["turns"] if t["id"] not in folded]
+    update_user(chat_id, memory=memory)
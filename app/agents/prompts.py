@@ -0,0 +1,88 @@
+from app.agents.memory import estimate_tokens
+from app.core.config import PROMPT_TOKENS_INTAKE, PROMPT_TOKENS_ACTIVE, RESOLUTION_MAX_TOKENS
+from app.core.metrics import PROMPT_TRIMS
+
+# --- STATIC PREAMBLES ---
+# The fixed instruction blocks go to the model as system instructions, so
+# they can be registered once as cached content (see services/context_cache)
+# and only the per-user suffix below is sent with every call.
+
+INTAKE_SYSTEM = (
+    "You are a Habit Strategist.\n"
+    "YOUR JOB: Secure a concrete habit loop (Goal + Time).\n\n"
+    "LOGIC FLOW (Follow Strictly):\n"
+    "1. CHECK TIME IN INPUT: Does the user's *current* message contain a time (e.g. '9am', '11:00')?\n"
+    "2. IF YES (Time Present) + (User Agrees): You MUST LOCK IT.\n"
+    "   -> reply: 'Plan set.', alarm_time: that time.\n"
+    "3. IF NO (Time Missing) + (User says 'Yes'): \n"
+    "   -> Use the time they already gave in the CONVERSATION and LOCK IT. Do NOT ask about the habit.\n"
+    "   -> Only if no time was ever mentioned, ask once for it (e.g., 'What time, e.g. 9am?').\n\n"
+    "OUTPUT: JSON with\n"
+    "- reply: what you say to the user, plain text, no time tag.\n"
+    "- alarm_time: the daily reminder time as 'HH:MM' (24-hour) when you lock it, else empty.\n"
+    "- confidence: 0 to 1, how sure you are that the user agreed to alarm_time.\n"
+)
+
+MENTOR_SYSTEM = (
+    "You are an expert Mentor.\n"
+    "RESPONSE RULES:\n"
+    "1. If user asks for a GUIDE or STEPS: Provide a clear, numbered list (Step 1, Step 2, etc).\n"
+    "2. If user asks a simple question: Keep it direct and short (1-2 sentences).\n"
+    "3. STYLE: Motivational but technical. No fluff.\n"
+    "4. FORMATTING: Use plain text. Use numbers (1.) for lists. Do NOT use **bold** or markdown."
+)
+
+
+# --- PROMPT BUDGETS ---
+# The per-user part of a prompt must fit the phase's token budget, so one
+# pasted essay cannot blow up a call. The resolution is capped on its own;
+# the message keeps its start and end, and the history its newest lines.
+PROMPT_TOKENS = {"intake": PROMPT_TOKENS_INTAKE, "active": PROMPT_TOKENS_ACTIVE}
+_CUT = " [...] "
+
+
+def fit(text, tokens, keep="both"):
+    """`text` cut to about `tokens` estimated tokens, with a marker where it
+    was cut. keep="both" keeps the start and end, keep="end" only the end."""
+    text = text or ""
+    if estimate_tokens(text) <= tokens:
+        return text
+    chars = max(0, tokens * 4 - len(_CUT))
+    if keep == "end":
+        return _CUT.lstrip() + text[len(text) - chars:]
+    head = chars // 2
+    return text[:head] + _CUT + text[len(text) - (chars - head):]
+
+
+def goal(resolution):
+    """The resolution as quoted in any prompt."""
+    return fit(resolution, RESOLUTION_MAX_TOKENS)
+
+
+def _budget(phase, user, history, user_input):
+    """(resolution, history, message) cut to the phase's budget. The message
+    gets whatever the history leaves, but at least half of the room."""
+    fields = {"resolution": (user["resolution"] or "", goal(user["resolution"]))}
+    room = PROMPT_TOKENS[phase] - estimate_tokens(fields["resolution"][1])
+    message = fit(user_input, max(room // 2, room - estimate_tokens(history)))
+    fields["message"] = (user_input or "", message)
+    fields["history"] = (history, fit(history, room - estimate_tokens(message), keep="end"))
+    for field, (before, after) in fields.items():
+        if after != before:
+            PROMPT_TRIMS.inc(phase=phase, field=field)
+    return fields["resolution"][1], fields["history"][1], fields["message"][1]
+
+
+# --- PER-USER SUFFIXES ---
+def intake_prompt(user, history, user_input):
+    resolution, history, user_input = _budget("intake", user, history, user_input)
+    return (f"Current User Resolution in DB: '{resolution}'\n"
+            f"{history}"
+            f"User just said: '{user_input}'")
+
+
+def mentor_prompt(user, history, user_input):
+    resolution, history, user_input = _budget("active", user, history, user_input)
+    return (f"User Goal: {resolution}.\n"
+            f"{history}"
+            f"User Input: '{user_input}'.")
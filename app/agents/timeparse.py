@@ -0,0 +1,81 @@
+import re
+
+# --- LOCAL TIME EXTRACTION ---
+# Intake only needs a daily reminder time. When the user's message is just
+# that time ("7am", "at 18:30", "yes, 9.15 pm works") we can lock it without
+# asking the model. A time inside a longer sentence ("class at 9am and gym
+# after") or anything that could be read two ways goes to the model instead.
+
+_TIME = re.compile(
+    r"(?<![\d:.])(\d{1,2})(?:([:.])(\d{2}))?\s*(a\.?m\.?|p\.?m\.?)?(?![\w:])",
+    re.IGNORECASE,
+)
+_WORDS = {"noon": "12:00", "midday": "12:00", "midnight": "00:00"}
+# Hedges, negations, questions and ranges: not a decision yet.
+_UNSURE = re.compile(
+    r"\?|\b(not|no|don'?t|maybe|or|either|between|until|till|unless|except|instead|later|earlier|"
+    r"around|about|ish|perhaps|depends)\b|\d\s*(-|–|to)\s*\d",
+    re.IGNORECASE,
+)
+# The only other words a message may have: a plain answer or confirmation.
+_CONFIRM = {
+    "yes", "yeah", "yep", "yup", "ok", "okay", "sure", "alright", "great", "perfect", "fine", "good",
+    "sounds", "works", "that", "is", "it", "then", "let's", "lets", "do", "make", "set", "remind", "me",
+    "at", "for", "please", "thanks", "thank", "you", "every", "each", "day", "daily", "o'clock", "oclock",
+}
+
+
+def _to_24h(hour, minute, suffix):
+    """'HH:MM', or None when the parts are not a clock time or could be either half of the day."""
+    hour, minute = int(hour), int(minute or 0)
+    if minute > 59:
+        return None
+    if suffix:
+        if not 1 <= hour <= 12:
+            return None
+        pm = suffix.lower().startswith("p")
+        hour = hour % 12 + (12 if pm else 0)
+    elif hour > 23:
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+
+def extract_time(text):
+    """The reminder time `text` answers with, as 'HH:MM' (24-hour), else None.
+
+    Only for a message that is the time plus at most a confirmation: '7am',
+    'at 18:30', 'yes, 7:30 pm works', 'noon please'. Returns None for a bare
+    number, an 'H:MM' between 1 and 12 with no am/pm, an 'H.MM' with no
+    am/pm ('19.50' may be money), two different times, a range, a hedge, or
+    any other words."""
+    text = text or ""
+    if _UNSURE.search(text):
+        return None
+    found = set()
+    rest, end = [], 0
+    for match in _TIME.finditer(text):
+        hour, separator, minute, suffix = match.groups()
+        if not suffix and minute is None:
+            continue  # a bare number ("3 times a week") is not a time, and stays in `rest`
+        if not suffix and (separator == "." or (1 <= int(hour) <= 12 and not hour.startswith("0"))):
+            return None  # "9:30": morning or evening? "19.50": a price?
+        value = _to_24h(hour, minute, suffix)
+        if value is None:
+            return None
+        found.add(value)
+        rest.append(text[end:match.start()])
+        end = match.end()
+    rest = " ".join(rest + [text[end:]]).lower()
+    for word, value in _WORDS.items():
+        if re.search(rf"\b{word}\b", rest):
+            found.add(value)
+            rest = re.sub(rf"\b{word}\b", " ", rest)
+    if len(found) != 1 or any(word not in _CONFIRM for word in re.findall(r"[a-z']+|\d+", rest)):
+        return None
+    return found.pop()
+
+
+def parse_clock(value):
+    """'7:05' / '07:05' (24-hour) -> '07:05'; anything else -> None."""
+    match = re.fullmatch(r"\s*(\d{1,2}):(\d{2})\s*", value or "")
+    return _to_24h(match.group(1), match.group(2), None) if match else None
@@ -1,21 +1,212 @@
+import asyncio
+import contextvars
+import re
+import time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from telegram import Update
-from telegram.ext import ContextTypes, ConversationHandler
-from app.storage import save_user, get_user
-from app.brain import BRAIN_ENGINE
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from telegram.ext import BaseUpdateProcessor, ContextTypes
+from app import storage
+from app.storage import save_user, get_user, update_user
+from app.brain import engine
+from app.agents import memory
+from app.services.opik_guardrails import GUARDRAILS
+from app.core.config import STREAM_EDIT_INTERVAL, CHAT_DEBOUNCE_SECONDS, SHARD_COUNT
 
-WAITING_FOR_RES = 1
+# --- ONBOARDING ---
+# /start puts the user in the "goal" phase and their next message becomes the
+# resolution. The phase lives in the user's row, not in this process, so it
+# holds whichever worker gets the next update. In sharded mode it is flushed
+# at once, and handle_chat pulls other workers' writes before reading a user.
+GOAL_PHASE = "goal"
+
+async def _sync_store(flush=False):
+    """Sharded mode only: push this worker's writes / pull the others'."""
+    if not SHARD_COUNT:
+        return
+    if flush:
+        await asyncio.to_thread(storage.flush)
+    else:
+        storage.notify(await asyncio.to_thread(storage.pull))  # listeners run on the loop
+
+# --- UPDATE ORDER ---
+# Updates run concurrently, but one chat's updates start in the order they
+# arrived: "/start" is handled before the resolution typed right after it.
+# A handler that stays busy after routing (handle_chat waiting on its
+# reply) calls release_chat() so the chat's next update can come in.
+_release = contextvars.ContextVar("release_chat", default=None)
+
+class ChatOrderedProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates):
+        super().__init__(max_concurrent_updates)
+        self._tails = {}  # chat_id -> event set once the chat's latest update lets the next in
+
+    async def do_process_update(self, update, coroutine):
+        chat = getattr(update, "effective_chat", None)
+        if chat is None:
+            await coroutine
+            return
+        previous = self._tails.get(chat.id)
+        turn = self._tails[chat.id] = asyncio.Event()
+        if previous:
+            await previous.wait()
+        token = _release.set(turn.set)
+        try:
+            await coroutine
+        finally:
+            _release.reset(token)
+            turn.set()
+            if self._tails.get(chat.id) is turn:
+                del self._tails[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+def release_chat():
+    """Lets the current chat's next update start while this handler runs on."""
+    release = _release.get()
+    if release:
+        release()
+
+# --- COALESCING ---
+# chat_id -> the reply being prepared for that chat. A newer message cancels
+# it and takes its texts along, until the brain has started saving the turn
+# (alarm, memory) or the reply has started going out.
+_pending = {}
+
+class _PendingReply:
+    def __init__(self, texts, message, after=None):
+        self.texts = texts
+        self.message = message  # newest message, the one we answer
+        self.after = after      # earlier reply that is already being sent
+        self.committed = False  # True once the brain saves the turn or anything reached the user
+        self.task = None
+
+    def commit(self):
+        self.committed = True
+
+def cancel_replies():
+    """Shutdown ran out of time: cancels every reply still being prepared."""
+    tasks = [p.task for p in _pending.values() if p.task and not p.task.done()]
+    for task in tasks:
+        task.cancel()
+    return len(tasks)
+
+# A trailing word or number may still be growing (an email or phone number
+# is only caught by the PII check once complete), so previews leave it out.
+_UNFINISHED = re.compile(r"[+(]?\d[\d ().-]*$|\S+$")
+
+def _preview(text):
+    """What to show mid-stream: no **bold**, no half-written ALARM tag or word."""
+    return _UNFINISHED.sub("", text.split("ALARM:")[0].replace("**", "")).strip()
+
+def _retry_after(error):
+    delay = error.retry_after  # int or timedelta, depending on the PTB version
+    return delay.total_seconds() if hasattr(delay, "total_seconds") else float(delay)
+
+def _not_modified(error):
+    return isinstance(error, BadRequest) and "not modified" in str(error).lower()
+
+async def _finish(message, sent, text, attempts=3):
+    """The final edit must land: waits out flood limits and network errors,
+    and sends `text` as a new message if the preview cannot be edited."""
+    for attempt in range(attempts):
+        try:
+            await sent.edit_text(text)
+            return
+        except RetryAfter as e:
+            await asyncio.sleep(_retry_after(e))
+        except BadRequest as e:
+            if _not_modified(e):
+                return  # already showing it
+            break       # e.g. the preview was deleted
+        except TelegramError:
+            await asyncio.sleep(1 + attempt)
+    await message.reply_text(text)
+
+async def reply_streaming(message, state, on_reply=None):
+    """Runs the brain and replies progressively.
+
+    The first chunk is sent as soon as it arrives, later chunks are folded in
+    with edits at most every STREAM_EDIT_INTERVAL seconds, and the final edit
+    uses the brain's fully parsed response. A failed preview edit is skipped;
+    the final edit is retried (see _finish). `on_reply` is called once the
+    reply must not be dropped any more: when the brain starts saving this
+    turn (alarm, memory), or right before the first message is sent. Each preview passes the local output
+    guardrails first; after one fails, nothing more is shown until the final
+    (replaced) reply. With remote checks the reply is not streamed."""
+    sent = None
+    shown = ""
+    streamed = ""
+    last_edit = 0.0
+    final = None
+    previews = GUARDRAILS.previews
+
+    config = {"configurable": {"on_commit": on_reply}} if on_reply else None
+    async for mode, payload in engine().astream(state, config=config, stream_mode=["custom", "values"]):
+        if mode == "values":
+            final = payload.get("response") or final
+            continue
+
+        if not previews:
+            continue
+        streamed += payload.get("chunk", "")
+        text = _preview(streamed)
+        now = time.monotonic()
+        if not text or text == shown:
+            continue
+        if GUARDRAILS.screen(text):
+            previews = False  # the final reply is the guardrail's replacement
+            continue
+        if sent is None:
+            if on_reply:
+                on_reply()
+            sent = await message.reply_text(text)
+        elif now >= last_edit + STREAM_EDIT_INTERVAL:
+            # A failed preview edit is skipped; later edits and the final one catch up
+            try:
+                await sent.edit_text(text)
+            except RetryAfter as e:
+                last_edit = now + _retry_after(e)  # no more previews until the flood limit lifts
+                continue
+            except TelegramError as e:
+                if not _not_modified(e):
+                    last_edit = now
+                    continue
+        else:
+            continue
+        shown, last_edit = text, now
+
+    if not final:
+        return
+    if sent is None:
+        if on_reply:
+            on_reply()
+        await message.reply_text(final)
+    elif final != shown:
+        await _finish(message, sent, final)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    await _sync_store()
+    current = get_user(chat_id) or {}
+    # Reminders pause until the new goal's intake sets a time again
+    save_user(chat_id, update.effective_user.first_name, current.get("resolution"), phase=GOAL_PHASE)
+    await _sync_store(flush=True)
     await update.message.reply_text("👋 I am ResolveAI. <b>What is your Resolution?</b>", parse_mode="HTML")
-    return WAITING_FOR_RES
 
 async def save_goal(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Save with phase="intake" to start the interview process
     save_user(update.effective_chat.id, update.effective_user.first_name, update.message.text, phase="intake")
+    memory.forget(update.effective_chat.id)  # a new goal starts a fresh conversation
+    await _sync_store(flush=True)
     await update.message.reply_text("✅ <b>Goal Locked.</b> Let's build a plan to achieve this.", parse_mode="HTML")
     
     # Trigger the first interview question immediately
-    result = BRAIN_ENGINE.invoke({
+    result = await engine().ainvoke({
         "chat_id": update.effective_chat.id, 
         "user_input": "I just set my goal.", 
         "is_proactive": False,
@@ -23,21 +214,65 @@ async def save_goal(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "phase": "intake"
     })
     await update.message.reply_text(result["response"])
-    return ConversationHandler.END
+
+async def _answer(chat_id, pending):
+    """Waits out the debounce window, then answers every buffered text at once."""
+    try:
+        await asyncio.sleep(CHAT_DEBOUNCE_SECONDS)
+        if pending.after:
+            await asyncio.wait([pending.after])  # keep replies (and memory) in order
+        # Call the Brain (streams the reply when the brain streams)
+        await reply_streaming(pending.message, {
+            "chat_id": chat_id,
+            "user_input": "\n".join(pending.texts),
+            "is_proactive": False,
+            "response": None,
+            "phase": "active" # The brain will check the DB to see the real phase
+        }, on_reply=pending.commit)
+    finally:
+        if _pending.get(chat_id) is pending:
+            del _pending[chat_id]
 
 async def handle_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    if not get_user(chat_id):
+    await _sync_store()
+    user = get_user(chat_id)
+    if not user:
         await update.message.reply_text("Type /start first!")
         return
+    if user.get("phase") == GOAL_PHASE:
+        await save_goal(update, context)
+        return
 
-    # Call the Brain
-    result = BRAIN_ENGINE.invoke({
-        "chat_id": chat_id, 
-        "user_input": update.message.text, 
-        "is_proactive": False,
-        "response": None,
-        "phase": "active" # The brain will check the DB to see the real phase
-    })
-    
-    await update.message.reply_text(result["response"])
\ No newline at end of file
+    # Bursts of short messages get one answer: a reply nobody has seen yet is
+    # cancelled (model call included) and restarted with the new text merged in.
+    previous = _pending.get(chat_id)
+    if previous and not previous.committed:
+        previous.task.cancel()
+        pending = _PendingReply(previous.texts + [update.message.text], update.message, previous.after)
+    else:
+        pending = _PendingReply([update.message.text], update.message, previous.task if previous else None)
+    _pending[chat_id] = pending
+    pending.task = asyncio.create_task(_answer(chat_id, pending))
+    release_chat()  # the next message may now merge into this reply
+
+    try:
+        await pending.task
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            raise  # we are being shut down, not superseded
+
+async def set_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/timezone Europe/Berlin -- reminders fire at reminder_time in this zone."""
+    chat_id = update.effective_chat.id
+    if not get_user(chat_id):
+        await update.message.reply_text("Type /start first!")
+        return
+    name = " ".join(context.args or []).strip()
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        await update.message.reply_text("Send it like: /timezone Europe/London")
+        return
+    update_user(chat_id, timezone=name)
+    await update.message.reply_text(f"🌍 Timezone set to {name}.")
@@ -1,37 +1,297 @@
+import asyncio
+import json
 import os
 import re
+import time
 from typing import TypedDict
+import httpx
 from google import genai
+from google.genai import types
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
 from dotenv import load_dotenv
+from app.agents import memory
+from app.agents.prompts import INTAKE_SYSTEM, MENTOR_SYSTEM, PROMPT_TOKENS, fit, goal, intake_prompt, mentor_prompt
+from app.agents.timeparse import extract_time, parse_clock
+from app.core.metrics import BRAIN_LATENCY, ALARM_LOCKS, Gauge
+from app.core.config import (GEMINI_BASE_URL, GEMINI_MAX_CONNECTIONS, GEMINI_TIMEOUT,
+                             GEMINI_MODELS, MODEL_FAILURE_THRESHOLD, MODEL_PROBE_INTERVAL,
+                             MODEL_RANKING_FILE, MODEL_RANKING_MAX_AGE,
+                             CONTEXT_CACHE, CONTEXT_CACHE_TTL, CONTEXT_CACHE_RETRY, CONTEXT_CACHE_MIN_CHARS,
+                             LLM_CONCURRENCY, INTERACTIVE_CONCURRENCY, INTAKE_CONCURRENCY,
+                             PROACTIVE_CONCURRENCY, BACKGROUND_CONCURRENCY, INTAKE_LOCK_CONFIDENCE,
+                             OUTPUT_TOKENS_INTAKE, OUTPUT_TOKENS_ACTIVE, OUTPUT_TOKENS_PROACTIVE)
+from app.services.context_cache import ContextCache
+from app.services.llm_queue import LLMWorkQueue
+from app.services.model_router import ModelRouter, load_ranking, rank_models
+from app.services.opik_guardrails import GUARDRAILS, PASS
+from app.services.similarity_cache import MENTOR_CACHE
 from app.storage import get_user, save_user
 
 load_dotenv()
 
 # --- CONFIGURATION ---
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+# The HTTP session, genai client, router and compiled graph are built on
+# first use, not at import; main warms them in the background at boot so
+# the health route never waits on them. They are still reachable as brain.http_session / client / ROUTER / BRAIN_ENGINE.
+_http_session = None
+_router = None
+_engine = None
 
-# 🚀 FAIL-SAFE GENERATION
-# 1. Try 'gemini-1.5-flash' for speed (0.5s).
-# 2. If it fails (404/Permission), auto-switch to 'gemini-3-pro-preview' (Your verified model).
-def generate_safe(prompt_text):
-    try:
-        response = client.models.generate_content(
-            model="gemini-1.5-flash", 
-            contents=prompt_text
+def router():
+    global _router, _http_session
+    if _router is None:
+        # One pooled HTTP session shared by every async model call, so concurrent
+        # chats reuse keep-alive connections instead of opening their own.
+        _http_session = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=GEMINI_MAX_CONNECTIONS,
+                                max_keepalive_connections=GEMINI_MAX_CONNECTIONS),
+            timeout=GEMINI_TIMEOUT,
+        )
+        client = genai.Client(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            http_options=types.HttpOptions(
+                base_url=GEMINI_BASE_URL,
+                timeout=int(GEMINI_TIMEOUT * 1000),  # milliseconds, applied per request
+                httpx_async_client=_http_session,
+            ),
         )
-        return response.text
-    except Exception:
-        print("⚠️ Flash failed. Switching to Gemini 3 Preview...")
+        # 🚀 FAIL-SAFE GENERATION
+        # The router walks GEMINI_MODELS in order but skips any model whose circuit
+        # is open, so a dead model no longer costs every request a failed round trip.
+        # Static system prompts are sent once as cached content, not per call.
+        contexts = ContextCache(client, CONTEXT_CACHE_TTL, CONTEXT_CACHE_RETRY, enabled=CONTEXT_CACHE,
+                                min_chars=CONTEXT_CACHE_MIN_CHARS)
+        models = GEMINI_MODELS
+        ranking = load_ranking(MODEL_RANKING_FILE, MODEL_RANKING_MAX_AGE)
+        if ranking:
+            models = rank_models(GEMINI_MODELS, ranking)
+            print(f"🧭 Model order from {MODEL_RANKING_FILE}: {', '.join(models)}")
+        _router = ModelRouter(client, models,
+                              failure_threshold=MODEL_FAILURE_THRESHOLD,
+                              probe_interval=MODEL_PROBE_INTERVAL,
+                              contexts=contexts)
+    return _router
+
+def engine():
+    global _engine
+    if _engine is None:
+        _engine = workflow.compile()
+    return _engine
+
+def __getattr__(name):
+    if name == "ROUTER":
+        return router()
+    if name == "client":
+        return router().client
+    if name == "http_session":
+        router()
+        return _http_session
+    if name == "BRAIN_ENGINE":
+        return engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Every model call takes a slot here first: live chats go ahead of intake,
+# intake ahead of the proactive burst, and memory folds go last.
+LLM_QUEUE = LLMWorkQueue(LLM_CONCURRENCY, {
+    "interactive": INTERACTIVE_CONCURRENCY,
+    "intake": INTAKE_CONCURRENCY,
+    "proactive": PROACTIVE_CONCURRENCY,
+    "background": BACKGROUND_CONCURRENCY,
+})
+Gauge("resolveai_llm_queue_depth", "Model calls waiting for a slot, by priority class.",
+      lambda: {(name,): c["queued"] for name, c in LLM_QUEUE.stats()["classes"].items()}, ("class",))
+
+async def generate_safe(prompt_text, priority="interactive", deadline=None, system=None, config=None, phase=None):
+    """Model errors come back as a "⚠️ SYSTEM ERROR" string; only a missed
+    `deadline` while queued raises (StaleJobError). `system` is a static
+    system prompt (cached by the router); `phase` labels the token counts."""
+    async with LLM_QUEUE.slot(priority, deadline):
         try:
-            response = client.models.generate_content(
-                model="gemini-3-pro-preview", 
-                contents=prompt_text
-            )
+            response = await router().generate(prompt_text, config=config, system=system, phase=phase or priority)
             return response.text
         except Exception as e:
             return f"⚠️ SYSTEM ERROR: {str(e)}"
 
+async def generate_stream_safe(prompt_text, priority="interactive", system=None, config=None, phase="active",
+                               outcome=None):
+    """generate_safe, but each chunk is also pushed to the graph's "custom"
+    stream as {"chunk": text}, so callers using astream can show it early.
+    `outcome` (a dict) gets the finish_reason of a stream that completed."""
+    writer = get_stream_writer()
+    output = ""
+    async with LLM_QUEUE.slot(priority):
+        try:
+            async for chunk in router().stream(prompt_text, config=config, system=system, phase=phase,
+                                               outcome=outcome):
+                output += chunk
+                writer({"chunk": chunk})
+        except Exception as e:
+            if not output:
+                return f"⚠️ SYSTEM ERROR: {str(e)}"
+            print(f"⚠️ Stream cut off after {len(output)} chars: {e}")
+    return output
+
+async def summarize(prompt_text):
+    """Plain generation that raises on failure (used off the hot path).
+    Folded turns may hold a pasted essay: the middle is cut to the active budget."""
+    async with LLM_QUEUE.slot("background"):
+        return (await router().generate(fit(prompt_text, PROMPT_TOKENS["active"]), phase="memory")).text
+
+# --- OUTPUT CAPS ---
+# max_output_tokens per phase (app/core/config.py); batches scale the
+# proactive cap by the number of nudges asked for.
+ACTIVE_CONFIG = types.GenerateContentConfig(max_output_tokens=OUTPUT_TOKENS_ACTIVE)
+PROACTIVE_CONFIG = types.GenerateContentConfig(max_output_tokens=OUTPUT_TOKENS_PROACTIVE)
+
+def _nudges_config(config, count):
+    return config.model_copy(update={"max_output_tokens": OUTPUT_TOKENS_PROACTIVE * count})
+
+def proactive_prompt(user):
+    return (f"User's Goal: '{goal(user['resolution'])}'. It is strictly time to work.\n"
+            "Draft a 1-sentence high-energy command to start working.\n"
+            "Rules: No hello. No questions. Just action.\n"
+            "Formatting: PLAIN TEXT ONLY.")
+
+# --- BATCHED PROACTIVE GENERATION ---
+# One structured call drafts the nudge for many users at once. A user marked
+# in `variants` also gets alternative nudges for the same goal, which the
+# scheduler keeps in the nudge cache, so filling it costs no extra call.
+PROACTIVE_BATCH_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=types.Schema(
+        type="ARRAY",
+        items=types.Schema(
+            type="OBJECT",
+            properties={"chat_id": types.Schema(type="STRING"), "message": types.Schema(type="STRING"),
+                        "alternatives": types.Schema(type="ARRAY", items=types.Schema(type="STRING"))},
+            required=["chat_id", "message"],
+        ),
+    ),
+)
+
+def proactive_batch_prompt(users, variants=None):
+    variants = variants or {}
+    entries = []
+    for chat_id, user in users.items():
+        entry = {"chat_id": str(chat_id), "goal": goal(user["resolution"])}
+        if chat_id in variants:
+            entry["variants"] = variants[chat_id]
+        entries.append(entry)
+    return ("Each user below has a goal and it is strictly time to work.\n"
+            "For EVERY user, draft a 1-sentence high-energy command to start working on their goal.\n"
+            "Rules: No hello. No questions. Just action. PLAIN TEXT ONLY.\n"
+            "Return a JSON array with one {\"chat_id\", \"message\"} object per user, same chat_ids.\n"
+            "For a user with \"variants\": N, also return \"alternatives\": N-1 more commands for the same "
+            "goal, each worded differently.\n\n"
+            f"USERS: {json.dumps(entries)}")
+
+def _parse_batch(text, users, alternatives=None):
+    """Maps the model's JSON array back to {chat_id: message} for known users
+    only; their alternatives, if any, go into the `alternatives` dict."""
+    wanted = {str(chat_id): chat_id for chat_id in users}
+    messages = {}
+    for item in json.loads(text):
+        chat_id = wanted.get(str(item.get("chat_id")))
+        message = (item.get("message") or "").replace("**", "").strip()
+        if chat_id is not None and message:
+            messages[chat_id] = message
+            extra = [str(t).replace("**", "").strip() for t in item.get("alternatives") or []]
+            if alternatives is not None and any(extra):
+                alternatives[chat_id] = [t for t in extra if t]
+    return messages
+
+async def _split_batch(users, deadline, variants, alternatives):
+    if len(users) == 1:
+        return await generate_proactive_batch(users, deadline)  # the plain prompt, without variants
+    items = list(users.items())
+    half = len(items) // 2
+    first, second = await asyncio.gather(
+        generate_proactive_batch(dict(items[:half]), deadline, variants, alternatives),
+        generate_proactive_batch(dict(items[half:]), deadline, variants, alternatives))
+    return {**first, **second}
+
+async def generate_proactive_batch(users, deadline=None, variants=None, alternatives=None):
+    """{chat_id: user} -> {chat_id: message} with one model call per batch.
+
+    `variants` ({chat_id: N}) also asks for N-1 alternative nudges for those
+    users' goals, put in `alternatives` ({chat_id: [str]}, if given).
+    If the reply does not parse, the batch is split in half and retried;
+    users the model skipped are retried on their own. A single user with no
+    variants wanted falls back to the normal one-prompt path. Runs at
+    "proactive" priority and raises StaleJobError if `deadline` (epoch
+    seconds) passes in the queue."""
+    if not users:
+        return {}
+    variants = {chat_id: n for chat_id, n in (variants or {}).items() if chat_id in users and n > 1}
+    if len(users) == 1 and not variants:
+        (chat_id, user), = users.items()
+        return {chat_id: await generate_safe(proactive_prompt(user), "proactive", deadline, config=PROACTIVE_CONFIG)}
+
+    nudges = len(users) + sum(n - 1 for n in variants.values())
+    async with LLM_QUEUE.slot("proactive", deadline):
+        response = await router().generate(proactive_batch_prompt(users, variants), phase="proactive",
+                                           config=_nudges_config(PROACTIVE_BATCH_CONFIG, nudges))
+    try:
+        messages = _parse_batch(response.text, users, alternatives)
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"⚠️ Batch of {len(users)} did not parse ({e}), splitting...")
+        return await _split_batch(users, deadline, variants, alternatives)
+    if not messages:
+        print(f"⚠️ Batch of {len(users)} came back empty, splitting...")
+        return await _split_batch(users, deadline, variants, alternatives)
+
+    missing = {chat_id: user for chat_id, user in users.items() if chat_id not in messages}
+    if missing:
+        messages.update(await generate_proactive_batch(missing, deadline))
+    return messages
+
+# --- STRUCTURED INTAKE ---
+# Intake answers as JSON, so a locked alarm is a field, not a tag to scrape.
+INTAKE_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=types.Schema(
+        type="OBJECT",
+        properties={
+            "reply": types.Schema(type="STRING"),
+            "alarm_time": types.Schema(type="STRING", nullable=True),
+            "confidence": types.Schema(type="NUMBER"),
+        },
+        required=["reply", "confidence"],
+    ),
+    max_output_tokens=OUTPUT_TOKENS_INTAKE,
+)
+
+def _parse_intake(text):
+    """Model output -> (reply, 'HH:MM' or None, confidence).
+
+    A model that ignored the schema is read the old way, from an 'ALARM: HH:MM' tag.
+    A confidence that is not a number ("high") counts as 0: the reply is kept,
+    the alarm is not locked."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        try:
+            confidence = float(data.get("confidence") or 0)
+        except (ValueError, TypeError):
+            confidence = 0.0
+        alarm = data.get("alarm_time")
+        return str(data.get("reply") or ""), parse_clock(alarm if isinstance(alarm, str) else None), confidence
+    match = re.search(r"ALARM:\s*(\d{1,2}:\d{2})", text)
+    if not match:
+        return text, None, 0.0
+    return text.replace(match.group(0), "").strip(), parse_clock(match.group(1)), 1.0
+
+def _lock_alarm(chat_id, user, alarm, source):
+    """Moves the user to the active phase with a daily reminder at `alarm`."""
+    save_user(chat_id, user['name'], user['resolution'],
+              plan="Locked", phase="active", reminder_time=alarm)
+    ALARM_LOCKS.inc(source=source)
+    return f"(✅ System set to remind you daily at {alarm})"
+
 class AgentState(TypedDict):
     chat_id: int
     user_input: str
@@ -39,71 +299,91 @@ class AgentState(TypedDict):
     response: str
     phase: str
 
-def coach_node(state: AgentState):
+async def _ready(text):
+    return text
+
+def _commit(config):
+    """Tells the caller (configurable "on_commit") that this turn is about to
+    change state (alarm, memory), so its reply must not be dropped any more."""
+    on_commit = ((config or {}).get("configurable") or {}).get("on_commit")
+    if on_commit:
+        on_commit()
+
+async def coach_node(state: AgentState, config: RunnableConfig):
+    started = time.perf_counter()
     user = get_user(state["chat_id"])
     
     # --- SCENARIO A: PROACTIVE ---
     if state["is_proactive"]:
-        prompt = (f"User's Goal: '{user['resolution']}'. It is strictly time to work.\n"
-                  "Draft a 1-sentence high-energy command to start working.\n"
-                  "Rules: No hello. No questions. Just action.\n"
-                  "Formatting: PLAIN TEXT ONLY.")
-        return {"response": generate_safe(prompt)}
+        response = await generate_safe(proactive_prompt(user), "proactive", config=PROACTIVE_CONFIG)
+        BRAIN_LATENCY.observe(time.perf_counter() - started, phase="proactive")
+        return {"response": response}
+
+    # Summary + last few turns, so the model keeps the thread of the chat
+    history = memory.render(state["chat_id"])
 
     # --- SCENARIO B: PLANNING (Intake) ---
+    # The fixed instructions are system prompts (app/agents/prompts.py) that the
+    # router caches per model; only this user's part is sent with the call.
+    streaming = False
+    stated_time = None
     if user.get("phase") == "intake":
-        prompt = (
-            f"You are a Habit Strategist. \n"
-            f"Current User Resolution in DB: '{user['resolution']}'\n"
-            f"User just said: '{state['user_input']}'\n\n"
-            "YOUR JOB: Secure a concrete habit loop (Goal + Time).\n\n"
-            "LOGIC FLOW (Follow Strictly):\n"
-            "1. CHECK TIME IN INPUT: Does the user's *current* message contain a time (e.g. '9am', '11:00')?\n"
-            "2. IF YES (Time Present) + (User Agrees): You MUST LOCK IT.\n"
-            "   -> Output: 'Plan set. ALARM: HH:MM'.\n"
-            "3. IF NO (Time Missing) + (User says 'Yes'): \n"
-            "   -> You probably forgot the context. Do NOT ask about the habit.\n"
-            "   -> REPLY: 'Great. To confirm, please type the time one last time (e.g., Yes 9am).'\n"
-            "4. LOCKING FORMAT: Output a hidden tag at the end: 'ALARM: HH:MM' (24-hour).\n\n"
-        )
+        system = INTAKE_SYSTEM
+        prompt = intake_prompt(user, history, state["user_input"])
+        # "7am" or "18:30" said plainly is locked here, with no model call
+        stated_time = extract_time(state["user_input"])
     else:
         # --- SCENARIO C: ACTIVE (The Mentor Phase) ---
-        prompt = (
-            f"You are an expert Mentor. User Goal: {user['resolution']}.\n"
-            f"User Input: '{state['user_input']}'.\n\n"
-            "RESPONSE RULES:\n"
-            "1. If user asks for a GUIDE or STEPS: Provide a clear, numbered list (Step 1, Step 2, etc).\n"
-            "2. If user asks a simple question: Keep it direct and short (1-2 sentences).\n"
-            "3. STYLE: Motivational but technical. No fluff.\n"
-            "4. FORMATTING: Use plain text. Use numbers (1.) for lists. Do NOT use **bold** or markdown."
-        )
+        system = MENTOR_SYSTEM
+        # A self-contained question is answered from the goal alone, so the
+        # reply can be shared with everyone on that goal (MENTOR_CACHE); a
+        # short follow-up ("why?") needs the conversation and is never shared.
+        shareable = MENTOR_CACHE.shareable(state["user_input"])
+        prompt = mentor_prompt(user, "" if shareable else history, state["user_input"])
+        # Step guides are long: stream them so the user sees text right away
+        streaming = True
 
-    # Generate Response using the Fail-Safe Function
-    output = generate_safe(prompt)
+    phase = user.get("phase") or "active"  # read before an alarm lock moves intake on
 
-    # --- PARSING LOGIC ---
-    if "ALARM:" in output:
-        try:
-            time_match = re.search(r"ALARM:\s*(\d{1,2}:\d{2})", output)
-            if time_match:
-                final_time = time_match.group(1)
-                if len(final_time) == 4: final_time = "0" + final_time 
-                
-                save_user(state["chat_id"], user['name'], user['resolution'], 
-                          plan="Locked", phase="active", reminder_time=final_time)
-                
-                output = output.replace(f"ALARM: {final_time}", "").strip()
-                output = output.replace(f"ALARM: {time_match.group(1)}", "").strip()
-                
-                output += f"\n\n(✅ System set to remind you daily at {final_time})"
-        except Exception as e:
-            print(f"Time Parsing Error: {e}")
+    # Generate Response using the Fail-Safe Function (intake queues behind live chats)
+    # Guardrails check the input while the model works, then the output;
+    # a failed check swaps in a fixed reply (and never locks an alarm).
+    verdict = PASS
+    if stated_time:
+        _commit(config)
+        output = f"Plan set.\n\n{_lock_alarm(state['chat_id'], user, stated_time, 'local')}"
+    elif streaming:
+        # Someone with the same goal asked (nearly) this already: no model call.
+        cached = MENTOR_CACHE.get(user["resolution"], state["user_input"])
+        outcome = {}
+        generation = _ready(cached) if cached else generate_stream_safe(prompt, system=system, config=ACTIVE_CONFIG,
+                                                                        outcome=outcome)
+        output, verdict = await GUARDRAILS.guard(state["user_input"], generation)
+        _commit(config)  # no awaits from here on: the side effects below always run
+        # Only complete replies: not cut off mid-stream or at max_output_tokens
+        if shareable and not cached and verdict.passed and outcome.get("finish_reason") == types.FinishReason.STOP:
+            MENTOR_CACHE.put(user["resolution"], state["user_input"], output)
+    else:
+        output, verdict = await GUARDRAILS.guard(
+            state["user_input"], generate_safe(prompt, "intake", system=system, config=INTAKE_CONFIG))
+        _commit(config)
+        if verdict.passed and not output.startswith("⚠️ SYSTEM ERROR"):
+            output, alarm, confidence = _parse_intake(output)
+            if alarm and confidence >= INTAKE_LOCK_CONFIDENCE:
+                output = f"{output}\n\n{_lock_alarm(state['chat_id'], user, alarm, 'model')}".strip()
 
     output = output.replace("**", "")
+
+    if not output.startswith("⚠️ SYSTEM ERROR"):
+        memory.remember(state["chat_id"], "user", state["user_input"])
+        memory.remember(state["chat_id"], "coach", output)
+        memory.schedule_fold(state["chat_id"], summarize)
+    elapsed = time.perf_counter() - started
+    BRAIN_LATENCY.observe(elapsed, phase=phase)
+    GUARDRAILS.record(state["chat_id"], phase, state["user_input"], output, verdict, elapsed)
     return {"response": output}
 
 workflow = StateGraph(AgentState)
 workflow.add_node("coach", coach_node)
 workflow.set_entry_point("coach")
-workflow.add_edge("coach", END)
-BRAIN_ENGINE = workflow.compile()
\ No newline at end of file
+workflow.add_edge("coach", END)
\ No newline at end of file
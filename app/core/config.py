@@ -0,0 +1,171 @@
+import os
+from dotenv import load_dotenv
+
+# Load .env once, before any module reads its settings.
+load_dotenv()
+
+# --- STORAGE ---
+USER_DB_FILE = os.getenv("USER_DB_FILE", "user_db.sqlite3")
+LEGACY_USER_DB_FILE = os.getenv("LEGACY_USER_DB_FILE", "user_db.json")
+# Seconds between batched, fsynced flushes of dirty users.
+USER_DB_FLUSH_INTERVAL = float(os.getenv("USER_DB_FLUSH_INTERVAL", "1.0"))
+
+# --- MODEL CLIENT ---
+# Override to point the genai client at a local fake server (benchmarks).
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None
+GEMINI_MAX_CONNECTIONS = int(os.getenv("GEMINI_MAX_CONNECTIONS", "32"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
+
+# --- MODEL ROUTING ---
+# Ordered by preference; the router skips models whose circuit is open.
+GEMINI_MODELS = [m.strip() for m in os.getenv("GEMINI_MODELS", "gemini-1.5-flash,gemini-3-pro-preview").split(",") if m.strip()]
+# Consecutive failures before a model's circuit opens.
+MODEL_FAILURE_THRESHOLD = int(os.getenv("MODEL_FAILURE_THRESHOLD", "3"))
+# Seconds between background probes of an open circuit.
+MODEL_PROBE_INTERVAL = float(os.getenv("MODEL_PROBE_INTERVAL", "30"))
+# Ranked probe results from find_working_model.py; if present, GEMINI_MODELS
+# is tried fastest-working first.
+MODEL_RANKING_FILE = os.getenv("MODEL_RANKING_FILE", "model_ranking.json")
+# A ranking probed longer ago than this (seconds) is ignored.
+MODEL_RANKING_MAX_AGE = float(os.getenv("MODEL_RANKING_MAX_AGE", "86400"))
+
+# --- CONTEXT CACHING ---
+# Static system prompts are registered once per model as cached content.
+CONTEXT_CACHE = os.getenv("CONTEXT_CACHE", "1") not in ("0", "false", "no", "")
+# Lifetime of a cached prompt; it is recreated shortly before it runs out.
+CONTEXT_CACHE_TTL = float(os.getenv("CONTEXT_CACHE_TTL", "3600"))
+# Seconds before asking again after a model refused to cache a prompt.
+CONTEXT_CACHE_RETRY = float(os.getenv("CONTEXT_CACHE_RETRY", "3600"))
+# Prompts shorter than this (chars) are sent inline without asking: Gemini
+# refuses to cache below ~1024 tokens, and every refusal is a blocking call.
+CONTEXT_CACHE_MIN_CHARS = int(os.getenv("CONTEXT_CACHE_MIN_CHARS", "4096"))
+
+# --- INTAKE ---
+# Lowest model confidence at which an intake reply locks the reminder time.
+INTAKE_LOCK_CONFIDENCE = float(os.getenv("INTAKE_LOCK_CONFIDENCE", "0.6"))
+
+# --- PROMPT BUDGETS ---
+# Estimated tokens (~4 characters each) for the per-user part of a prompt,
+# by phase. Oversized messages and history are cut to fit; the resolution
+# never takes more than RESOLUTION_MAX_TOKENS.
+PROMPT_TOKENS_INTAKE = int(os.getenv("PROMPT_TOKENS_INTAKE", "1500"))
+PROMPT_TOKENS_ACTIVE = int(os.getenv("PROMPT_TOKENS_ACTIVE", "2500"))
+RESOLUTION_MAX_TOKENS = int(os.getenv("RESOLUTION_MAX_TOKENS", "100"))
+# Output caps (max_output_tokens). Proactive is per nudge, so batches scale it.
+OUTPUT_TOKENS_INTAKE = int(os.getenv("OUTPUT_TOKENS_INTAKE", "1024"))
+OUTPUT_TOKENS_ACTIVE = int(os.getenv("OUTPUT_TOKENS_ACTIVE", "2048"))
+OUTPUT_TOKENS_PROACTIVE = int(os.getenv("OUTPUT_TOKENS_PROACTIVE", "128"))
+
+# --- LLM WORK QUEUE ---
+# Model calls in flight at once, and the cap for each priority class.
+# Keeping the lower classes under the total leaves headroom for live chats.
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", str(GEMINI_MAX_CONNECTIONS)))
+INTERACTIVE_CONCURRENCY = int(os.getenv("INTERACTIVE_CONCURRENCY", str(LLM_CONCURRENCY)))
+INTAKE_CONCURRENCY = int(os.getenv("INTAKE_CONCURRENCY", "16"))
+BACKGROUND_CONCURRENCY = int(os.getenv("BACKGROUND_CONCURRENCY", "4"))
+# A queued proactive batch is dropped once its reminder is this many seconds late.
+PROACTIVE_MAX_LAG = float(os.getenv("PROACTIVE_MAX_LAG", "600"))
+
+# --- PROACTIVE FAN-OUT ---
+# Max proactive generations in flight at once.
+PROACTIVE_CONCURRENCY = int(os.getenv("PROACTIVE_CONCURRENCY", "16"))
+# Users packed into one proactive generation call.
+PROACTIVE_BATCH_SIZE = int(os.getenv("PROACTIVE_BATCH_SIZE", "50"))
+# Cached nudge variants per normalized resolution (0 disables the cache),
+# how long a pool lives (seconds; keep it well above a day, the reminder
+# period, or every daily tick finds its pools expired) and how many
+# resolutions are kept.
+NUDGE_VARIANTS = int(os.getenv("NUDGE_VARIANTS", "5"))
+NUDGE_TTL = float(os.getenv("NUDGE_TTL", "432000"))
+NUDGE_MAX_KEYS = int(os.getenv("NUDGE_MAX_KEYS", "2000"))
+# Every reminder goes through the outbox table in USER_DB_FILE: retries back
+# off exponentially (429s wait as long as Telegram asks) until the attempt cap.
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "2"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))
+# Seconds between sender passes, and how long a claimed row is reserved.
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_CLAIM_TTL = float(os.getenv("OUTBOX_CLAIM_TTL", "60"))
+# Sent or abandoned rows are kept this long (seconds), then pruned.
+OUTBOX_RETENTION = float(os.getenv("OUTBOX_RETENTION", "172800"))
+# Telegram's documented limits: ~30 msg/s overall, ~1 msg/s per chat.
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+
+# --- TELEGRAM INGESTION ---
+# Override to point the bot at a local fake Bot API server (benchmarks).
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+# Set to the public base URL (e.g. https://resolveai.onrender.com) to receive
+# updates by webhook instead of long polling.
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "").rstrip("/")
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/telegram/webhook")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+# Updates each process handles at the same time.
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))
+
+# --- CHAT COALESCING ---
+# Messages a user sends within this many seconds of each other are answered
+# together, with one model call and one reply.
+CHAT_DEBOUNCE_SECONDS = float(os.getenv("CHAT_DEBOUNCE_SECONDS", "0.8"))
+
+# --- STREAMING REPLIES ---
+# Minimum seconds between edits of a streaming reply (Telegram rate-limits edits).
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+# --- CONVERSATION MEMORY ---
+# Turns kept per chat before the older ones are folded regardless of size,
+# turns quoted verbatim in prompts, and the token budget for older turns
+# before they are folded into the rolling summary.
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "20"))
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "6"))
+MEMORY_FOLD_TOKENS = int(os.getenv("MEMORY_FOLD_TOKENS", "400"))
+
+# --- MENTOR ANSWER CACHE ---
+# Near-duplicate mentor questions about the same resolution reuse a reply
+# (0 entries disables the cache). Entries live MENTOR_CACHE_TTL seconds.
+MENTOR_CACHE_SIZE = int(os.getenv("MENTOR_CACHE_SIZE", "5000"))
+MENTOR_CACHE_TTL = float(os.getenv("MENTOR_CACHE_TTL", "86400"))
+# Estimated Jaccard similarity of the questions' shingles needed for a hit;
+# shorter questions lean on the conversation and are never cached.
+MENTOR_CACHE_THRESHOLD = float(os.getenv("MENTOR_CACHE_THRESHOLD", "0.7"))
+MENTOR_CACHE_MIN_WORDS = int(os.getenv("MENTOR_CACHE_MIN_WORDS", "4"))
+# LSH bands x rows is the MinHash signature length; more bands, more candidates.
+MENTOR_CACHE_BANDS = int(os.getenv("MENTOR_CACHE_BANDS", "16"))
+MENTOR_CACHE_ROWS = int(os.getenv("MENTOR_CACHE_ROWS", "4"))
+
+# --- REMINDER SCHEDULING ---
+# IANA zone (e.g. "Europe/Berlin") for users who never set one.
+# Empty means the server's local time, which is what reminders used before.
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "")
+
+# --- SHARDING ---
+# 0 = single process. N > 0 = chat_ids are split into N shards and every
+# process sharing USER_DB_FILE competes for leases; each shard's reminders
+# are fired by exactly one lease holder. Needs webhook mode.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_LEASE_TTL = float(os.getenv("SHARD_LEASE_TTL", "15"))
+# Seconds between pulls of other processes' writes from the shared store.
+STORE_REFRESH_INTERVAL = float(os.getenv("STORE_REFRESH_INTERVAL", "1.0"))
+
+# --- GUARDRAILS ---
+# Verdicts remembered for repeated texts (LRU).
+GUARDRAIL_CACHE_SIZE = int(os.getenv("GUARDRAIL_CACHE_SIZE", "5000"))
+# Also run Opik's hosted PII/topic guardrails (needs an Opik backend).
+OPIK_GUARDRAILS = os.getenv("OPIK_GUARDRAILS", "0") not in ("0", "false", "no", "")
+OPIK_RESTRICTED_TOPICS = [t.strip() for t in os.getenv("OPIK_RESTRICTED_TOPICS", "").split(",") if t.strip()]
+# Block replies when the Opik guardrail backend cannot answer (default: let them through).
+GUARDRAILS_FAIL_CLOSED = os.getenv("GUARDRAILS_FAIL_CLOSED", "0") not in ("0", "false", "no", "")
+# Traces go to Opik in batches, off the reply path, when OPIK_API_KEY or
+# OPIK_URL_OVERRIDE is set.
+OPIK_TRACES = bool(os.getenv("OPIK_API_KEY") or os.getenv("OPIK_URL_OVERRIDE"))
+OPIK_PROJECT_NAME = os.getenv("OPIK_PROJECT_NAME", "resolveai")
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "50"))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "5"))
+# Traces held while Opik is slow or down; the oldest are dropped past this.
+TRACE_MAX_PENDING = int(os.getenv("TRACE_MAX_PENDING", "5000"))
+
+# --- SHUTDOWN ---
+# Seconds a stopping process gives in-flight replies and reminders to finish.
+# Keep it under the platform's kill timeout (30s by default on Render).
+SHUTDOWN_GRACE = float(os.getenv("SHUTDOWN_GRACE", "20"))
@@ -0,0 +1,138 @@
+import bisect
+import math
+
+# --- METRICS ---
+# A minimal Prometheus text-format registry. Recording is plain arithmetic on
+# dicts and lists, no locks and no allocation after a series' first sample:
+# nearly every instrumented call runs on the event loop thread, and the
+# storage flusher is the only writer of its own series.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+FAST_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in list(self.values.items()):
+            yield f"{self.name}{_labels(self.labels, key)} {value}"
+
+
+class Gauge:
+    """Read at scrape time from `read()`, which returns {label values: number}."""
+
+    def __init__(self, name, help_text, read, labels=()):
+        self.name, self.help, self.read, self.labels = name, help_text, read, tuple(labels)
+        REGISTRY.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        try:
+            values = self.read()
+        except Exception:
+            return  # not ready yet (e.g. still booting)
+        for key, value in values.items():
+            yield f"{self.name}{_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for key, series in list(self.series.items()):
+            series = list(series)
+            running = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                running += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                yield f"{self.name}_bucket{_labels(self.labels + ('le',), key + (le,))} {running}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {series[-1]}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {running}"
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- APP METRICS ---
+MODEL_LATENCY = Histogram("resolveai_model_request_seconds",
+                          "Gemini call latency by model and outcome.", ("model", "outcome"))
+MODEL_TOKENS = Counter("resolveai_model_tokens_total",
+                       "Tokens reported by Gemini, by model, phase and kind (uncached prompt/cached/completion).",
+                       ("model", "phase", "kind"))
+PROMPT_SIZE = Histogram("resolveai_prompt_tokens",
+                        "Prompt tokens per model call, by phase.", ("phase",), buckets=TOKEN_BUCKETS)
+PROMPT_TRIMS = Counter("resolveai_prompt_trims_total",
+                       "Prompt fields cut to fit the phase budget, by phase and field.", ("phase", "field"))
+BRAIN_LATENCY = Histogram("resolveai_brain_invoke_seconds",
+                          "Brain graph run time by phase.", ("phase",))
+STORE_SAVE_LATENCY = Histogram("resolveai_store_save_seconds",
+                               "In-memory save_user/update_user time.", buckets=FAST_BUCKETS)
+STORE_FLUSH_LATENCY = Histogram("resolveai_store_flush_seconds",
+                                "Fsynced flush of dirty users to SQLite.")
+STORE_FLUSH_ROWS = Counter("resolveai_store_flushed_rows_total", "Users written by flushes.")
+TICK_LATENCY = Histogram("resolveai_reminder_tick_seconds",
+                         "Time to generate and send one due group of reminders.")
+REMINDER_LAG = Histogram("resolveai_reminder_lag_seconds",
+                         "Delay between a reminder's due time and its delivery.")
+ALARM_LOCKS = Counter("resolveai_alarm_locks_total",
+                      "Intake reminder times locked, by who read the time (local/model).", ("source",))
+NUDGE_LOOKUPS = Counter("resolveai_nudge_cache_lookups_total",
+                        "Proactive nudge cache lookups by result (hit/miss).", ("result",))
+MENTOR_CACHE_LOOKUPS = Counter("resolveai_mentor_cache_lookups_total",
+                               "Mentor answer cache lookups by result (hit/miss/skip).", ("result",))
+CONTEXT_CACHE_USES = Counter("resolveai_context_cache_requests_total",
+                             "Model calls with a system prompt, by how it was sent (cached/inline).", ("mode",))
+GUARDRAIL_LATENCY = Histogram("resolveai_guardrail_seconds",
+                              "Guardrail checks by stage (input/output).", ("stage",), buckets=FAST_BUCKETS)
+GUARDRAIL_VERDICTS = Counter("resolveai_guardrail_verdicts_total",
+                             "Guardrail verdicts by stage, check and result (pass/block/cached).",
+                             ("stage", "check", "result"))
+TRACE_EXPORTS = Counter("resolveai_trace_exports_total",
+                        "Traces handed to Opik, by result (sent/failed/dropped).", ("result",))
+TELEGRAM_LATENCY = Histogram("resolveai_telegram_request_seconds",
+                             "Bot API call latency by endpoint.", ("endpoint",))
+TELEGRAM_ERRORS = Counter("resolveai_telegram_errors_total",
+                          "Failed Bot API calls by endpoint and error.", ("endpoint", "error"))
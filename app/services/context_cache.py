@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import time
+
+from google.genai import types
+
+from app.core.metrics import CONTEXT_CACHE_USES
+
+# --- CONTEXT CACHE ---
+# Registers each static system instruction once per model as Gemini cached
+# content, so calls send only the per-user suffix plus a handle. Handles are
+# shared by every call, created once even under concurrent misses, and
+# recreated REFRESH_MARGIN seconds before they expire. An instruction
+# shorter than `min_chars` is always sent inline, since Gemini would refuse
+# it anyway. A model that refuses (too few tokens, no caching support,
+# quota) gets the instruction inline as system_instruction and is asked
+# again after `retry` seconds.
+
+REFRESH_MARGIN = 60.0
+
+
+class _Handle:
+    __slots__ = ("name", "expires")
+
+    def __init__(self, name, expires):
+        self.name = name
+        self.expires = expires
+
+
+class ContextCache:
+    def __init__(self, client, ttl=3600.0, retry=3600.0, enabled=True, min_chars=0):
+        self.client = client
+        self.ttl = ttl
+        self.retry = retry
+        self.enabled = enabled
+        self.min_chars = min_chars
+        self._handles = {}    # (model, digest) -> _Handle
+        self._creating = {}   # (model, digest) -> running create task
+        self._refused = {}    # (model, digest) -> time to try again
+        self.created = 0
+        self.hits = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def _key(model, system):
+        return model, hashlib.sha1(system.encode()).hexdigest()[:16]
+
+    async def config(self, model, system, base=None):
+        """`base` (a GenerateContentConfig or None) carrying `system` for
+        `model`: as a cached-content handle when possible, inline otherwise."""
+        base = base or types.GenerateContentConfig()
+        name = None
+        if self.enabled and len(system) >= self.min_chars:
+            name = await self._handle(model, system)
+        if name is None:
+            self.fallbacks += 1
+            CONTEXT_CACHE_USES.inc(mode="inline")
+            return base.model_copy(update={"system_instruction": system})
+        self.hits += 1
+        CONTEXT_CACHE_USES.inc(mode="cached")
+        return base.model_copy(update={"cached_content": name})
+
+    def invalidate(self, model, system):
+        """Forgets the handle after a failed call; the next call recreates it."""
+        self._handles.pop(self._key(model, system), None)
+
+    async def _handle(self, model, system):
+        key = self._key(model, system)
+        now = time.time()
+        handle = self._handles.get(key)
+        if handle is not None and handle.expires - now > REFRESH_MARGIN:
+            return handle.name
+        if self._refused.get(key, 0) > now:
+            return None
+        task = self._creating.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._create(key, model, system))
+            self._creating[key] = task
+            task.add_done_callback(lambda _: self._creating.pop(key, None))
+        # Shielded: a caller that gives up must not cancel everyone's create.
+        return await asyncio.shield(task)
+
+    async def _create(self, key, model, system):
+        try:
+            cached = await self.client.aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system, ttl=f"{int(self.ttl)}s",
+                    display_name=f"resolveai-{key[1]}",
+                ),
+            )
+        except Exception as e:
+            self._refused[key] = time.time() + self.retry
+            print(f"⚠️ Context cache refused for {model} ({str(e)[:120]}), sending the prompt inline")
+            return None
+        expires = cached.expire_time.timestamp() if cached.expire_time else time.time() + self.ttl
+        self._handles[key] = _Handle(cached.name, expires)
+        self._refused.pop(key, None)
+        self.created += 1
+        print(f"🧩 Cached {len(system)}-char system prompt for {model} as {cached.name}")
+        return cached.name
+
+    def stats(self):
+        return {"handles": len(self._handles), "created": self.created,
+                "hits": self.hits, "fallbacks": self.fallbacks,
+                "refused": sorted(model for model, _ in self._refused)}
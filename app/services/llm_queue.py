@@ -0,0 +1,124 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+# --- LLM WORK QUEUE ---
+# Highest priority first. A free slot always goes to the first class in this
+# order that has someone waiting and is under its own limit. "background" is
+# work nobody is waiting on (memory folds).
+PRIORITY_ORDER = ("interactive", "intake", "proactive", "background")
+
+
+class StaleJobError(Exception):
+    """The job's deadline passed before it got a slot; it was dropped unrun."""
+
+
+class _ClassState:
+    def __init__(self, limit):
+        self.limit = limit
+        self.waiters = deque()    # (future, enqueued_at, deadline)
+        self.running = 0
+        self.started = 0
+        self.dropped = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def stats(self):
+        return {
+            "queued": sum(1 for f, _, _ in self.waiters if not f.done()),
+            "running": self.running,
+            "limit": self.limit,
+            "started": self.started,
+            "dropped_stale": self.dropped,
+            "avg_wait_ms": round(self.wait_total / self.started * 1000, 1) if self.started else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 1),
+        }
+
+
+class LLMWorkQueue:
+    """Admission control for model calls.
+
+    At most `total` calls run at once, each class at most its own limit.
+    Waiting jobs are admitted strictly by class priority, so an 08:00
+    proactive burst queues behind live chats instead of in front of them.
+    Jobs with a deadline (epoch seconds) that expires while queued are
+    dropped with StaleJobError instead of wasting a model call."""
+
+    def __init__(self, total, limits):
+        self.total = total
+        self.classes = {name: _ClassState(limits.get(name, total)) for name in PRIORITY_ORDER}
+        self.in_flight = 0
+
+    @asynccontextmanager
+    async def slot(self, klass, deadline=None):
+        await self._acquire(klass, deadline)
+        try:
+            yield
+        finally:
+            self._release(klass)
+
+    async def _acquire(self, klass, deadline):
+        state = self.classes[klass]
+        future = asyncio.get_running_loop().create_future()
+        enqueued = time.monotonic()
+        state.waiters.append((future, enqueued, deadline))
+        self._dispatch()
+        if future.done():
+            return future.result()
+
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.exception():
+                return  # admitted at the last moment: keep the slot
+            future.cancel()
+            state.dropped += 1
+            raise StaleJobError(f"{klass} job waited past its deadline")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and not future.exception():
+                self._release(klass)  # admitted, but the caller went away
+            future.cancel()
+            raise
+
+    def _dispatch(self):
+        while self.in_flight < self.total:
+            admitted = False
+            for name in PRIORITY_ORDER:
+                state = self.classes[name]
+                if state.running >= state.limit:
+                    continue
+                while state.waiters:
+                    future, enqueued, deadline = state.waiters.popleft()
+                    if future.done():
+                        continue  # cancelled or timed out while waiting
+                    if deadline is not None and time.time() > deadline:
+                        state.dropped += 1
+                        future.set_exception(StaleJobError(f"{name} job waited past its deadline"))
+                        continue
+                    waited = time.monotonic() - enqueued
+                    state.wait_total += waited
+                    state.wait_max = max(state.wait_max, waited)
+                    state.started += 1
+                    state.running += 1
+                    self.in_flight += 1
+                    future.set_result(None)
+                    admitted = True
+                    break
+                if admitted:
+                    break
+            if not admitted:
+                return
+
+    def _release(self, klass):
+        self.classes[klass].running -= 1
+        self.in_flight -= 1
+        self._dispatch()
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "total_limit": self.total,
+            "classes": {name: state.stats() for name, state in self.classes.items()},
+        }
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+from google.genai import types
+
+from app.core.metrics import MODEL_LATENCY, MODEL_TOKENS, PROMPT_SIZE
+
+PROBE_PROMPT = "ping"
+
+
+def load_ranking(path, max_age=None):
+    """{model: fastest working latency in ms, or None if it never worked}
+    from a find_working_model.py result file; {} if there is none, or if it
+    was probed more than `max_age` seconds ago."""
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+        results = saved["results"]
+        if max_age is not None:
+            age = (datetime.now(timezone.utc) - datetime.fromisoformat(saved["probed_at"])).total_seconds()
+            if age > max_age:
+                return {}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+    ranking = {}
+    for r in results:
+        latency = r.get("latency_ms") if r.get("status") == "ok" else None
+        best = ranking.get(r.get("model"))
+        if latency is not None and (best is None or latency < best):
+            ranking[r["model"]] = latency
+        else:
+            ranking.setdefault(r.get("model"), None)
+    return ranking
+
+
+def rank_models(models, ranking):
+    """`models` reordered: those that answered a probe first, fastest first,
+    then the rest in their configured order. The probes go through Vertex AI
+    while the bot calls the Gemini API, so a failed probe proves nothing
+    about a model here and never moves it back."""
+    def key(item):
+        index, name = item
+        latency = ranking.get(name)
+        return (0, latency) if latency is not None else (1, index)
+    return [name for _, name in sorted(enumerate(models), key=key)]
+
+
+def _record_usage(model, phase, usage):
+    """Token counts from a response's usage_metadata, for capacity planning."""
+    if usage is None:
+        return
+    prompt = usage.prompt_token_count or 0
+    cached = usage.cached_content_token_count or 0
+    MODEL_TOKENS.inc(prompt - cached, model=model, phase=phase, kind="prompt")
+    MODEL_TOKENS.inc(cached, model=model, phase=phase, kind="cached")
+    MODEL_TOKENS.inc(usage.candidates_token_count or 0, model=model, phase=phase, kind="completion")
+    PROMPT_SIZE.observe(prompt, phase=phase)
+
+
+class ModelHealth:
+    """Per-model circuit state plus the counters we export."""
+
+    def __init__(self, name):
+        self.name = name
+        self.open = False
+        self.failures = 0          # consecutive, resets on success
+        self.calls = 0
+        self.errors = 0
+        self.latency_total = 0.0   # seconds, successful calls only
+        self.last_error = None
+
+    def stats(self):
+        ok = self.calls - self.errors
+        return {
+            "state": "open" if self.open else "closed",
+            "calls": self.calls,
+            "errors": self.errors,
+            "consecutive_failures": self.failures,
+            "avg_latency_ms": round(self.latency_total / ok * 1000, 1) if ok else None,
+            "last_error": self.last_error,
+        }
+
+
+class ModelRouter:
+    """Routes each call to the first healthy model in preference order.
+
+    A model that fails `failure_threshold` times in a row has its circuit
+    opened: requests skip it and a background task probes it every
+    `probe_interval` seconds until it answers again. If every circuit is open
+    we still try them all, so a recovered provider is never locked out."""
+
+    def __init__(self, client, models, failure_threshold=3, probe_interval=30.0, contexts=None):
+        self.client = client
+        self.contexts = contexts  # ContextCache for system prompts, or None to always send them inline
+        self.models = {name: ModelHealth(name) for name in models}
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self._probes = {}
+
+    def candidates(self):
+        healthy = [h for h in self.models.values() if not h.open]
+        return healthy or list(self.models.values())
+
+    async def _config(self, model, config, system):
+        """`config` for `model`, carrying the `system` instruction if there is one."""
+        if system is None:
+            return config
+        if self.contexts is None:
+            return (config or types.GenerateContentConfig()).model_copy(update={"system_instruction": system})
+        return await self.contexts.config(model, system, config)
+
+    def _forget_context(self, model, system, error):
+        # A deleted or expired handle fails the call with a 404; recreate it next time.
+        if system is not None and self.contexts is not None and getattr(error, "code", None) == 404:
+            self.contexts.invalidate(model, system)
+
+    async def generate(self, contents, config=None, system=None, phase="other"):
+        """Returns the first successful GenerateContentResponse, else raises the last error.
+
+        `system` is a static system instruction, sent as cached content when
+        the model allows it. Token counts are recorded under `phase`."""
+        last_error = None
+        for health in self.candidates():
+            model_config = await self._config(health.name, config, system)
+            start = time.perf_counter()
+            try:
+                response = await self.client.aio.models.generate_content(
+                    model=health.name, contents=contents, config=model_config
+                )
+            except Exception as e:
+                MODEL_LATENCY.observe(time.perf_counter() - start, model=health.name, outcome="error")
+                self._record_failure(health, e)
+                self._forget_context(health.name, system, e)
+                last_error = e
+                continue
+            elapsed = time.perf_counter() - start
+            MODEL_LATENCY.observe(elapsed, model=health.name, outcome="ok")
+            self._record_success(health, elapsed)
+            _record_usage(health.name, phase, response.usage_metadata)
+            return response
+        raise last_error or RuntimeError("No models configured")
+
+    async def stream(self, contents, config=None, system=None, phase="other", outcome=None):
+        """Yields text chunks from the first healthy model as they arrive.
+
+        Falls back to the next model only if nothing was yielded yet; once
+        the user has seen text, a mid-stream failure is raised. A finished
+        stream's finish_reason is put in `outcome` (a dict), if given."""
+        last_error = None
+        for health in self.candidates():
+            model_config = await self._config(health.name, config, system)
+            start = time.perf_counter()
+            started = False
+            usage = finish = None
+            try:
+                chunks = await self.client.aio.models.generate_content_stream(
+                    model=health.name, contents=contents, config=model_config
+                )
+                async for chunk in chunks:
+                    usage = chunk.usage_metadata or usage  # running totals; the last chunk has them all
+                    if chunk.candidates and chunk.candidates[0].finish_reason:
+                        finish = chunk.candidates[0].finish_reason
+                    text = chunk.text
+                    if text:
+                        started = True
+                        yield text
+            except Exception as e:
+                MODEL_LATENCY.observe(time.perf_counter() - start, model=health.name, outcome="error")
+                self._record_failure(health, e)
+                self._forget_context(health.name, system, e)
+                if started:
+                    raise
+                last_error = e
+                continue
+            elapsed = time.perf_counter() - start
+            MODEL_LATENCY.observe(elapsed, model=health.name, outcome="ok")
+            self._record_success(health, elapsed)
+            _record_usage(health.name, phase, usage)
+            if outcome is not None:
+                outcome["finish_reason"] = finish
+            return
+        raise last_error or RuntimeError("No models configured")
+
+    def stats(self):
+        return {name: h.stats() for name, h in self.models.items()}
+
+    # --- HEALTH BOOKKEEPING ---
+    def _record_success(self, health, elapsed):
+        health.calls += 1
+        health.latency_total += elapsed
+        health.failures = 0
+        if health.open:
+            health.open = False
+            print(f"✅ Model {health.name} recovered, circuit closed")
+
+    def _record_failure(self, health, error):
+        health.calls += 1
+        health.errors += 1
+        health.failures += 1
+        health.last_error = str(error)[:200]
+        if not health.open and health.failures >= self.failure_threshold:
+            health.open = True
+            print(f"⚠️ Model {health.name} failed {health.failures}x, circuit opened")
+            self._start_probe(health)
+
+    def _start_probe(self, health):
+        if health.name in self._probes:
+            return
+        task = asyncio.get_running_loop().create_task(self._probe(health))
+        self._probes[health.name] = task
+        task.add_done_callback(lambda _: self._probes.pop(health.name, None))
+
+    async def _probe(self, health):
+        config = types.GenerateContentConfig(max_output_tokens=1)
+        while health.open:
+            await asyncio.sleep(self.probe_interval)
+            if not health.open:
+                break
+            start = time.perf_counter()
+            try:
+                await self.client.aio.models.generate_content(
+                    model=health.name, contents=PROBE_PROMPT, config=config
+                )
+            except Exception as e:
+                health.last_error = str(e)[:200]
+                continue
+            self._record_success(health, time.perf_counter() - start)
@@ -0,0 +1,95 @@
+import re
+import time
+from collections import OrderedDict
+
+from app.core.config import NUDGE_VARIANTS, NUDGE_TTL, NUDGE_MAX_KEYS
+from app.core.metrics import NUDGE_LOOKUPS
+
+# --- NUDGE CACHE ---
+# The proactive nudge depends only on the user's resolution, and many users
+# share one ("learn Python", "go to the gym"). Each normalized resolution
+# keeps a pool of up to NUDGE_VARIANTS nudges, handed out in rotation so
+# nobody reads the same line every day. Pools expire after NUDGE_TTL
+# seconds (several days, so the daily ticks rotate through each pool)
+# and the least recently used are evicted past NUDGE_MAX_KEYS. The cache
+# never makes a model call of its own: an exhausted or expired pool that
+# several users of a tick share is filled by asking the tick's batched call
+# for extra variants (wanted()), and every other miss seeds its pool with
+# the nudge the batch wrote anyway.
+
+_FILLER = {"i", "im", "want", "to", "will", "my", "a", "an", "the", "finally", "really", "gonna", "going"}
+
+
+def normalize(resolution):
+    """'I want to finally learn Python!' and 'learn python' -> 'learn python'."""
+    words = re.sub(r"[^a-z0-9 ]+", " ", (resolution or "").lower()).split()
+    return " ".join(w for w in words if w not in _FILLER) or " ".join(words)
+
+
+class _Pool:
+    __slots__ = ("variants", "created", "cursor")
+
+    def __init__(self, now):
+        self.variants = []
+        self.created = now
+        self.cursor = 0
+
+
+class NudgeCache:
+    def __init__(self, variants=5, ttl=432000.0, max_keys=2000):
+        self.variants = variants
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.pools = OrderedDict()
+
+    def _pool(self, key, now):
+        pool = self.pools.get(key)
+        if pool is not None and now - pool.created > self.ttl:
+            pool = None  # expired: start over
+        if pool is None:
+            pool = self.pools[key] = _Pool(now)
+        self.pools.move_to_end(key)
+        while len(self.pools) > self.max_keys:
+            self.pools.popitem(last=False)  # least recently used
+        return pool
+
+    def _exhausted(self, pool):
+        # A single variant would repeat itself: wait for a real pool.
+        return len(pool.variants) < min(2, self.variants)
+
+    def take(self, resolution, now=None):
+        """A cached nudge for this resolution, or None on a miss."""
+        if not self.variants:
+            return None
+        pool = self._pool(normalize(resolution), now or time.time())
+        if self._exhausted(pool):
+            NUDGE_LOOKUPS.inc(result="miss")
+            return None
+        NUDGE_LOOKUPS.inc(result="hit")
+        text = pool.variants[pool.cursor % len(pool.variants)]
+        pool.cursor += 1
+        return text
+
+    def wanted(self, misses, now=None):
+        """{chat_id: resolution} missed this tick -> {chat_id: NUDGE_VARIANTS}
+        for one user per resolution that more than one of them share and
+        whose pool is exhausted or expired: ask the batch for that many."""
+        if self.variants < 2:
+            return {}
+        now = now or time.time()
+        groups = {}
+        for chat_id, resolution in misses.items():
+            groups.setdefault(normalize(resolution), []).append(chat_id)
+        return {members[0]: self.variants for key, members in groups.items()
+                if len(members) > 1 and self._exhausted(self._pool(key, now))}
+
+    def add(self, resolution, text, now=None):
+        """Adds a nudge generated for this resolution (a miss or a variant)."""
+        if not self.variants or not text:
+            return
+        pool = self._pool(normalize(resolution), now or time.time())
+        if len(pool.variants) < self.variants and text not in pool.variants:
+            pool.variants.append(text)
+
+
+NUDGES = NudgeCache(NUDGE_VARIANTS, NUDGE_TTL, NUDGE_MAX_KEYS)
@@ -0,0 +1,297 @@
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import (GUARDRAIL_CACHE_SIZE, OPIK_GUARDRAILS, OPIK_RESTRICTED_TOPICS,
+                             GUARDRAILS_FAIL_CLOSED, OPIK_TRACES, OPIK_PROJECT_NAME,
+                             TRACE_BATCH_SIZE, TRACE_FLUSH_INTERVAL, TRACE_MAX_PENDING)
+from app.core.metrics import GUARDRAIL_LATENCY, GUARDRAIL_VERDICTS, TRACE_EXPORTS
+
+# --- GUARDRAILS ---
+# Input checks run while the model is already generating; a failed check
+# cancels the generation and the user gets a fixed reply instead. Output
+# checks look at the finished text. The default checks are local regexes
+# (microseconds); Opik's hosted PII/topic guardrails can be added with
+# OPIK_GUARDRAILS=1 and run in a worker thread. Verdicts are cached per
+# text, and traces go to Opik in batches from a background task.
+
+SUPPORT_REPLY = ("It sounds like you are going through a lot right now. Please talk to someone you trust "
+                 "or a local crisis line, and if you are in danger, call your local emergency number. "
+                 "I am here for your goal whenever you are ready.")
+BLOCKED_REPLY = "I can't share that. Let's get back to your goal: what is the next small step?"
+
+_SELF_HARM = re.compile(
+    r"\b(kill(ing)? myself|suicid(e|al)|end(ing)? (it all|my life)|self[- ]?harm|want(ed)? to die|"
+    r"hurt(ing)? myself|cut(ting)? myself)\b",
+    re.IGNORECASE,
+)
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]*\w")
+_DIGITS = re.compile(r"(?<![\w:])\+?\d[\d ().-]{7,}\d(?![\w:])")
+
+
+def _luhn(digits):
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        d = int(d) * (2 if i % 2 else 1)
+        total += d - 9 if d > 9 else d
+    return total % 10 == 0
+
+
+def _pii(text):
+    """'email' / 'card' / 'phone' for the first PII found in `text`, else None."""
+    if _EMAIL.search(text):
+        return "email"
+    for match in _DIGITS.finditer(text):
+        digits = re.sub(r"\D", "", match.group(0))
+        if 13 <= len(digits) <= 19 and _luhn(digits):
+            return "card"
+        if 9 <= len(digits) <= 15:
+            return "phone"
+    return None
+
+
+def redact(text):
+    """`text` with emails and long digit runs masked, for traces."""
+    return _DIGITS.sub("[number]", _EMAIL.sub("[email]", text or ""))
+
+
+class Verdict:
+    __slots__ = ("passed", "check", "reason", "replacement")
+
+    def __init__(self, passed=True, check=None, reason=None, replacement=None):
+        self.passed = passed
+        self.check = check
+        self.reason = reason
+        self.replacement = replacement
+
+
+PASS = Verdict()
+
+
+# Local checks: text -> Verdict for a failure, None to pass.
+def moderation(text):
+    if _SELF_HARM.search(text):
+        return Verdict(False, "moderation", "self-harm", SUPPORT_REPLY)
+    return None
+
+
+def pii(text):
+    kind = _pii(text)
+    if kind:
+        return Verdict(False, "pii", kind, BLOCKED_REPLY)
+    return None
+
+
+class OpikGuard:
+    """Opik's hosted PII and/or topic guardrail. Blocking: the pipeline runs
+    it in a worker thread. Raises if the backend cannot answer."""
+
+    def __init__(self, pii=True, restricted_topics=()):
+        self.pii = pii
+        self.restricted_topics = list(restricted_topics)
+        self._guardrail = None
+
+    def __call__(self, text):
+        from opik.exceptions import GuardrailValidationFailed  # heavy; only imported when enabled
+
+        if self._guardrail is None:
+            from opik.guardrails import Guardrail, PII, Topic
+            guards = [PII()] if self.pii else []
+            if self.restricted_topics:
+                guards.append(Topic(restricted_topics=self.restricted_topics))
+            self._guardrail = Guardrail(guards=guards)
+        try:
+            self._guardrail.validate(text)
+        except GuardrailValidationFailed as e:
+            kinds = ",".join(sorted({v.type.value for v in e.failed_validations})) or "opik"
+            return Verdict(False, "opik", kinds, BLOCKED_REPLY)
+        return None
+
+
+class TraceExporter:
+    """Collects traces on the event loop and hands them to `sink` (blocking,
+    run in a worker thread) in batches of `batch_size`, or every `interval`
+    seconds. Past `max_pending` unsent traces the oldest are dropped."""
+
+    def __init__(self, sink, batch_size=50, interval=5.0, max_pending=5000):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def add(self, trace):
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            TRACE_EXPORTS.inc(result="dropped")
+        self._pending.append(trace)
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self._flush()
+
+    async def _flush(self):
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            try:
+                await asyncio.to_thread(self.sink, batch)
+            except Exception as e:
+                TRACE_EXPORTS.inc(len(batch), result="failed")
+                print(f"⚠️ Trace export failed for {len(batch)} traces: {e}")
+                return
+            TRACE_EXPORTS.inc(len(batch), result="sent")
+
+    async def stop(self):
+        """Sends whatever is still pending (for shutdown)."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._flush()
+
+
+_opik_client = None
+
+
+def _opik_sink(batch):
+    global _opik_client
+    import opik  # heavy (~2s); only ever imported here, in the exporter's worker thread
+
+    if _opik_client is None:
+        _opik_client = opik.Opik(project_name=OPIK_PROJECT_NAME)
+    for trace in batch:
+        _opik_client.trace(**trace)
+    _opik_client.flush()
+
+
+class Guardrails:
+    def __init__(self, input_checks, output_checks, remote_checks=None, cache_size=5000,
+                 fail_closed=False, exporter=None):
+        self.checks = {"input": list(input_checks), "output": list(output_checks)}
+        self.remote_checks = remote_checks or {}  # stage -> blocking callables
+        self.cache_size = cache_size
+        self.fail_closed = fail_closed
+        self.exporter = exporter
+        self._verdicts = OrderedDict()  # (stage, text digest) -> Verdict
+
+    async def check(self, stage, text):
+        """The verdict for `text` at `stage` ("input" or "output")."""
+        key = (stage, hashlib.sha1(text.encode()).digest())
+        verdict = self._verdicts.get(key)
+        if verdict is not None:
+            self._verdicts.move_to_end(key)
+            GUARDRAIL_VERDICTS.inc(stage=stage, check=verdict.check or "all", result="cached")
+            return verdict
+
+        start = time.perf_counter()
+        cacheable = True
+        verdict = next((v for v in (check(text) for check in self.checks[stage]) if v), None)
+        remote = self.remote_checks.get(stage)
+        if verdict is None and remote:
+            results = await asyncio.gather(*(asyncio.to_thread(check, text) for check in remote),
+                                           return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    cacheable = False  # ask again next time
+                    print(f"⚠️ Guardrail backend failed ({str(result)[:120]})")
+                    if self.fail_closed:
+                        verdict = verdict or Verdict(False, "unavailable", str(result)[:200], BLOCKED_REPLY)
+                elif result is not None:
+                    verdict = verdict or result
+        verdict = verdict or PASS
+        GUARDRAIL_LATENCY.observe(time.perf_counter() - start, stage=stage)
+        GUARDRAIL_VERDICTS.inc(stage=stage, check=verdict.check or "all",
+                               result="pass" if verdict.passed else "block")
+        if cacheable:
+            self._verdicts[key] = verdict
+            while len(self._verdicts) > self.cache_size:
+                self._verdicts.popitem(last=False)
+        return verdict
+
+    @property
+    def previews(self):
+        """Whether partial replies may be shown: only if every check is local,
+        so a preview never goes out before a remote verdict."""
+        return not any(self.remote_checks.values())
+
+    def screen(self, text):
+        """The local output checks on a partial reply (a streamed preview):
+        the failing Verdict, or None. Not cached; `guard` still checks the end."""
+        return next((v for v in (check(text) for check in self.checks["output"]) if v), None)
+
+    async def guard(self, user_input, generation):
+        """Awaits `generation` (a coroutine returning the model's output) with
+        the input checks running alongside it, then checks the output.
+
+        Returns (text, verdict): the output, or the fixed reply of the check
+        that failed. A failed input check cancels the generation."""
+        generating = asyncio.ensure_future(generation)
+        try:
+            verdict = await self.check("input", user_input)
+        except BaseException:
+            generating.cancel()
+            raise
+        if not verdict.passed:
+            generating.cancel()
+            await asyncio.gather(generating, return_exceptions=True)
+            return verdict.replacement, verdict
+        output = await generating
+        if output.startswith("⚠️ SYSTEM ERROR"):
+            return output, verdict
+        verdict = await self.check("output", output)
+        return (output if verdict.passed else verdict.replacement), verdict
+
+    def record(self, chat_id, phase, user_input, output, verdict, seconds):
+        """Queues one coach turn for Opik (PII redacted); a no-op without an exporter."""
+        if self.exporter is None:
+            return
+        end = datetime.now(timezone.utc)
+        self.exporter.add({
+            "name": "coach",
+            "start_time": end - timedelta(seconds=seconds),
+            "end_time": end,
+            "input": {"message": redact(user_input)},
+            "output": {"reply": redact(output)},
+            "metadata": {"phase": phase, "guardrail": verdict.check, "reason": verdict.reason},
+            "tags": [phase] + ([] if verdict.passed else ["blocked"]),
+            "thread_id": str(chat_id),
+        })
+
+    async def stop(self):
+        if self.exporter:
+            await self.exporter.stop()
+
+
+def _remote_checks():
+    if not OPIK_GUARDRAILS:
+        return {}
+    # Users may share their own contact details: PII is only checked on the way out.
+    checks = {"output": [OpikGuard(pii=True, restricted_topics=OPIK_RESTRICTED_TOPICS)]}
+    if OPIK_RESTRICTED_TOPICS:
+        checks["input"] = [OpikGuard(pii=False, restricted_topics=OPIK_RESTRICTED_TOPICS)]
+    return checks
+
+
+# The user's own message is not checked for PII; the coach's reply is.
+GUARDRAILS = Guardrails(
+    input_checks=[moderation],
+    output_checks=[moderation, pii],
+    remote_checks=_remote_checks(),
+    cache_size=GUARDRAIL_CACHE_SIZE,
+    fail_closed=GUARDRAILS_FAIL_CLOSED,
+    exporter=TraceExporter(_opik_sink, TRACE_BATCH_SIZE, TRACE_FLUSH_INTERVAL, TRACE_MAX_PENDING) if OPIK_TRACES else None,
+)
@@ -0,0 +1,228 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from app.core.config import (USER_DB_FILE, OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS, OUTBOX_BACKOFF_BASE,
+                             OUTBOX_BACKOFF_MAX, OUTBOX_POLL_INTERVAL, OUTBOX_CLAIM_TTL, OUTBOX_RETENTION)
+from app.core.metrics import REMINDER_LAG, Gauge
+from app.services.telegram_bot import LIMITER
+
+# --- OUTBOX ---
+# Generated reminders are written here before anything is sent, keyed by an
+# idempotency key (one per user per fire time). A message is marked sent
+# only after Telegram accepts it, so a failed send or a restart mid-tick
+# leaves it pending for the sender loop, and a known key is never
+# generated again. A claim holds a row for OUTBOX_CLAIM_TTL seconds, so
+# processes sharing the store never send the same row at once; a crashed
+# claim just expires. A row whose turn at the rate limiter comes after half
+# the TTL is not sent but left for the next claim, so a long queue of
+# claimed batches cannot outlive its claims.
+# The SQLite calls block (busy_timeout), so they run in worker threads.
+
+
+class _ClaimExpired(Exception):
+    """The row waited too long to be sent under its claim; someone reclaims it."""
+
+
+def reminder_key(chat_id, scheduled_at):
+    return f"reminder:{chat_id}:{scheduled_at:%Y-%m-%dT%H:%MZ}"
+
+
+class Outbox:
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._conn = None
+        self._db_lock = threading.Lock()  # one connection, used from worker threads
+        self._sending = asyncio.Lock()
+        self._task = None
+        self._bot = None
+        self._last_prune = 0.0
+
+    def _db(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_file, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("CREATE TABLE IF NOT EXISTS outbox ("
+                         "key TEXT PRIMARY KEY, chat_id INTEGER NOT NULL, text TEXT NOT NULL, "
+                         "scheduled_at REAL NOT NULL, next_attempt REAL NOT NULL, "
+                         "attempts INTEGER NOT NULL DEFAULT 0, sent_at REAL, failed_at REAL, last_error TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (next_attempt) "
+                         "WHERE sent_at IS NULL AND failed_at IS NULL")
+            self._conn = conn
+        return self._conn
+
+    def existing(self, keys):
+        """The subset of `keys` already in the outbox (pending, sent or dead). Blocking."""
+        keys = list(keys)
+        found = set()
+        with self._db_lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                found.update(row[0] for row in self._db().execute(
+                    f"SELECT key FROM outbox WHERE key IN ({marks})", chunk))
+        return found
+
+    def enqueue(self, rows):
+        """rows: (key, chat_id, text, scheduled_at epoch). Known keys are ignored. Blocking."""
+        with self._db_lock:
+            self._enqueue(rows)
+
+    def _enqueue(self, rows):
+        now = time.time()
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR IGNORE INTO outbox (key, chat_id, text, scheduled_at, next_attempt) "
+                             "VALUES (?, ?, ?, ?, ?)",
+                             [(key, chat_id, text, scheduled_at, now) for key, chat_id, text, scheduled_at in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def _claim(self, keys=None, limit=OUTBOX_BATCH_SIZE):
+        """Takes due rows (optionally only `keys`) for OUTBOX_CLAIM_TTL seconds. Blocking."""
+        with self._db_lock:
+            return self._claim_rows(keys, limit)
+
+    def _claim_rows(self, keys, limit):
+        now = time.time()
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            query = ("SELECT key, chat_id, text, scheduled_at, attempts FROM outbox "
+                     "WHERE sent_at IS NULL AND failed_at IS NULL AND next_attempt <= ?")
+            params = [now]
+            if keys is not None:
+                keys = list(keys)[:limit]
+                query += f" AND key IN ({','.join('?' * len(keys))})"
+                params += keys
+            rows = conn.execute(query + " ORDER BY next_attempt LIMIT ?", params + [limit]).fetchall()
+            conn.executemany("UPDATE outbox SET next_attempt = ? WHERE key = ?",
+                             [(now + OUTBOX_CLAIM_TTL, row[0]) for row in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    async def deliver(self, bot, keys=None):
+        """Claims due rows (only `keys`, if given) and sends them concurrently,
+        paced by the Telegram limiter. Failures are rescheduled with backoff.
+
+        Returns {key: lag_seconds or exception} for the rows it claimed."""
+        if keys is not None and not keys:
+            return {}
+        send_by = time.time() + OUTBOX_CLAIM_TTL / 2  # taken before the claim: never later than half its TTL
+        async with self._sending:  # one claim at a time; the sends overlap
+            rows = await asyncio.to_thread(self._claim, keys)
+        results = await asyncio.gather(*(self._send(bot, send_by, *row) for row in rows), return_exceptions=True)
+        await asyncio.to_thread(self._record, rows, results)
+        return {row[0]: result for row, result in zip(rows, results)}
+
+    def _record(self, rows, results):
+        """Blocking."""
+        with self._db_lock:
+            self._record_rows(rows, results)
+
+    def _record_rows(self, rows, results):
+        now = time.time()
+        sent, retry, dead = [], [], []
+        for (key, chat_id, _, _, attempts), result in zip(rows, results):
+            if isinstance(result, _ClaimExpired):
+                continue  # untouched: due again, for whoever claims it next
+            if not isinstance(result, BaseException):
+                sent.append((now, key))
+                continue
+            delay = _retry_delay(result, attempts + 1)
+            if delay is None or attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+                dead.append((now, attempts + 1, str(result), key))
+                print(f"   ❌ Gave up on reminder for {chat_id} after {attempts + 1} attempts: {result}")
+            else:
+                retry.append((now + delay, attempts + 1, str(result), key))
+                print(f"   ⚠️ Send to {chat_id} failed ({result}), retrying in {delay:.0f}s")
+
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("UPDATE outbox SET sent_at = ? WHERE key = ?", sent)
+            conn.executemany("UPDATE outbox SET next_attempt = ?, attempts = ?, last_error = ? WHERE key = ?", retry)
+            conn.executemany("UPDATE outbox SET failed_at = ?, attempts = ?, last_error = ? WHERE key = ?", dead)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    async def _send(self, bot, send_by, key, chat_id, text, scheduled_at, attempts):
+        await LIMITER.wait(chat_id)
+        if time.time() > send_by:
+            raise _ClaimExpired(key)
+        await bot.send_message(chat_id=chat_id, text=text)
+        lag = time.time() - scheduled_at
+        REMINDER_LAG.observe(lag)
+        print(f"   🔔 Sent to {chat_id} (lag {lag:.1f}s{f', attempt {attempts + 1}' if attempts else ''})")
+        return lag
+
+    def prune(self, now=None):
+        """Drops rows finished more than OUTBOX_RETENTION seconds ago. Blocking."""
+        cutoff = (now or time.time()) - OUTBOX_RETENTION
+        with self._db_lock:
+            return self._db().execute("DELETE FROM outbox WHERE COALESCE(sent_at, failed_at) < ?",
+                                      (cutoff,)).rowcount
+
+    def stats(self):
+        """Blocking: called from sync (threadpool) routes and the metrics scrape."""
+        with self._db_lock:
+            row = self._db().execute(
+                "SELECT SUM(sent_at IS NULL AND failed_at IS NULL), SUM(sent_at IS NOT NULL), "
+                "SUM(failed_at IS NOT NULL) FROM outbox").fetchone()
+        return {"pending": row[0] or 0, "sent": row[1] or 0, "failed": row[2] or 0}
+
+    async def _run(self):
+        """Retries and leftovers (e.g. from before a restart); fresh reminders
+        are delivered by the dispatcher right after they are enqueued."""
+        while True:
+            try:
+                while await self.deliver(self._bot):
+                    pass  # keep going while rows are due
+                if time.time() - self._last_prune > 3600:
+                    self._last_prune = time.time()
+                    await asyncio.to_thread(self.prune)
+            except Exception as e:
+                print(f"❌ Outbox pass failed: {e}")
+            await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+
+    def start(self, bot):
+        self._bot = bot
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def _retry_delay(error, attempt):
+    """Seconds until the next try, or None if retrying cannot help."""
+    from telegram.error import BadRequest, Forbidden, InvalidToken, RetryAfter
+
+    if isinstance(error, RetryAfter):
+        delay = error.retry_after  # int or timedelta, depending on the PTB version
+        return delay.total_seconds() if hasattr(delay, "total_seconds") else float(delay)
+    if isinstance(error, (BadRequest, Forbidden, InvalidToken)):
+        return None  # e.g. the user blocked the bot
+    # Timeouts, network errors and 5xx: exponential backoff
+    return min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** (attempt - 1))
+
+
+OUTBOX = Outbox(USER_DB_FILE)
+Gauge("resolveai_outbox_messages", "Reminder outbox rows by state.",
+      lambda: {(state,): count for state, count in OUTBOX.stats().items()}, ("state",))
@@ -0,0 +1,258 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from app.core.metrics import TICK_LATENCY
+from app.core.config import PROACTIVE_BATCH_SIZE, PROACTIVE_MAX_LAG, DEFAULT_TIMEZONE
+from app.services.llm_queue import StaleJobError
+from app.services.nudge_cache import NUDGES
+from app.services.outbox import OUTBOX, reminder_key
+from app.storage import get_user
+
+# Upper bound on one sleep, so a wall-clock jump (NTP, suspend) is noticed.
+MAX_SLEEP = 300.0
+
+
+async def _store_and_send(application, messages, scheduled_at):
+    """Writes {chat_id: message} to the outbox, then sends it.
+
+    Returns {chat_id: lag_seconds, None when the send failed and will be
+    retried, or the exception if the batch could not be stored}."""
+    # Durable before the first attempt: from here on a reminder can be
+    # resent, but it is never regenerated or lost.
+    keys = {reminder_key(chat_id, scheduled_at): chat_id for chat_id in messages}
+    try:
+        await asyncio.to_thread(OUTBOX.enqueue, [(key, chat_id, f"⚡ {messages[chat_id]}", scheduled_at.timestamp())
+                                                 for key, chat_id in keys.items()])
+    except Exception as e:
+        # Only this batch is lost (nothing was sent); the tick's other batches go on
+        print(f"   ❌ Could not store {len(keys)} reminders in the outbox: {e}")
+        return {chat_id: e for chat_id in messages}
+    try:
+        results = await OUTBOX.deliver(application.bot, keys)
+    except Exception as e:
+        print(f"   ⚠️ Could not send {len(keys)} stored reminders now ({e}), the outbox retries them")
+        return dict.fromkeys(messages)
+    # A failed send is not an error here: it is already rescheduled (None).
+    return {keys[key]: None if isinstance(result, BaseException) else result for key, result in results.items()}
+
+
+async def _remind_batch(application, batch, scheduled_at, variants):
+    """Generates one batch in a single model call, stores the messages in the
+    outbox, then sends them. A failed send stays in the outbox for retry.
+    Users in `variants` also bring alternative nudges for the nudge cache.
+
+    Generation waits in the shared LLM queue at "proactive" priority (capped
+    at PROACTIVE_CONCURRENCY across ticks) and is dropped if live chats keep
+    it queued past PROACTIVE_MAX_LAG. Returns {chat_id: lag_seconds, exception,
+    or None when the send failed and will be retried}."""
+    from app.brain import generate_proactive_batch  # heavy; main imports this module at boot
+
+    deadline = scheduled_at.timestamp() + PROACTIVE_MAX_LAG
+    alternatives = {}
+    try:
+        messages = await generate_proactive_batch(batch, deadline, variants, alternatives)
+    except Exception as e:
+        return {chat_id: e for chat_id in batch}
+
+    for chat_id, message in messages.items():
+        if not message.startswith("⚠️ SYSTEM ERROR"):
+            for text in [message, *alternatives.get(chat_id, [])]:
+                NUDGES.add(batch[chat_id].get("resolution"), text)  # paid for already: reuse it
+    return await _store_and_send(application, messages, scheduled_at)
+
+
+async def dispatch_proactive(application, due, scheduled_at):
+    """Fans out reminders for every due user concurrently.
+
+    `due` is {chat_id: data}; `scheduled_at` is when they were due (UTC).
+    Users whose resolution has a cached nudge get it without a model call;
+    the rest are packed PROACTIVE_BATCH_SIZE to a model call, which also
+    drafts the variants for pools the tick found empty. Users whose
+    reminder for this instant is already in the outbox are skipped.
+    Returns {chat_id: lag_seconds} for the messages actually sent."""
+    keys = {chat_id: reminder_key(chat_id, scheduled_at) for chat_id in due}
+    known = await asyncio.to_thread(OUTBOX.existing, keys.values())
+    if known:
+        print(f"   📬 {len(known)} reminders already in the outbox, not generating them again")
+        due = {chat_id: data for chat_id, data in due.items() if keys[chat_id] not in known}
+    cached = {}
+    for chat_id, data in due.items():
+        message = NUDGES.take(data.get("resolution"))
+        if message:
+            cached[chat_id] = message
+    hits = list(cached.items())
+    items = [(chat_id, data) for chat_id, data in due.items() if chat_id not in cached]
+    variants = NUDGES.wanted({chat_id: data.get("resolution") for chat_id, data in items})
+    batches = [dict(items[i:i + PROACTIVE_BATCH_SIZE]) for i in range(0, len(items), PROACTIVE_BATCH_SIZE)]
+    outcomes = await asyncio.gather(
+        *(_store_and_send(application, dict(hits[i:i + PROACTIVE_BATCH_SIZE]), scheduled_at)
+          for i in range(0, len(hits), PROACTIVE_BATCH_SIZE)),
+        *(_remind_batch(application, batch, scheduled_at, variants) for batch in batches),
+    )
+
+    lags, stale, retrying = {}, 0, 0
+    for outcome in outcomes:
+        for chat_id, result in outcome.items():
+            if isinstance(result, StaleJobError):
+                stale += 1
+            elif result is None:
+                retrying += 1
+            elif isinstance(result, BaseException):
+                print(f"   ❌ Reminder for {chat_id} failed: {result}")
+            else:
+                lags[chat_id] = result
+    if stale:
+        print(f"   ⚠️ Dropped {stale} reminders still queued {PROACTIVE_MAX_LAG:.0f}s after they were due")
+    if retrying:
+        print(f"   📬 {retrying} reminders failed to send and wait in the outbox for retry")
+    if lags:
+        print(f"   📬 {len(lags)}/{len(due)} reminders sent, {len(cached)} from cache, {len(batches)} model batches, "
+              f"max lag {max(lags.values()):.1f}s, avg {sum(lags.values()) / len(lags):.1f}s")
+    return lags
+
+
+# --- NEXT-FIRE SCHEDULER ---
+def zone_for(name):
+    """ZoneInfo for an IANA name, falling back to DEFAULT_TIMEZONE.
+
+    Returns None for "server local time"."""
+    for candidate in (name, DEFAULT_TIMEZONE):
+        if candidate:
+            try:
+                return ZoneInfo(candidate)
+            except (ZoneInfoNotFoundError, ValueError):
+                continue
+    return None
+
+
+def next_fire(data, after):
+    """The first UTC instant strictly after `after` when the user's local
+    clock reads their reminder_time."""
+    hour, minute = map(int, data["reminder_time"].split(":"))
+    tz = zone_for(data.get("timezone"))
+    # Naive datetimes are server-local; aware ones keep wall-clock arithmetic
+    # under zoneinfo, so "+1 day" stays correct across DST changes.
+    local = after.astimezone().replace(tzinfo=None) if tz is None else after.astimezone(tz)
+    candidate = local.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= local:
+        candidate += timedelta(days=1)
+    return candidate.astimezone(timezone.utc)
+
+
+def _is_scheduled(data):
+    return bool(data and data.get("phase") == "active" and data.get("reminder_time"))
+
+
+class ReminderScheduler:
+    """Min-heap of (next fire time in UTC, chat_id, version).
+
+    The loop sleeps exactly until the head of the heap is due, pops every due
+    entry, hands each same-instant group to `fire(due, scheduled_at)` and
+    re-heaps those users for their next day. reschedule() (wired to storage
+    saves) bumps the user's version, which lazily invalidates older entries.
+    A late wake-up still fires everything that became due while it slept.
+
+    `owns(chat_id)`, if set, limits the heap to this process's shards."""
+
+    def __init__(self, fire, owns=None):
+        self.fire = fire
+        self.owns = owns
+        self._heap = []
+        self._versions = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._inflight = set()
+
+    def _mine(self, chat_id):
+        return self.owns is None or self.owns(chat_id)
+
+    def load(self, users, now=None):
+        now = now or datetime.now(timezone.utc)
+        for chat_id, data in users.items():
+            self._versions[chat_id] = self._versions.get(chat_id, 0) + 1
+            if _is_scheduled(data) and self._mine(chat_id):
+                self._heap.append((next_fire(data, now), chat_id, self._versions[chat_id]))
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def reschedule(self, chat_id, data, now=None):
+        version = self._versions.get(chat_id, 0) + 1
+        self._versions[chat_id] = version
+        if not _is_scheduled(data) or not self._mine(chat_id):
+            return
+        entry = (next_fire(data, now or datetime.now(timezone.utc)), chat_id, version)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def pop_due(self, now):
+        """Removes everything due at `now`; returns {scheduled_at: {chat_id: data}}."""
+        groups = {}
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, chat_id, version = heapq.heappop(self._heap)
+            if self._versions.get(chat_id) != version:
+                continue  # superseded by a later save
+            data = get_user(chat_id)
+            if not _is_scheduled(data) or not self._mine(chat_id):
+                continue  # dropped; a regained shard is re-loaded wholesale
+            groups.setdefault(fire_at, {})[chat_id] = data
+            # Next day counted from now, so a very late wake-up fires once, not per missed day.
+            heapq.heappush(self._heap, (next_fire(data, max(fire_at, now)), chat_id, version))
+        return groups
+
+    async def fire_due(self, now=None):
+        """Fires everything due at `now` and waits for the sends to finish."""
+        groups = self.pop_due(now or datetime.now(timezone.utc))
+        await asyncio.gather(*(self._fire(due, at) for at, due in sorted(groups.items())))
+
+    async def _fire(self, due, scheduled_at):
+        print(f"⏰ Firing {len(due)} reminders scheduled for {scheduled_at:%H:%M} UTC")
+        start = time.perf_counter()
+        try:
+            await self.fire(due, scheduled_at)
+        except Exception as e:
+            print(f"   ❌ Reminder batch failed: {e}")
+        TICK_LATENCY.observe(time.perf_counter() - start)
+
+    async def _run(self):
+        while True:
+            now = datetime.now(timezone.utc)
+            for scheduled_at, due in sorted(self.pop_due(now).items()):
+                task = asyncio.create_task(self._fire(due, scheduled_at))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+
+            self._wakeup.clear()
+            delay = MAX_SLEEP
+            if self._heap:
+                delay = min(MAX_SLEEP, (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds())
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def halt(self):
+        """Stops the loop: nothing new fires. Groups already firing go on."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def stop(self, drain=0.0):
+        """Stops firing; reminder groups already firing get up to `drain`
+        seconds to finish before they are cancelled. Returns how many were."""
+        await self.halt()
+        inflight = set(self._inflight)
+        if inflight and drain > 0:
+            _, inflight = await asyncio.wait(inflight, timeout=drain)
+        for task in inflight:
+            task.cancel()
+        await asyncio.gather(*inflight, return_exceptions=True)
+        return len(inflight)
@@ -0,0 +1,138 @@
+import asyncio
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+# --- SHARDED DEPLOYMENT ---
+# chat_ids are hash-partitioned into SHARD_COUNT shards. Every process that
+# shares the store heartbeats into `members` and holds time-limited leases
+# in `shard_leases`; the holder of a shard's lease is the only process that
+# fires reminders for that shard. Each process aims for a fair share
+# (ceil(shards / live members)), so shards spread out as workers start and
+# are taken over within one lease TTL when a worker dies.
+
+
+def shard_of(chat_id, shard_count):
+    """Stable across processes (unlike hash(), which is salted per process)."""
+    return zlib.crc32(str(chat_id).encode()) % shard_count
+
+
+class ShardCoordinator:
+    def __init__(self, db_file, shard_count, lease_ttl=15.0, on_gain=None):
+        self.db_file = db_file
+        self.shard_count = shard_count
+        self.lease_ttl = lease_ttl
+        self.on_gain = on_gain  # called with the set of newly owned shards
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.owned = set()
+        self.valid_until = 0.0  # our leases lapse at this time unless renewed
+        self._conn = None
+        self._db_lock = threading.Lock()  # rebalance/release_all run in worker threads
+        self._stopped = False
+        self._task = None
+
+    def owns(self, chat_id):
+        # A stalled process must not keep firing once its leases have lapsed.
+        return time.time() < self.valid_until and shard_of(chat_id, self.shard_count) in self.owned
+
+    def _connect(self):
+        # Used from worker threads (one call at a time), never on the event loop
+        conn = sqlite3.connect(self.db_file, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("CREATE TABLE IF NOT EXISTS members (owner TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS shard_leases "
+                     "(shard INTEGER PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+        return conn
+
+    def rebalance(self, now=None):
+        """Heartbeat, renew, release extras and claim free shards, all in one
+        transaction. Returns (gained, lost) shard sets. Blocking: may wait
+        up to busy_timeout for another process, so run it in a thread."""
+        with self._db_lock:
+            if self._stopped:
+                return set(), set()  # a renewal that outlived stop() must not claim again
+            if self._conn is None:
+                self._conn = self._connect()
+            return self._rebalance(self._conn, now or time.time())
+
+    def _rebalance(self, conn, now):
+        expires = now + self.lease_ttl
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO members (owner, expires_at) VALUES (?, ?) "
+                         "ON CONFLICT (owner) DO UPDATE SET expires_at = excluded.expires_at",
+                         (self.owner, expires))
+            conn.execute("DELETE FROM members WHERE expires_at < ?", (now,))
+            live = conn.execute("SELECT COUNT(*) FROM members").fetchone()[0]
+            target = math.ceil(self.shard_count / max(1, live))
+
+            mine = [row[0] for row in conn.execute(
+                "SELECT shard FROM shard_leases WHERE owner = ? AND expires_at >= ? ORDER BY shard",
+                (self.owner, now))]
+            keep, release = mine[:target], mine[target:]
+            if release:
+                conn.executemany("DELETE FROM shard_leases WHERE shard = ? AND owner = ?",
+                                 [(shard, self.owner) for shard in release])
+            conn.executemany("UPDATE shard_leases SET expires_at = ? WHERE shard = ? AND owner = ?",
+                             [(expires, shard, self.owner) for shard in keep])
+
+            taken = {row[0] for row in conn.execute(
+                "SELECT shard FROM shard_leases WHERE expires_at >= ?", (now,))}
+            free = [shard for shard in range(self.shard_count) if shard not in taken]
+            claim = free[:max(0, target - len(keep))]
+            conn.executemany("INSERT INTO shard_leases (shard, owner, expires_at) VALUES (?, ?, ?) "
+                             "ON CONFLICT (shard) DO UPDATE SET owner = excluded.owner, "
+                             "expires_at = excluded.expires_at",
+                             [(shard, self.owner, expires) for shard in claim])
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+        owned = set(keep) | set(claim)
+        gained, lost = owned - self.owned, self.owned - owned
+        self.owned = owned
+        self.valid_until = expires
+        return gained, lost
+
+    def release_all(self):
+        """Gives up every lease now, so a clean shutdown hands over instantly.
+        No rebalance claims anything afterwards."""
+        with self._db_lock:
+            self._stopped = True
+            self.owned = set()
+            if self._conn is None:
+                return
+            self._conn.execute("DELETE FROM shard_leases WHERE owner = ?", (self.owner,))
+            self._conn.execute("DELETE FROM members WHERE owner = ?", (self.owner,))
+
+    async def _run(self):
+        while True:
+            try:
+                gained, lost = await asyncio.to_thread(self.rebalance)  # may wait on busy_timeout
+                if gained or lost:
+                    print(f"🧩 Shards now {sorted(self.owned)} (+{sorted(gained)} -{sorted(lost)})")
+                if gained and self.on_gain:
+                    self.on_gain(gained)
+            except Exception as e:
+                # Could not renew: stop firing until we can, another process takes over.
+                print(f"❌ Lease renewal failed: {e}")
+                self.owned = set()
+            await asyncio.sleep(self.lease_ttl / 3)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.release_all)
@@ -0,0 +1,144 @@
+import hashlib
+import random
+import re
+import time
+from collections import OrderedDict
+
+from app.core.config import (MENTOR_CACHE_SIZE, MENTOR_CACHE_TTL, MENTOR_CACHE_THRESHOLD,
+                             MENTOR_CACHE_MIN_WORDS, MENTOR_CACHE_BANDS, MENTOR_CACHE_ROWS)
+from app.core.metrics import MENTOR_CACHE_LOOKUPS
+from app.services.nudge_cache import normalize
+
+# --- SIMILARITY CACHE ---
+# Users with the same resolution ask the same things ("give me a 7-day
+# plan", "can you give me a 7 day plan?"). Each question becomes a MinHash
+# signature over its character shingles. An LSH index (bands x rows of the
+# signature) finds candidate questions with the same resolution, and a hit
+# needs an estimated Jaccard similarity of at least `threshold` and the same
+# numbers ("3-day plan" is not "7-day plan"). Entries expire after `ttl` seconds and the least recently used go past `max_size`.
+# Short questions ("why?", "what next") depend on the conversation, so they
+# are never cached; the longer ones are answered without it (see brain.py),
+# so a reply never carries anything about the user who asked first.
+
+_FILLER = {"please", "can", "could", "would", "you", "me", "i", "a", "an", "the", "to", "for", "my", "just", "pls"}
+
+
+def _words(text):
+    return re.sub(r"[^a-z0-9 ]+", " ", (text or "").lower()).split()
+
+
+def _numbers(text):
+    return frozenset(re.findall(r"\d+", text or ""))
+
+
+def _shingles(words, k=3):
+    """Character k-grams of the content words, so '7-day' and '7 day' agree."""
+    text = " ".join(w for w in words if w not in _FILLER) or " ".join(words)
+    return {text[i:i + k] for i in range(max(1, len(text) - k + 1))}
+
+
+class _Entry:
+    __slots__ = ("resolution", "signature", "numbers", "reply", "created")
+
+    def __init__(self, resolution, signature, numbers, reply, created):
+        self.resolution = resolution
+        self.signature = signature
+        self.numbers = numbers
+        self.reply = reply
+        self.created = created
+
+
+class SimilarityCache:
+    def __init__(self, max_size=5000, ttl=86400.0, threshold=0.7, min_words=4, bands=16, rows=4, seed=1):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.min_words = min_words
+        self.bands = bands
+        self.rows = rows
+        rng = random.Random(seed)
+        self._masks = [rng.getrandbits(64) for _ in range(bands * rows)]
+        self._entries = OrderedDict()  # id -> _Entry, least recently used first
+        self._buckets = {}             # (resolution, band, band hash) -> set of ids
+        self._next_id = 0
+
+    def shareable(self, question):
+        """Whether `question` is long enough to be cached (and the cache is on)."""
+        return bool(self.max_size) and len(_words(question)) >= self.min_words
+
+    def signature(self, question):
+        """MinHash signature of `question`, or None if it is too short to cache."""
+        words = _words(question)
+        if len(words) < self.min_words:
+            return None
+        bases = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little")
+                 for s in _shingles(words)]
+        return tuple(min(x ^ mask for x in bases) for mask in self._masks)
+
+    def _bands(self, signature):
+        r = self.rows
+        return [(band, hash(signature[band * r:(band + 1) * r])) for band in range(self.bands)]
+
+    def _similarity(self, a, b):
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+    def get(self, resolution, question, now=None):
+        """A cached reply to a near-duplicate question about the same resolution, or None."""
+        if not self.max_size:
+            return None
+        signature = self.signature(question)
+        if signature is None:
+            MENTOR_CACHE_LOOKUPS.inc(result="skip")
+            return None
+        now = now or time.time()
+        key = normalize(resolution)
+        numbers = _numbers(question)
+        candidates = set()
+        for band, value in self._bands(signature):
+            candidates |= self._buckets.get((key, band, value), set())
+        best, best_score = None, self.threshold
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            if now - entry.created > self.ttl:
+                self._remove(entry_id)
+                continue
+            if entry.numbers != numbers:
+                continue
+            score = self._similarity(signature, entry.signature)
+            if score >= best_score:
+                best, best_score = entry_id, score
+        if best is None:
+            MENTOR_CACHE_LOOKUPS.inc(result="miss")
+            return None
+        self._entries.move_to_end(best)
+        MENTOR_CACHE_LOOKUPS.inc(result="hit")
+        return self._entries[best].reply
+
+    def put(self, resolution, question, reply, now=None):
+        signature = self.signature(question)
+        if signature is None or not reply:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        entry = _Entry(normalize(resolution), signature, _numbers(question), reply, now or time.time())
+        self._entries[entry_id] = entry
+        for band, value in self._bands(signature):
+            self._buckets.setdefault((entry.resolution, band, value), set()).add(entry_id)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for band, value in self._bands(entry.signature):
+            bucket = self._buckets.get((entry.resolution, band, value))
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[(entry.resolution, band, value)]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+MENTOR_CACHE = SimilarityCache(MENTOR_CACHE_SIZE, MENTOR_CACHE_TTL, MENTOR_CACHE_THRESHOLD,
+                               MENTOR_CACHE_MIN_WORDS, MENTOR_CACHE_BANDS, MENTOR_CACHE_ROWS)
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+from app.core.config import TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE
+
+# Per-chat buckets are dropped once idle this long (they are full again by then).
+CHAT_BUCKET_IDLE = 60.0
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SendLimiter:
+    """Paces sends under Telegram's global and per-chat limits."""
+
+    def __init__(self, global_rate, chat_rate):
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self.chats = {}
+
+    async def wait(self, chat_id):
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            self._prune()
+            bucket = self.chats[chat_id] = TokenBucket(self.chat_rate, capacity=1)
+        # Per-chat first, so a chat waiting on its own limit holds no global token.
+        await bucket.acquire()
+        await self.global_bucket.acquire()
+
+    def _prune(self):
+        now = time.monotonic()
+        idle = [c for c, b in self.chats.items() if now - b.updated > CHAT_BUCKET_IDLE]
+        for chat_id in idle:
+            del self.chats[chat_id]
+
+
+LIMITER = SendLimiter(TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE)
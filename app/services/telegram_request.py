@@ -0,0 +1,27 @@
+import time
+
+from telegram.request import HTTPXRequest
+
+from app.core.metrics import TELEGRAM_LATENCY, TELEGRAM_ERRORS
+
+# getUpdates is a long poll: its latency is the poll timeout, not Telegram's speed.
+UNTIMED = {"getUpdates"}
+
+
+class MeteredRequest(HTTPXRequest):
+    """HTTPXRequest that records latency and errors for every Bot API call,
+    so sends, streaming edits and webhook setup are all measured in one place."""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(endpoint=endpoint, error=type(e).__name__)
+            raise
+        if endpoint not in UNTIMED:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+        if code >= 400:
+            TELEGRAM_ERRORS.inc(endpoint=endpoint, error=str(code))
+        return code, payload
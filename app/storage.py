@@ -1,38 +1,276 @@
+import atexit
 import json
 import os
+import sqlite3
+import threading
+import time
 
-DB_FILE = "user_db.json"
+from app.core.config import USER_DB_FILE, LEGACY_USER_DB_FILE, USER_DB_FLUSH_INTERVAL
+from app.core.metrics import STORE_SAVE_LATENCY, STORE_FLUSH_LATENCY, STORE_FLUSH_ROWS
+
+# --- STORAGE LAYOUT ---
+# USER_DB is the in-memory copy that every read is served from.
+# Writes only touch USER_DB and mark the fields they changed dirty.
+# A background thread flushes the dirty users to SQLite (WAL mode) in one
+# fsynced transaction every USER_DB_FLUSH_INTERVAL seconds, so a crash can
+# lose at most the last interval but never corrupt the file.
+# Every flushed row gets the next store-wide `version`, so processes sharing
+# the file can pull each other's writes: pull() reads them in a worker thread
+# and notify() then runs the schedule listeners on the loop. A flush only
+# writes the fields this process changed over the stored row, and pull()
+# keeps them over what it reads, so two processes editing different fields of one
+# user (a reminder time here, the conversation there) both keep their edit.
+# A field that both may append to (the conversation memory) registers a
+# merge function with add_merge(); it is merged with the stored copy on
+# flush and pull instead of replacing it.
+
+DB_FILE = USER_DB_FILE
+
+USER_DB = {}
+_DIRTY = {}                   # chat_id -> names of the fields changed since the last flush
+_LOCK = threading.Lock()      # guards USER_DB / _DIRTY
+_DB_LOCK = threading.Lock()   # guards the sqlite connection
+_STOP = threading.Event()
+_flusher = None
+_last_version = 0             # highest row version this process has seen
+_LISTENERS = []               # called with (chat_id, data) when a user's schedule changes
+_MERGES = {}                  # field -> fn(stored value, local value) -> merged value
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("PRAGMA busy_timeout=5000")  # other processes may hold the write lock
+    conn.execute("CREATE TABLE IF NOT EXISTS users (chat_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(users)")]
+    if "version" not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS users_version ON users (version)")
+    return conn
+
+
+def _migrate_legacy_json(conn, path):
+    """Imports the old whole-file JSON store, then moves it out of the way.
+
+    Rows already in SQLite win, so re-running after a crash is harmless."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        legacy = json.load(f)
+
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (chat_id, data) VALUES (?, ?)",
+        [(str(chat_id), json.dumps(data)) for chat_id, data in legacy.items()],
+    )
+    conn.execute("COMMIT")
+    os.replace(path, path + ".migrated")
+    print(f"📦 Migrated {len(legacy)} users from {path}")
+
+
+def _reminder_slot(data):
+    """The minute a user is due, or None if they get no proactive message."""
+    if data and data.get("phase") == "active":
+        return data.get("reminder_time")
+    return None
+
+
+def _schedule_changed(old, new):
+    return (_reminder_slot(old) != _reminder_slot(new)
+            or (old or {}).get("timezone") != (new or {}).get("timezone"))
+
+
+def add_listener(fn):
+    """Registers fn(chat_id, data), called after a save changes phase,
+    reminder_time or timezone. Runs in the caller's thread."""
+    _LISTENERS.append(fn)
+
+
+def add_merge(field, fn):
+    """Registers fn(stored, local) -> merged for `field`, for fields more
+    than one process appends to. Runs under the store locks: keep it pure."""
+    _MERGES[field] = fn
+
+
+def _apply(stored, fields):
+    """`stored` with this process's changed `fields` on top (or merged in)."""
+    data = dict(stored)
+    for field, value in fields.items():
+        merge = _MERGES.get(field)
+        data[field] = merge(stored[field], value) if merge and stored.get(field) is not None else value
+    return data
+
+
+def _notify(chat_id, old, new):
+    if _schedule_changed(old, new):
+        for fn in _LISTENERS:
+            fn(chat_id, new)
+
+
+_conn = _connect(DB_FILE)
+_migrate_legacy_json(_conn, LEGACY_USER_DB_FILE)
+for _chat_id, _data, _version in _conn.execute("SELECT chat_id, data, version FROM users"):
+    USER_DB[_chat_id] = json.loads(_data)
+    _last_version = max(_last_version, _version)
+
+
+def _mark(chat_id, fields):
+    """Caller holds _LOCK."""
+    _DIRTY.setdefault(chat_id, set()).update(fields)
+
+
+def _changed_fields(old, new):
+    return {k for k, v in new.items() if k not in old or old[k] != v}
+
+
+def flush():
+    """Writes every pending change to disk in one fsynced transaction.
+
+    Each row is the stored one with this process's changed fields on top
+    (merged, for fields registered with add_merge).
+    _DB_LOCK is held from taking the changes until the commit, so pull()
+    never finds them already clean but not yet stored."""
+    with _DB_LOCK:
+        with _LOCK:
+            if not _DIRTY:
+                return 0
+            pending = {chat_id: {f: USER_DB[chat_id].get(f) for f in fields} for chat_id, fields in _DIRTY.items()}
+            _DIRTY.clear()
+
+        start = time.perf_counter()
+        ids = list(pending)
+        try:
+            _conn.execute("BEGIN IMMEDIATE")
+            stored = {}
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                stored.update(_conn.execute(
+                    f"SELECT chat_id, data FROM users WHERE chat_id IN ({','.join('?' * len(batch))})", batch))
+            rows = [(chat_id, json.dumps(_apply(json.loads(stored.get(chat_id, "{}")), fields)))
+                    for chat_id, fields in pending.items()]
+            _conn.executemany(
+                "INSERT INTO users (chat_id, data, version) "
+                "VALUES (?, ?, (SELECT COALESCE(MAX(version), 0) + 1 FROM users)) "
+                "ON CONFLICT (chat_id) DO UPDATE SET data = excluded.data, version = excluded.version",
+                rows,
+            )
+            _conn.execute("COMMIT")
+        except Exception:
+            if _conn.in_transaction:
+                _conn.execute("ROLLBACK")
+            # Put them back so the next flush retries.
+            with _LOCK:
+                for chat_id, fields in pending.items():
+                    _mark(chat_id, fields)
+            raise
+    STORE_FLUSH_LATENCY.observe(time.perf_counter() - start)
+    STORE_FLUSH_ROWS.inc(len(rows))
+    return len(rows)
+
+
+def pull():
+    """Applies rows other processes flushed since the last call.
+
+    Fields changed here and not flushed yet win over the store (or are
+    merged with it, see add_merge); the rest
+    of the row is taken from it. Blocking, and fires no listeners, so it can
+    run in a worker thread: returns the (chat_id, old, new) changes to hand
+    to notify() on the loop."""
+    global _last_version
+    changed = []
+    with _DB_LOCK:
+        rows = _conn.execute(
+            "SELECT chat_id, data, version FROM users WHERE version > ? ORDER BY version",
+            (_last_version,),
+        ).fetchall()
+        with _LOCK:
+            for chat_id, raw, version in rows:
+                _last_version = max(_last_version, version)
+                current = USER_DB.get(chat_id)
+                data = json.loads(raw)
+                if chat_id in _DIRTY:
+                    data = _apply(data, {f: current.get(f) for f in _DIRTY[chat_id]})
+                if data == current:
+                    continue  # our own flush coming back
+                USER_DB[chat_id] = data
+                changed.append((chat_id, current, data))
+    return changed
+
+
+def notify(changed):
+    """Fires the schedule listeners for pull()'s changes, as for a local save."""
+    for chat_id, current, data in changed:
+        _notify(chat_id, current, data)
+
+
+def _flush_loop():
+    while not _STOP.wait(USER_DB_FLUSH_INTERVAL):
+        try:
+            flush()
+        except Exception as e:
+            print(f"❌ Storage flush failed: {e}")
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flush_loop, name="user-db-flusher", daemon=True)
+        _flusher.start()
+
+
+def close():
+    """Stops the flusher and writes whatever is still pending."""
+    _STOP.set()
+    flush()
+
+
+atexit.register(close)
 
-if os.path.exists(DB_FILE):
-    with open(DB_FILE, "r") as f:
-        USER_DB = json.load(f)
-else:
-    USER_DB = {}
 
 def save_user(chat_id, name, resolution, plan=None, phase="intake", reminder_time=None):
     """Saves user data including the specific Reminder Time."""
+    start = time.perf_counter()
     # Preserve existing data if updating
     current = USER_DB.get(str(chat_id), {})
-    
+
     # LOGIC: If a new reminder_time is passed, use it. Otherwise, keep the old one.
     final_time = reminder_time if reminder_time else current.get("reminder_time")
 
-    USER_DB[str(chat_id)] = {
+    data = {
+        **current,  # keep fields owned by other modules (e.g. conversation memory)
         "name": name,
         "resolution": resolution,
         "plan": plan or current.get("plan"),
         "phase": phase,
-        "reminder_time": final_time  # <--- THIS WAS MISSING IN YOUR CODE
+        "reminder_time": final_time
     }
-    
-    with open(DB_FILE, "w") as f:
-        json.dump(USER_DB, f)
-    
+    with _LOCK:
+        USER_DB[str(chat_id)] = data
+        _mark(str(chat_id), _changed_fields(current, data))
+    _ensure_flusher()
+    _notify(str(chat_id), current, data)
+    STORE_SAVE_LATENCY.observe(time.perf_counter() - start)
+
     # Debug print to confirm it saved
     print(f"💾 Saved {name}: Phase={phase}, Time={final_time}")
 
+def update_user(chat_id, **fields):
+    """Patches fields on an existing user without touching the rest."""
+    start = time.perf_counter()
+    with _LOCK:
+        current = USER_DB.get(str(chat_id))
+        if current is None:
+            return
+        data = {**current, **fields}
+        USER_DB[str(chat_id)] = data
+        _mark(str(chat_id), fields)
+    _ensure_flusher()
+    _notify(str(chat_id), current, data)
+    STORE_SAVE_LATENCY.observe(time.perf_counter() - start)
+
 def get_user(chat_id):
     return USER_DB.get(str(chat_id))
 
 def get_all_users():
-    return USER_DB
\ No newline at end of file
+    return USER_DB
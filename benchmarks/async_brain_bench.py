@@ -0,0 +1,62 @@
+"""Shows concurrent chats overlapping on the async brain.
+
+Starts the fake Gemini server, then answers N chats at once two ways:
+  * blocking: the old path, a synchronous generate_content inside the handler
+  * async:    BRAIN_ENGINE.ainvoke on the shared pooled session
+
+With a model latency L the blocking path takes ~N*L, the async path ~L.
+
+    python -m benchmarks.async_brain_bench [chats] [latency_s]
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_gemini import create_app, free_port, serve
+
+
+async def main(chats, latency):
+    port = free_port()
+    tmp = tempfile.mkdtemp()
+    os.environ.update(
+        GEMINI_API_KEY="fake",
+        GEMINI_BASE_URL=f"http://127.0.0.1:{port}/",
+        USER_DB_FILE=os.path.join(tmp, "users.sqlite3"),
+        LEGACY_USER_DB_FILE=os.path.join(tmp, "missing.json"),
+        MENTOR_CACHE_SIZE="0",  # every chat asks the same question: time the model path
+    )
+    from app import brain, storage
+
+    server = serve(create_app(latency=latency), port)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for chat_id in range(chats):
+            storage.save_user(chat_id, f"user{chat_id}", "learn Python", phase="active")
+
+    def state(chat_id):
+        return {"chat_id": chat_id, "user_input": "What should I do today?",
+                "is_proactive": False, "response": None, "phase": "active"}
+
+    async def blocking_chat(chat_id):
+        brain.client.models.generate_content(model="gemini-1.5-flash", contents="hi")
+
+    async def async_chat(chat_id):
+        await brain.BRAIN_ENGINE.ainvoke(state(chat_id))
+
+    for label, handler in (("blocking", blocking_chat), ("async", async_chat)):
+        start = time.perf_counter()
+        await asyncio.gather(*(handler(c) for c in range(chats)))
+        elapsed = time.perf_counter() - start
+        print(f"{label:>9}: {chats} chats in {elapsed:6.2f}s "
+              f"(serial would be {chats * latency:.2f}s, one call is {latency:.2f}s)")
+
+    server.should_exit = True
+    await brain.http_session.aclose()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(int(args[0]) if args else 20, float(args[1]) if len(args) > 1 else 0.3))
@@ -0,0 +1,73 @@
+"""Input characters and latency per chat turn, with and without context caching.
+
+Answers one intake and one active message for N users through the real
+brain graph against the fake genai client, first sending the system
+prompts inline on every call, then as cached content (after one warm-up
+turn per phase, so cache creation is not counted). The fake charges
+`--prefill` seconds per 1000 uncached input characters.
+
+    python -m benchmarks.context_cache_bench --users 200 --prefill 0.02
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+async def run(args, cached, first_id):
+    from benchmarks.fake_genai import FakeGenAI
+    from app import brain, storage
+
+    fake = FakeGenAI(latency=args.latency, prefill=args.prefill)
+    brain.client = brain.ROUTER.client = brain.ROUTER.contexts.client = fake
+    brain.ROUTER.contexts.enabled = cached
+    brain.ROUTER.contexts.min_chars = 0  # the fake caches any size; measure what caching saves
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for chat_id in range(first_id, first_id + args.users):
+            phase = "intake" if chat_id % 2 else "active"
+            storage.save_user(chat_id, f"user{chat_id}", "learn Python", phase=phase)
+
+    async def turn(chat_id):
+        start = time.perf_counter()
+        await brain.engine().ainvoke({"chat_id": chat_id, "user_input": "What should I do today?",
+                                      "is_proactive": False, "response": None, "phase": None})
+        return time.perf_counter() - start
+
+    gate = asyncio.Semaphore(args.concurrency)  # keep queueing out of the turn time
+
+    async def gated(chat_id):
+        async with gate:
+            return await turn(chat_id)
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        # One turn per phase first, so cache creation is not in the numbers.
+        await asyncio.gather(turn(first_id), turn(first_id + 1))
+        fake.calls = fake.input_chars = 0
+        latencies = await asyncio.gather(*(gated(c) for c in range(first_id + 2, first_id + args.users)))
+    return fake.input_chars / max(fake.calls, 1), statistics.mean(latencies), len(fake.cached)
+
+
+async def main(args):
+    tmp = tempfile.mkdtemp()
+    os.environ.update(GEMINI_API_KEY="fake", USER_DB_FILE=os.path.join(tmp, "users.sqlite3"),
+                      LEGACY_USER_DB_FILE=os.path.join(tmp, "missing.json"),
+                      MENTOR_CACHE_SIZE="0")
+    print(f"{args.users} turns (half intake, half active), {args.latency}s model latency, "
+          f"{args.prefill}s per 1000 uncached input chars")
+    for label, cached, first_id in (("inline", False, 0), ("cached", True, args.users)):
+        chars, latency, handles = await run(args, cached, first_id)
+        print(f"{label:>7}: {chars:6.0f} input chars per call, mean turn {latency * 1000:6.1f} ms, "
+              f"{handles} cached prompts")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--prefill", type=float, default=0.02, help="seconds per 1000 uncached input chars")
+    sys.exit(asyncio.run(main(parser.parse_args())))
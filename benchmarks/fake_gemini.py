@@ -0,0 +1,68 @@
+"""A local stand-in for the Gemini REST API.
+
+Serves `models/<name>:generateContent` with a fixed latency so benchmarks can
+drive the real genai client (and the shared HTTP session) with no network.
+`:streamGenerateContent` answers as server-sent events: the first chunk after
+`latency`, then one word every `chunk_delay` seconds.
+Point the app at it with GEMINI_BASE_URL=http://127.0.0.1:<port>/.
+"""
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def _response(text, finished=True):
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate]}
+
+
+def create_app(latency=0.5, reply="Open the editor and write the first line now.", chunk_delay=0.05):
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/{version}/models/{target}")
+    async def generate(version: str, target: str, request: Request):
+        await request.body()
+        app.state.calls += 1
+        if target.endswith(":streamGenerateContent"):
+            return StreamingResponse(stream(), media_type="text/event-stream")
+        await asyncio.sleep(latency)
+        return _response(reply)
+
+    async def stream():
+        await asyncio.sleep(latency)
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(chunk_delay)
+            last = i == len(words) - 1
+            text = word if last else word + " "
+            yield f"data: {json.dumps(_response(text, finished=last))}\r\n\r\n"
+
+    return app
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(app, port):
+    """Starts `app` on 127.0.0.1:port in its own thread; returns the server.
+
+    A separate thread (and loop) keeps the fake responsive even while the
+    code under test blocks its own event loop. Set `should_exit` to stop it."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
@@ -0,0 +1,141 @@
+"""An in-process fake of the google-genai client.
+
+Mirrors the slice of `client.aio.models` the app uses (generate_content and
+generate_content_stream) with configurable latency, jitter and failure
+rates, so the whole bot pipeline can be load-tested with no network.
+`client.aio.caches.create` registers cached system prompts; input that
+is not cached costs `prefill` seconds per 1000 characters, and is counted
+in `input_chars`. Responses carry usage_metadata (~4 characters per token),
+and plain-text replies are cut at the config's max_output_tokens (the
+finish_reason is then MAX_TOKENS instead of STOP).
+
+    fake = FakeGenAI(latency=0.3, jitter=0.1, failure_rate=0.01)
+    brain.client = brain.ROUTER.client = fake
+"""
+import asyncio
+import json
+import random
+from types import SimpleNamespace
+
+REPLY = "Open the editor now and finish the first exercise before anything else."
+
+
+class FakeModelError(Exception):
+    """Raised for simulated provider failures, with an HTTP `code` like
+    google.genai's APIError (503 unless given)."""
+
+    def __init__(self, message, code=503):
+        super().__init__(message)
+        self.code = code
+
+
+class _Models:
+    def __init__(self, fake):
+        self.fake = fake
+
+    async def generate_content(self, model, contents, config=None):
+        sent = await self.fake._call(model, contents, config)
+        text, finish = self.fake._reply(contents, config)
+        return SimpleNamespace(text=text, usage_metadata=_usage(*sent, text),
+                               candidates=[SimpleNamespace(finish_reason=finish)])
+
+    async def generate_content_stream(self, model, contents, config=None):
+        sent = await self.fake._call(model, contents, config)
+        text, finish = self.fake._reply(contents, config)
+        words = text.split(" ")
+
+        async def chunks():
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(self.fake.chunk_delay)
+                last = i == len(words) - 1
+                yield SimpleNamespace(text=word if last else word + " ",
+                                      usage_metadata=_usage(*sent, text) if last else None,
+                                      candidates=[SimpleNamespace(finish_reason=finish if last else None)])
+
+        return chunks()
+
+
+def _usage(chars, cached_chars, reply):
+    return SimpleNamespace(prompt_token_count=(chars + cached_chars + 3) // 4,
+                           cached_content_token_count=(cached_chars + 3) // 4 or None,
+                           candidates_token_count=(len(reply) + 3) // 4)
+
+
+class _Caches:
+    def __init__(self, fake):
+        self.fake = fake
+
+    async def create(self, model, config=None):
+        system = str(config.system_instruction)
+        if len(system) < self.fake.cache_min_chars:
+            raise FakeModelError(f"400 cached content is too small: {len(system)} chars (simulated)", 400)
+        await asyncio.sleep(self.fake.latency)
+        name = f"cachedContents/fake-{len(self.fake.cached) + 1}"
+        self.fake.cached[name] = system
+        return SimpleNamespace(name=name, expire_time=None)
+
+
+class FakeGenAI:
+    def __init__(self, latency=0.3, jitter=0.0, failure_rate=0.0, model_failure_rates=None,
+                 chunk_delay=0.01, reply=REPLY, seed=None, prefill=0.0, cache_min_chars=0, alarm_time=""):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.model_failure_rates = model_failure_rates or {}
+        self.chunk_delay = chunk_delay
+        self.reply = reply
+        self.alarm_time = alarm_time  # what structured intake replies lock, "" for none
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self.written = 0  # messages generated (a batch or variant list counts each entry)
+        self.prefill = prefill
+        self.cache_min_chars = cache_min_chars
+        self.cached = {}  # cache name -> system prompt
+        self.input_chars = 0  # prompt characters sent with calls, cached content excluded
+        self.last_prompt = None  # contents of the latest call
+        self.aio = SimpleNamespace(models=_Models(self), caches=_Caches(self))
+        self.models = None  # the app only uses the async surface
+
+    async def _call(self, model, contents=None, config=None):
+        self.calls += 1
+        self.last_prompt = contents
+        chars = len(contents) if isinstance(contents, str) else len(str(contents or ""))
+        if config is not None and config.system_instruction:
+            chars += len(str(config.system_instruction))
+        if config is not None and config.cached_content and config.cached_content not in self.cached:
+            raise FakeModelError(f"404 cached content {config.cached_content} not found (simulated)", 404)
+        self.input_chars += chars
+        cached_chars = len(self.cached[config.cached_content]) if config is not None and config.cached_content else 0
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter) + self.prefill * chars / 1000
+        await asyncio.sleep(max(0.0, delay))
+        rate = self.model_failure_rates.get(model, self.failure_rate)
+        if self.random.random() < rate:
+            self.failures += 1
+            raise FakeModelError(f"503 {model} unavailable (simulated)")
+        return chars, cached_chars
+
+    def _reply(self, contents, config=None):
+        """(reply text, finish_reason) for a prompt."""
+        text = contents if isinstance(contents, str) else str(contents)
+        # Structured intake replies: text plus `alarm_time`.
+        schema = getattr(config, "response_schema", None)
+        if schema is not None and "reply" in (schema.properties or {}):
+            return json.dumps({"reply": self.reply, "alarm_time": self.alarm_time, "confidence": 0.9}), "STOP"
+        # Batched proactive prompts expect a JSON array keyed by chat_id, with
+        # distinct alternatives for users asking for variants.
+        if "USERS: " in text:
+            try:
+                users = json.loads(text.split("USERS: ", 1)[1])
+            except ValueError:
+                return "[]", "STOP"
+            self.written += sum(u.get("variants", 1) for u in users)
+            return json.dumps([{"chat_id": u["chat_id"], "message": self.reply,
+                                "alternatives": [f"{self.reply} ({i + 2})" for i in range(u.get("variants", 1) - 1)]}
+                               for u in users]), "STOP"
+        self.written += 1
+        limit = getattr(config, "max_output_tokens", None)
+        if limit and len(self.reply) > limit * 4:
+            return self.reply[:limit * 4], "MAX_TOKENS"
+        return self.reply, "STOP"
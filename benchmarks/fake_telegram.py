@@ -0,0 +1,128 @@
+"""A local stand-in for the Telegram Bot API.
+
+Implements just enough of /bot<token>/<method> for python-telegram-bot to
+initialize, long-poll getUpdates and send messages. Every sendMessage is
+recorded so a load generator can tell when the bot has answered.
+
+Test-only routes: POST /_test/updates queues updates for getUpdates,
+GET /_test/sent reports how many messages the bot has sent and
+POST /_test/fail makes the next sendMessage calls fail, e.g.
+{"count": 3, "status": 429, "retry_after": 1} or {"count": 2, "status": 502}.
+Point the app at it with TELEGRAM_API_BASE=http://127.0.0.1:<port>.
+"""
+import asyncio
+import json
+import time
+from urllib.parse import parse_qsl
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot",
+            "can_join_groups": True, "can_read_all_group_messages": False,
+            "supports_inline_queries": False}
+
+
+def make_update(update_id, chat_id, text):
+    """A private text message update, as Telegram would send it."""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": f"user{chat_id}"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+            "text": text,
+        },
+    }
+
+
+async def _params(request):
+    """PTB posts form fields with JSON-encoded values; accept JSON bodies too."""
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return await request.json()
+    params = {}
+    for key, value in parse_qsl((await request.body()).decode()):
+        try:
+            params[key] = json.loads(value)
+        except (TypeError, ValueError):
+            params[key] = value
+    return params
+
+
+def create_app(send_latency=0.0):
+    app = FastAPI()
+    app.state.updates = []          # pending updates for getUpdates
+    app.state.new_update = asyncio.Event()
+    app.state.sent = []             # (monotonic time, chat_id, text) per sendMessage
+    app.state.webhook = None
+    app.state.next_message_id = 1
+    app.state.failures = []         # injected errors for the next sendMessage calls
+
+    @app.post("/_test/updates")
+    async def push_updates(request: Request):
+        app.state.updates.extend(await request.json())
+        app.state.new_update.set()
+        return {"queued": len(app.state.updates)}
+
+    @app.post("/_test/fail")
+    async def fail_sends(request: Request):
+        spec = await request.json()
+        app.state.failures.extend([spec] * spec.get("count", 1))
+        return {"failing": len(app.state.failures)}
+
+    @app.get("/_test/sent")
+    async def sent(chats: bool = False):
+        result = {"sent": len(app.state.sent), "webhook": app.state.webhook}
+        if chats:
+            result["chat_ids"] = [chat_id for _, chat_id, _ in app.state.sent]
+        return result
+
+    @app.post("/bot{token}/{method}")
+    @app.get("/bot{token}/{method}")
+    async def bot_api(token: str, method: str, request: Request):
+        params = await _params(request)
+
+        if method == "getMe":
+            return {"ok": True, "result": BOT_USER}
+        if method == "setWebhook":
+            app.state.webhook = params.get("url")
+            return {"ok": True, "result": True}
+        if method == "deleteWebhook":
+            app.state.webhook = None
+            return {"ok": True, "result": True}
+        if method == "getUpdates":
+            offset = int(params.get("offset") or 0)
+            app.state.updates = [u for u in app.state.updates if u["update_id"] >= offset]
+            if not app.state.updates:
+                app.state.new_update.clear()
+                try:
+                    await asyncio.wait_for(app.state.new_update.wait(), float(params.get("timeout") or 0))
+                except asyncio.TimeoutError:
+                    pass
+            limit = int(params.get("limit") or 100)
+            return {"ok": True, "result": app.state.updates[:limit]}
+        if method == "sendMessage" and app.state.failures:
+            spec = app.state.failures.pop(0)
+            status = spec.get("status", 502)
+            body = {"ok": False, "error_code": status, "description": f"Injected error {status}"}
+            if status == 429:
+                body["parameters"] = {"retry_after": spec.get("retry_after", 1)}
+            return JSONResponse(body, status_code=status)
+        if method in ("sendMessage", "editMessageText"):
+            if send_latency:
+                await asyncio.sleep(send_latency)
+            chat_id = int(params["chat_id"])
+            app.state.sent.append((time.monotonic(), chat_id, params.get("text", "")))
+            if method == "editMessageText":
+                message_id = int(params["message_id"])
+            else:
+                message_id = app.state.next_message_id
+                app.state.next_message_id += 1
+            return {"ok": True, "result": {
+                "message_id": message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", ""),
+            }}
+        return {"ok": True, "result": True}
+
+    return app
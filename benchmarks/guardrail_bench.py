@@ -0,0 +1,111 @@
+"""Guardrail overhead and behaviour against the fake genai client.
+
+  * pass case: per-turn overhead of the guard around a model call, and the
+    cost of one check, fresh and cached
+  * blocked input: the generation is cancelled before it reaches the model
+  * PII in a reply: the reply is replaced, and a streamed reply never
+    shows it in a preview
+  * traces: exported in batches from a background task
+
+    python -m benchmarks.guardrail_bench --turns 2000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+async def main(args):
+    tmp = tempfile.mkdtemp()
+    os.environ.update(GEMINI_API_KEY="fake", USER_DB_FILE=os.path.join(tmp, "users.sqlite3"),
+                      LEGACY_USER_DB_FILE=os.path.join(tmp, "missing.json"), STREAM_EDIT_INTERVAL="0")
+    from benchmarks.fake_genai import FakeGenAI
+    from app import bot, brain, storage
+    from app.services.opik_guardrails import GUARDRAILS, TraceExporter
+
+    # --- pass case: guard overhead, isolated from model latency ---
+    async def reply():
+        return "Open the editor and finish the first exercise."
+
+    texts = [f"How do I stay consistent with practice number {i}?" for i in range(args.turns)]
+    start = time.perf_counter()
+    for text in texts:
+        await reply()
+    bare = time.perf_counter() - start
+    start = time.perf_counter()
+    for text in texts:
+        await GUARDRAILS.guard(text, reply())
+    guarded = time.perf_counter() - start
+    start = time.perf_counter()
+    for text in texts:
+        await GUARDRAILS.guard(text, reply())
+    cached = time.perf_counter() - start
+    print(f"pass case: +{(guarded - bare) / args.turns * 1e6:.1f} µs per turn fresh, "
+          f"+{(cached - bare) / args.turns * 1e6:.1f} µs cached (input + output checks, {args.turns} turns)")
+
+    # --- through the brain: blocked input and PII output ---
+    fake = FakeGenAI(latency=args.latency)
+    brain.client = brain.ROUTER.client = brain.ROUTER.contexts.client = fake
+    with contextlib.redirect_stdout(io.StringIO()):
+        for chat_id in (1, 2):
+            storage.save_user(chat_id, f"user{chat_id}", "learn Python", phase="active")
+
+    async def turn(chat_id, text):
+        start = time.perf_counter()
+        result = await brain.engine().ainvoke({"chat_id": chat_id, "user_input": text,
+                                               "is_proactive": False, "response": None, "phase": None})
+        return result["response"], time.perf_counter() - start
+
+    text, elapsed = await turn(1, "honestly I want to end my life")
+    print(f"blocked input: answered in {elapsed * 1000:.1f} ms (model latency {args.latency * 1000:.0f} ms), "
+          f"{fake.calls} model calls -> {text[:40]}...")
+    fake.reply = "Sure, email me at coach@example.com and I will send the plan."
+    text, _ = await turn(2, "Can you send me the plan?")
+    print(f"PII in reply: replaced -> {text[:50]}...")
+
+    class Message:
+        def __init__(self):
+            self.shown = []
+
+        async def reply_text(self, text):
+            self.shown.append(text)
+            return self
+
+        async def edit_text(self, text):
+            self.shown.append(text)
+            return self
+
+    fake.chunk_delay = 0.001
+    fake.reply = "Step one is easy. Then call me on +44 20 7946 0958 or mail coach@example.com today."
+    message = Message()
+    await bot.reply_streaming(message, {"chat_id": 2, "user_input": "How can I reach you?",
+                                        "is_proactive": False, "response": None, "phase": None})
+    leaked = [t for t in message.shown if "7946" in t or "coach@" in t]
+    print(f"PII in a streamed reply: {len(message.shown)} texts shown, {len(leaked)} with the PII, "
+          f"last -> {message.shown[-1][:40]}...")
+    fake.reply = "Open the editor now."
+    latencies = [(await turn(2, f"what next {i}?"))[1] for i in range(20)]
+    print(f"normal turns: mean {statistics.mean(latencies) * 1000:.1f} ms with {args.latency * 1000:.0f} ms model latency")
+
+    # --- traces: batched off the reply path ---
+    batches = []
+    exporter = TraceExporter(batches.append, batch_size=50, interval=0.2)
+    start = time.perf_counter()
+    for i in range(120):
+        exporter.add({"name": "coach", "input": {"message": str(i)}})
+    added = time.perf_counter() - start
+    await asyncio.sleep(0.3)
+    await exporter.stop()
+    print(f"traces: 120 queued in {added * 1e6:.0f} µs, exported as {[len(b) for b in batches]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake model latency in seconds")
+    sys.exit(asyncio.run(main(parser.parse_args())))
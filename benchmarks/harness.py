@@ -0,0 +1,228 @@
+"""Offline load test for the whole bot pipeline.
+
+Wires the real handlers (app.bot.save_goal / handle_chat) and the real
+reminder scheduler (main.scheduler) to:
+  * an in-process fake genai client (latency, jitter, failure rates)
+  * the fake Telegram Bot API server over local HTTP
+  * a synthetic user population in a throwaway SQLite store
+
+and reports p50/p95/p99 latency, messages/s, tick duration and storage
+write cost. Nothing touches the network, so it can gate regressions:
+
+    python -m benchmarks.harness --users 5000 --chats 2000 --max-p95-ms 1500
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+
+RESOLUTIONS = ["learn Python", "go to the gym", "read 20 pages a day", "learn Spanish",
+               "run a marathon", "meditate daily", "ship my side project", "sleep before 11pm"]
+QUESTIONS = ["give me a 7-day plan", "what should I do today?", "I'm tired, motivate me",
+             "yes 9am", "how do I start?", "Give me a guide for week one"]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(name, latencies, errors, wall):
+    return {
+        "op": name,
+        "count": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "per_s": len(latencies) / wall if wall else 0.0,
+    }
+
+
+def population(n, hot_minute, hot_share, rng):
+    """Yields (chat_id, name, resolution, phase, reminder_time) for n users.
+
+    `hot_share` of the active users share `hot_minute` (the 08:00 burst);
+    the rest are spread over the day."""
+    for chat_id in range(1, n + 1):
+        phase = "active" if rng.random() < 0.7 else "intake"
+        if phase == "active" and rng.random() < hot_share:
+            minute = hot_minute
+        elif phase == "active":
+            minute = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}"
+        else:
+            minute = None
+        yield chat_id, f"user{chat_id}", rng.choice(RESOLUTIONS), phase, minute
+
+
+async def run_load(jobs, concurrency):
+    """Runs zero-arg coroutine functions under a concurrency cap; times each."""
+    slots = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(job):
+        nonlocal errors
+        async with slots:
+            start = time.perf_counter()
+            try:
+                await job()
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(job) for job in jobs))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def main(args):
+    tmp = tempfile.mkdtemp()
+    os.environ.update(
+        TELEGRAM_TOKEN="123:fake", GEMINI_API_KEY="fake",
+        USER_DB_FILE=os.path.join(tmp, "users.sqlite3"),
+        LEGACY_USER_DB_FILE=os.path.join(tmp, "missing.json"),
+        USER_DB_FLUSH_INTERVAL="3600",  # flushed explicitly below
+        STREAM_EDIT_INTERVAL="0.5",
+        MENTOR_CACHE_SIZE="0",  # time the model path
+    )
+
+    from benchmarks import fake_telegram
+    from benchmarks.fake_gemini import free_port, serve
+    from benchmarks.fake_genai import FakeGenAI
+
+    tg_port = free_port()
+    tg_url = f"http://127.0.0.1:{tg_port}"
+    serve(fake_telegram.create_app(send_latency=args.send_latency), tg_port)
+
+    from telegram import Bot, Update
+    from telegram.request import HTTPXRequest
+
+    import main as service
+    from app import bot as handlers
+    from app import brain, storage
+
+    fake = FakeGenAI(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                     model_failure_rates={m: 1.0 for m in args.dead_model}, seed=args.seed)
+    brain.client = brain.ROUTER.client = fake
+
+    bot = Bot("123:fake", base_url=f"{tg_url}/bot",
+              request=HTTPXRequest(connection_pool_size=args.concurrency))
+    await bot.initialize()
+    rng = random.Random(args.seed)
+    results = []
+    quiet = open(os.devnull, "w")
+
+    def sent_total():
+        # The fake server runs in its own thread, so a blocking GET is fine here.
+        return httpx.get(f"{tg_url}/_test/sent").json()["sent"]
+
+    # --- 1. POPULATION / STORAGE WRITE COST ---
+    hot_minute = datetime.now().strftime("%H:%M")
+    save_times = []
+    with contextlib.redirect_stdout(quiet):
+        for chat_id, name, resolution, phase, minute in population(args.users, hot_minute, args.hot_share, rng):
+            start = time.perf_counter()
+            storage.save_user(chat_id, name, resolution, phase=phase, reminder_time=minute)
+            save_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        flushed = storage.flush()
+        flush_s = time.perf_counter() - start
+    results.append(summarize("save_user", save_times, 0, sum(save_times)))
+
+    def update_for(chat_id, text):
+        return Update.de_json(fake_telegram.make_update(rng.randrange(1 << 30), chat_id, text), bot)
+
+    # --- 2. SAVE_GOAL (new users finishing /start) ---
+    new_ids = range(args.users + 1, args.users + 1 + args.goals)
+    jobs = [lambda c=c: handlers.save_goal(update_for(c, rng.choice(RESOLUTIONS)), None) for c in new_ids]
+    with contextlib.redirect_stdout(quiet):
+        latencies, errors, wall = await run_load(jobs, args.concurrency)
+    results.append(summarize("save_goal", latencies, errors, wall))
+
+    # --- 3. HANDLE_CHAT (mixed intake / active traffic) ---
+    before = sent_total()
+    chatters = [rng.randrange(1, args.users + 1) for _ in range(args.chats)]
+    jobs = [lambda c=c: handlers.handle_chat(update_for(c, rng.choice(QUESTIONS)), None) for c in chatters]
+    with contextlib.redirect_stdout(quiet):
+        latencies, errors, wall = await run_load(jobs, args.concurrency)
+    results.append(summarize("handle_chat", latencies, errors, wall))
+    chat_messages_per_s = (sent_total() - before) / wall
+
+    # --- 4. PROACTIVE TICK (the hot-minute burst) ---
+    # Build the heap as of just before the hot minute's next occurrence, then
+    # fire that instant: exactly the users due then are sent.
+    from app.services.scheduler import next_fire
+    fire_at = next_fire({"reminder_time": hot_minute}, datetime.now(timezone.utc))
+    service.ptb_app = SimpleNamespace(bot=bot)
+    with contextlib.redirect_stdout(quiet):
+        service.scheduler.load(storage.get_all_users(), now=fire_at - timedelta(seconds=1))
+        due = sum(1 for data in storage.get_all_users().values()
+                  if data.get("phase") == "active" and data.get("reminder_time") == hot_minute)
+        before = sent_total()
+        start = time.perf_counter()
+        await service.scheduler.fire_due(now=fire_at)
+        tick_s = time.perf_counter() - start
+    tick_sent = sent_total() - before
+
+    await bot.shutdown()
+    quiet.close()
+
+    # --- REPORT ---
+    report = {
+        "ops": results,
+        "chat_messages_per_s": chat_messages_per_s,
+        "tick": {"due": due, "sent": tick_sent, "duration_s": tick_s},
+        "storage": {"users": args.users, "flush_rows": flushed, "flush_s": flush_s},
+        "model": {"calls": fake.calls, "failures": fake.failures},
+    }
+    print(f"{'op':<12} {'count':>7} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10}")
+    for r in results:
+        print(f"{r['op']:<12} {r['count']:>7} {r['errors']:>5} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['per_s']:>10.1f}")
+    print(f"\nchat replies/s: {chat_messages_per_s:.1f}")
+    print(f"tick: {tick_sent}/{due} reminders sent in {tick_s:.2f}s")
+    print(f"storage: flush of {flushed} users took {flush_s * 1000:.0f} ms")
+    print(f"model: {fake.calls} calls, {fake.failures} simulated failures")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    # --- REGRESSION GATE ---
+    failed = [r["op"] for r in results if args.max_p95_ms and r["op"] != "save_user" and r["p95_ms"] > args.max_p95_ms]
+    if args.max_tick_s and tick_s > args.max_tick_s:
+        failed.append("tick")
+    if failed:
+        print(f"\n❌ Over budget: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000, help="synthetic population size")
+    parser.add_argument("--hot-share", type=float, default=0.3, help="share of active users due this minute")
+    parser.add_argument("--goals", type=int, default=200, help="save_goal calls (new users)")
+    parser.add_argument("--chats", type=int, default=1000, help="handle_chat calls")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake model latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="+/- uniform jitter on latency (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--dead-model", action="append", default=[], help="model name that always fails")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="fake Telegram latency (s)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--max-p95-ms", type=float, default=0, help="fail if a handler's p95 exceeds this")
+    parser.add_argument("--max-tick-s", type=float, default=0, help="fail if the tick takes longer")
+    sys.exit(asyncio.run(main(parser.parse_args())))
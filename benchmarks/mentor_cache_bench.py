@@ -0,0 +1,196 @@
+"""Model calls saved by the mentor answer cache, and whether hits are right.
+
+Active users share a few resolutions (spelled differently) and ask a mix of
+common questions, each in several phrasings, one-off questions and short
+follow-ups. The turns go through the real brain graph against the fake
+genai client, once with the cache off and once with it on. The fake's
+reply names the question's intent, so a hit that returns another intent's
+answer counts as wrong. Then checks that a cacheable question is asked
+without the user's conversation history while a short follow-up keeps it,
+that users who came through onboarding (/start, goal, intake) share the
+cache too, and that a reply cut off at max_output_tokens is not stored.
+
+    python -m benchmarks.mentor_cache_bench --turns 400 --latency 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+RESOLUTIONS = [["learn Python", "Learn python!", "learn  PYTHON"], ["run a marathon", "Run a Marathon."]]
+INTENTS = {
+    "plan": ["Give me a 7-day plan", "can you give me a 7 day plan?", "please give me a 7-day plan!"],
+    "plan3": ["Give me a 3-day plan", "can you give me a 3 day plan?"],
+    "start": ["How do I get started today?", "how do i get started today", "How should I get started today?"],
+    "motivation": ["I have no motivation to keep going", "i have no motivation to keep going at all"],
+    "time": ["How much time should I spend each day?", "how much time should i spend every day?"],
+}
+SHORT = ["what next?", "why?", "ok thanks", "done!"]
+
+
+def script(turns, seed):
+    """(chat_id, resolution group, resolution text, question, intent) per turn."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(turns):
+        group = rng.randrange(len(RESOLUTIONS))
+        roll = rng.random()
+        if roll < 0.6:
+            intent = rng.choice(sorted(INTENTS))
+            question = rng.choice(INTENTS[intent])
+        elif roll < 0.9:
+            intent = f"unique{i}"
+            question = f"How do I deal with {rng.choice(['rain', 'travel', 'work', 'kids'])} problem number {i}?"
+        else:
+            intent = f"short{i}"
+            question = rng.choice(SHORT)
+        out.append((i + 1, group, rng.choice(RESOLUTIONS[group]), question, f"{group}:{intent}"))
+    return out
+
+
+async def run(args, turns, enabled, first_id):
+    from benchmarks.fake_genai import FakeGenAI
+    from app import brain, storage
+    from app.services.similarity_cache import SimilarityCache
+
+    fake = FakeGenAI(latency=args.latency, chunk_delay=0)
+    brain.client = brain.ROUTER.client = brain.ROUTER.contexts.client = fake
+    brain.MENTOR_CACHE = SimilarityCache(max_size=args.size if enabled else 0, threshold=args.threshold)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for chat_id, _, resolution, _, _ in turns:
+            storage.save_user(first_id + chat_id, f"user{chat_id}", resolution, phase="active")
+
+    wrong, latencies = 0, []
+    for chat_id, _, _, question, intent in turns:
+        fake.reply = f"Answer for {intent}"
+        calls = fake.calls
+        start = time.perf_counter()
+        result = await brain.engine().ainvoke({"chat_id": first_id + chat_id, "user_input": question,
+                                               "is_proactive": False, "response": None, "phase": None})
+        latencies.append(time.perf_counter() - start)
+        if fake.calls == calls and result["response"] != fake.reply:
+            wrong += 1
+    label = "cache on" if enabled else "cache off"
+    print(f"{label:>9}: {fake.calls} model calls for {len(turns)} turns, "
+          f"mean turn {statistics.mean(latencies) * 1000:.1f} ms, {wrong} wrong answers from cache")
+    return fake.calls, wrong
+
+
+async def ask(chat_id, question):
+    """(reply, whether it took a model call)."""
+    from app import brain
+
+    fake = brain.ROUTER.client
+    calls = fake.calls
+    result = await brain.engine().ainvoke({"chat_id": chat_id, "user_input": question,
+                                           "is_proactive": False, "response": None, "phase": None})
+    return result["response"], fake.calls > calls
+
+
+async def isolation(args, first_id):
+    """(history leaked, truncated reply cached): both must be False."""
+    from app import brain, storage
+    from app.agents import memory
+    from app.services.similarity_cache import SimilarityCache
+
+    fake = brain.ROUTER.client
+    brain.MENTOR_CACHE = SimilarityCache(max_size=args.size, threshold=args.threshold)
+    question = "How do I get started today?"
+    with contextlib.redirect_stdout(io.StringIO()):
+        for chat_id in range(first_id, first_id + 3):
+            storage.save_user(chat_id, "user", "learn Python", phase="active")
+    memory.remember(first_id, "user", "My name is Ada and I work nights")
+
+    fake.reply = "Generic answer"
+    await ask(first_id, question)           # goes into the cache: must not see the history
+    leaked = "Ada" in fake.last_prompt
+    calls = fake.calls
+    await ask(first_id, "why?")             # a follow-up: needs the history, never cached
+    leaked = leaked or "Ada" not in fake.last_prompt or fake.calls == calls
+
+    fake.reply = "x" * 20000                # longer than OUTPUT_TOKENS_ACTIVE allows
+    brain.MENTOR_CACHE = SimilarityCache(max_size=args.size, threshold=args.threshold)
+    await ask(first_id + 1, question)
+    fake.reply = "Complete answer"
+    _, called = await ask(first_id + 2, question)
+    return leaked, not called
+
+
+async def onboarded(args, first_id):
+    """Model calls for the same question from two users who came through
+    /start, their goal and an intake answer (so both have history)."""
+    from types import SimpleNamespace
+
+    from app import bot, brain
+    from app.services.similarity_cache import SimilarityCache
+
+    fake = brain.ROUTER.client
+    brain.MENTOR_CACHE = SimilarityCache(max_size=args.size, threshold=args.threshold)
+
+    async def reply_text(*_, **__):
+        return None
+
+    calls = 0
+    for chat_id in (first_id, first_id + 1):
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id),
+                                 effective_user=SimpleNamespace(first_name="user"),
+                                 message=SimpleNamespace(text="Learn Python", reply_text=reply_text))
+        with contextlib.redirect_stdout(io.StringIO()):
+            await bot.save_goal(update, None)
+            await ask(chat_id, "7am")       # locks the alarm: active from here on
+        fake.reply = "Generic answer"
+        _, called = await ask(chat_id, "How do I get started today?")
+        calls += called
+    return calls
+
+
+async def main(args):
+    tmp = tempfile.mkdtemp()
+    os.environ.update(GEMINI_API_KEY="fake", USER_DB_FILE=os.path.join(tmp, "users.sqlite3"),
+                      LEGACY_USER_DB_FILE=os.path.join(tmp, "missing.json"))
+    from app.core.metrics import MENTOR_CACHE_LOOKUPS
+    from app.services.similarity_cache import SimilarityCache
+
+    turns = script(args.turns, args.seed)
+    print(f"{args.turns} active turns, {len(RESOLUTIONS)} resolutions, "
+          f"{args.latency * 1000:.0f} ms model latency, threshold {args.threshold}")
+    off, _ = await run(args, turns, False, 0)
+    before = {r: MENTOR_CACHE_LOOKUPS.values.get((r,), 0) for r in ("hit", "miss", "skip")}
+    on, wrong = await run(args, turns, True, args.turns)
+    counts = {r: MENTOR_CACHE_LOOKUPS.values.get((r,), 0) - before[r] for r in before}
+    rate = counts["hit"] / max(1, counts["hit"] + counts["miss"])
+    print(f"lookups: {counts['hit']:.0f} hits, {counts['miss']:.0f} misses, {counts['skip']:.0f} too short "
+          f"-> hit rate {rate:.0%}, model calls {off} -> {on}")
+
+    leaked, truncated = await isolation(args, 2 * args.turns + 1)
+    print(f"history in a cacheable prompt: {'yes' if leaked else 'no'}, "
+          f"truncated reply cached: {'yes' if truncated else 'no'}")
+    onboarding_calls = await onboarded(args, 2 * args.turns + 10)
+    print(f"same question from 2 onboarded users: {onboarding_calls} model calls")
+
+    cache = SimilarityCache(threshold=args.threshold)
+    for i in range(args.size):
+        cache.put("learn python", f"How do I deal with problem number {i} in my studies?", "x")
+    start = time.perf_counter()
+    for i in range(1000):
+        cache.get("learn python", f"How do I handle issue number {i} in my studies?")
+    print(f"lookup with {len(cache)} entries: {(time.perf_counter() - start) * 1000:.0f} µs")
+    ok = on < off and wrong == 0 and not leaked and not truncated and onboarding_calls == 1
+    print("✅ mentor cache ok" if ok else "❌ mentor cache check failed")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency in seconds")
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=5)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,95 @@
+"""Runs find_working_model.py's prober offline against a fake GenerativeModel.
+
+Every region/model pair gets a scripted outcome: answers after some latency,
+404, 403, or hangs past the deadline. Passes when the probes ran
+concurrently (total time close to the deadline, not the sum), every pair
+has the right status, the ranking is fastest-working first, and the
+router orders GEMINI_MODELS from the written file: models that worked
+first, a failed probe never moving a model back, and a stale file
+ignored.
+
+    python -m benchmarks.model_probe_check --timeout 1
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import find_working_model as finder
+from app.services.model_router import load_ranking, rank_models
+
+
+class FakeGenerativeModel:
+    """Stands in for vertexai's GenerativeModel: `outcome` is (status, seconds)."""
+
+    def __init__(self, outcome):
+        self.status, self.latency = outcome
+
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        if self.status == "not_found":
+            raise RuntimeError("404 Publisher Model was not found (simulated)")
+        if self.status == "denied":
+            raise RuntimeError("403 Permission denied (simulated)")
+        return "Success"
+
+
+def script(regions, models, timeout, seed):
+    rng = random.Random(seed)
+    outcomes = {}
+    for region in regions:
+        for model in models:
+            kind = rng.choice(["ok", "ok", "not_found", "denied", "timeout"])
+            if kind == "timeout":
+                outcomes[region, model] = ("ok", timeout * 3)  # would answer, far too late
+            else:
+                outcomes[region, model] = (kind, rng.uniform(0.05, timeout * 0.6))
+    return outcomes
+
+
+def main(args):
+    outcomes = script(finder.REGIONS, finder.MODELS, args.timeout, args.seed)
+    start = time.perf_counter()
+    results = finder.probe_all(finder.REGIONS, finder.MODELS,
+                               make_model=lambda region, model: FakeGenerativeModel(outcomes[region, model]),
+                               timeout=args.timeout)
+    elapsed = time.perf_counter() - start
+
+    serial = sum(min(latency, args.timeout) for _, latency in outcomes.values())
+    wrong = [r for r in results
+             if r["status"] != ("timeout" if outcomes[r["region"], r["model"]][1] > args.timeout
+                                else outcomes[r["region"], r["model"]][0])]
+    working = [r["latency_ms"] for r in results if r["status"] == "ok"]
+    ranked = working == sorted(working) and all(r["status"] == "ok" for r in results[:len(working)])
+
+    path = os.path.join(tempfile.mkdtemp(), "model_ranking.json")
+    finder.save(path, results)
+    order = rank_models(finder.MODELS, load_ranking(path, max_age=60))
+    reused = finder.load(path, max_age=60) is not None
+    kept = rank_models(["gemini-1.5-flash", "gemini-3-pro-preview"], {"gemini-1.5-flash": None})
+    with open(path) as f:
+        stale = json.load(f)
+    stale["probed_at"] = "2020-01-01T00:00:00+00:00"
+    with open(path, "w") as f:
+        json.dump(stale, f)
+    expired = load_ranking(path, max_age=60) == {}
+
+    print(f"{len(results)} pairs probed in {elapsed:.2f}s (one at a time: ~{serial:.1f}s), "
+          f"{len(working)} working, {sum(r['status'] == 'timeout' for r in results)} timed out")
+    print(f"fastest: {results[0]['region']} / {results[0]['model']} ({results[0]['latency_ms']} ms)")
+    print(f"router order: {', '.join(order)}; a failed probe keeps {', '.join(kept)}; "
+          f"stale file {'ignored' if expired else 'USED'}")
+    ok = (elapsed < args.timeout * 1.5 and not wrong and ranked and reused and expired
+          and kept == ["gemini-1.5-flash", "gemini-3-pro-preview"])
+    print("✅ prober ok" if ok else f"❌ prober check failed ({len(wrong)} wrong statuses, ranked={ranked})")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=3)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+"""Model calls and output per proactive reminder, with and without the nudge cache.
+
+Fires reminder ticks through the real dispatcher (outbox, fake Telegram
+server, fake model) over several simulated days. Ticks are spread over
+each day, and the same resolutions come due at the same tick every day,
+so pools must outlive one reminder period to be of any use. Resolutions
+follow a Zipf-like distribution, because a few goals ("learn Python", "go
+to the gym") are shared by most users. A second scenario has 100 users on
+50 resolutions, 2 each, in one tick a day: batching alone needs 2 calls,
+and the cache must not need more.
+
+    python -m benchmarks.nudge_cache_bench --ticks 24 --users-per-tick 100 --days 5
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+GOALS = ["learn Python", "go to the gym", "read more books", "learn Spanish", "run a marathon",
+         "meditate daily", "ship my side project", "sleep before 11pm", "eat healthier", "write every day"]
+
+
+def resolution(rng, distinct):
+    """Zipf-ish: goal i is picked with weight 1/(i+1); the tail is unique-ish."""
+    index = min(int(1 / max(rng.random(), 1e-9)) - 1, distinct - 1)
+    base = GOALS[index % len(GOALS)]
+    spelling = rng.choice([base, base.lower(), f"I want to {base}", f"{base}!"])
+    return spelling if index < len(GOALS) else f"{spelling} #{index}"
+
+
+async def run(args, schedule, use_cache, first_id):
+    """Fires `schedule` (one list of resolutions per tick) every simulated
+    day; returns (model calls, nudges written, reminders sent)."""
+    from benchmarks.fake_genai import FakeGenAI
+    from app import brain
+    from app.services import nudge_cache
+    from app.services.nudge_cache import NUDGES
+    from app.services.scheduler import dispatch_proactive
+
+    fake = FakeGenAI(latency=0.01)
+    brain.client = brain.ROUTER.client = fake
+    NUDGES.variants = args.variants if use_cache else 0
+    NUDGES.pools.clear()
+    clock = [0.0]
+    nudge_cache.time = SimpleNamespace(time=lambda: clock[0])  # the pools age with the simulated day
+    # Recent enough that no batch is past PROACTIVE_MAX_LAG; every reminder
+    # gets its own chat id so the outbox never sees a key twice.
+    scheduled_at = datetime.now(timezone.utc) - timedelta(seconds=30)
+    sent, chat_id = 0, first_id
+    for day in range(args.days):
+        for tick, resolutions in enumerate(schedule):
+            clock[0] = day * 86400 + tick * 86400 / len(schedule)
+            due = {}
+            for text in resolutions:
+                due[chat_id] = {"resolution": text}
+                chat_id += 1
+            sent += len(await dispatch_proactive(args.application, due, scheduled_at))
+    return fake.calls, fake.written, sent
+
+
+async def main(args):
+    tmp = tempfile.mkdtemp()
+    os.environ.update(TELEGRAM_TOKEN="123:fake", GEMINI_API_KEY="fake",
+                      USER_DB_FILE=os.path.join(tmp, "users.sqlite3"),
+                      LEGACY_USER_DB_FILE=os.path.join(tmp, "missing.json"),
+                      TELEGRAM_GLOBAL_RATE="100000", TELEGRAM_CHAT_RATE="100000")
+    from benchmarks import fake_telegram
+    from benchmarks.fake_gemini import free_port, serve
+    from telegram import Bot
+
+    port = free_port()
+    serve(fake_telegram.create_app(), port)
+    bot = Bot("123:fake", base_url=f"http://127.0.0.1:{port}/bot")
+    await bot.initialize()
+    args.application = SimpleNamespace(bot=bot)
+
+    rng = random.Random(args.seed)
+    zipf = [[resolution(rng, args.distinct) for _ in range(args.users_per_tick)] for _ in range(args.ticks)]
+    pairs = [[f"{GOALS[i % len(GOALS)]} #{i}" for i in range(50) for _ in range(2)]]
+    scenarios = [(f"zipf, {args.ticks} ticks x {args.users_per_tick} users", zipf),
+                 ("50 resolutions x 2 users, 1 tick", pairs)]
+    print(f"{args.days} days, batches of {os.getenv('PROACTIVE_BATCH_SIZE', '50')}, "
+          f"{args.variants} variants per resolution")
+    ok, first_id = True, 0
+    for name, schedule in scenarios:
+        print(name)
+        calls = {}
+        for use_cache in (False, True):
+            with contextlib.redirect_stdout(open(os.devnull, "w")):
+                calls[use_cache], written, sent = await run(args, schedule, use_cache, first_id)
+            first_id += args.days * sum(map(len, schedule))
+            label = "cache" if use_cache else "no cache"
+            print(f"  {label:>9}: {sent} reminders, {calls[use_cache]} model calls, {written} nudges written "
+                  f"= {written / max(sent, 1):.2f} per reminder")
+        ok = ok and calls[True] <= calls[False]
+    await bot.shutdown()
+    print("✅ the cache never costs extra calls" if ok else "❌ the cache made more model calls than it saved")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=24, help="ticks per day")
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--users-per-tick", type=int, default=100)
+    parser.add_argument("--distinct", type=int, default=500, help="size of the resolution tail")
+    parser.add_argument("--variants", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,95 @@
+"""Checks that reminders survive send failures and restarts.
+
+Fires one reminder instant for N users against the fake Telegram server
+while it rejects the first sends with 429s and 502s, and lets the outbox
+sender retry them. Then fires the same instant again, as a restarted or
+overlapping process would. Passes when every user has exactly one
+message and the second fire made no model calls.
+
+    python -m benchmarks.outbox_check --users 40 --fail-429 5 --fail-502 5
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+
+
+async def main(args):
+    tmp = tempfile.mkdtemp()
+    os.environ.update(
+        TELEGRAM_TOKEN="123:fake", GEMINI_API_KEY="fake",
+        USER_DB_FILE=os.path.join(tmp, "users.sqlite3"),
+        LEGACY_USER_DB_FILE=os.path.join(tmp, "missing.json"),
+        OUTBOX_BACKOFF_BASE="0.2", OUTBOX_POLL_INTERVAL="0.2",
+    )
+
+    from benchmarks import fake_telegram
+    from benchmarks.fake_gemini import free_port, serve
+    from benchmarks.fake_genai import FakeGenAI
+
+    port = free_port()
+    tg_url = f"http://127.0.0.1:{port}"
+    serve(fake_telegram.create_app(), port)
+
+    from telegram import Bot
+
+    from app import brain, storage
+    from app.services.outbox import OUTBOX
+    from app.services.scheduler import dispatch_proactive
+
+    fake = FakeGenAI(latency=0.05)
+    brain.client = brain.ROUTER.client = fake
+    bot = Bot("123:fake", base_url=f"{tg_url}/bot")
+    await bot.initialize()
+    application = SimpleNamespace(bot=bot)
+
+    quiet = open(os.devnull, "w")
+    with contextlib.redirect_stdout(quiet):
+        for chat_id in range(1, args.users + 1):
+            storage.save_user(chat_id, f"user{chat_id}", "learn Python", phase="active", reminder_time="08:00")
+    due = {chat_id: storage.get_user(chat_id) for chat_id in range(1, args.users + 1)}
+    scheduled_at = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(seconds=1)
+
+    httpx.post(f"{tg_url}/_test/fail", json={"count": args.fail_429, "status": 429, "retry_after": 1})
+    httpx.post(f"{tg_url}/_test/fail", json={"count": args.fail_502, "status": 502})
+
+    OUTBOX.start(bot)
+    with contextlib.redirect_stdout(quiet):
+        first = await dispatch_proactive(application, due, scheduled_at)
+        calls_first = fake.calls
+        deadline = time.monotonic() + args.timeout
+        while OUTBOX.stats()["pending"] and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        # The same instant again: everything is already in the outbox.
+        await dispatch_proactive(application, due, scheduled_at)
+    await OUTBOX.stop()
+    await bot.shutdown()
+
+    sent = Counter(httpx.get(f"{tg_url}/_test/sent", params={"chats": True}).json()["chat_ids"])
+    missing = [chat_id for chat_id in due if sent[chat_id] == 0]
+    doubled = [chat_id for chat_id, n in sent.items() if n > 1]
+    regenerated = fake.calls - calls_first
+    print(f"first pass: {len(first)}/{len(due)} sent directly, "
+          f"{args.fail_429 + args.fail_502} injected failures, outbox now {OUTBOX.stats()}")
+    print(f"delivered to {len(due) - len(missing)}/{len(due)} users, {len(doubled)} duplicates, "
+          f"{regenerated} model calls on the repeat fire")
+    ok = not missing and not doubled and not regenerated
+    print("✅ exactly one reminder each" if ok else "❌ outbox check failed")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--fail-429", type=int, default=5, help="sends rejected with 429 retry_after=1")
+    parser.add_argument("--fail-502", type=int, default=5, help="sends rejected with 502")
+    parser.add_argument("--timeout", type=float, default=30)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,72 @@
+"""Interactive latency during a proactive burst, FIFO vs the priority queue.
+
+Queues a burst of proactive batch calls, then sends live chats in while the
+burst drains. Every call goes through app.brain against the in-process fake
+model. With one FIFO class the chats wait behind the whole burst; with the
+priority queue they take the next free slot.
+
+    python -m benchmarks.priority_bench --burst 200 --chats 50
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+
+from benchmarks.harness import percentile
+
+
+async def run(brain, queue, args):
+    brain.LLM_QUEUE = queue
+    users = {chat_id: {"resolution": "learn Python"} for chat_id in range(args.batch)}
+    burst = [asyncio.create_task(brain.generate_proactive_batch(users)) for _ in range(args.burst)]
+    await asyncio.sleep(args.latency)  # the burst owns every slot
+
+    async def chat():
+        start = time.perf_counter()
+        await brain.generate_safe("what should I do today?")
+        return time.perf_counter() - start
+
+    latencies = []
+    for _ in range(args.chats):
+        latencies.append(asyncio.create_task(chat()))
+        await asyncio.sleep(args.gap)
+    latencies = await asyncio.gather(*latencies)
+    start = time.perf_counter()
+    await asyncio.gather(*burst)
+    return latencies, time.perf_counter() - start
+
+
+async def main(args):
+    os.environ.setdefault("GEMINI_API_KEY", "fake")
+    from app import brain
+    from app.services.llm_queue import LLMWorkQueue
+    from benchmarks.fake_genai import FakeGenAI
+
+    brain.client = brain.ROUTER.client = FakeGenAI(latency=args.latency)
+    fifo = LLMWorkQueue(args.slots, {})
+    for name in fifo.classes:
+        fifo.classes[name] = fifo.classes["interactive"]  # one shared line: first come, first served
+    modes = {"fifo": fifo, "priority": LLMWorkQueue(args.slots, {"proactive": args.proactive_slots})}
+
+    print(f"{args.burst} proactive batches + {args.chats} chats, {args.slots} slots, "
+          f"{args.latency * 1000:.0f} ms per call")
+    for name, queue in modes.items():
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            latencies, _ = await run(brain, queue, args)
+        print(f"{name:>9}: chat p50 {percentile(latencies, 50) * 1000:7.0f} ms, "
+              f"p95 {percentile(latencies, 95) * 1000:7.0f} ms")
+    await brain.http_session.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=200, help="proactive batch calls queued at once")
+    parser.add_argument("--batch", type=int, default=5, help="users per batch")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--gap", type=float, default=0.02, help="seconds between chats")
+    parser.add_argument("--slots", type=int, default=16, help="LLM_CONCURRENCY")
+    parser.add_argument("--proactive-slots", type=int, default=12, help="PROACTIVE_CONCURRENCY")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake model latency (s)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
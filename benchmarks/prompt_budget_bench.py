@@ -0,0 +1,89 @@
+"""Prompt size and turn latency for oversized messages, with and without budgets.
+
+Intake and active users (alternating every `--essay-every` turns) chat
+through the real brain graph against the fake genai client; every
+`--essay-every`th message is a pasted essay and a few users have a
+resolution that is a whole paragraph. The fake charges
+`--prefill` seconds per 1000 uncached input characters. Runs once with the
+budgets lifted and once with the configured ones, then prints the token
+counts the router recorded per phase.
+
+    python -m benchmarks.prompt_budget_bench --turns 200 --essay-chars 40000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+async def run(args, budgeted, first_id):
+    from benchmarks.fake_genai import FakeGenAI
+    from app import brain, storage
+    from app.agents import prompts
+
+    fake = FakeGenAI(latency=args.latency, prefill=args.prefill, chunk_delay=0)
+    brain.client = brain.ROUTER.client = brain.ROUTER.contexts.client = fake
+    if not budgeted:
+        prompts.PROMPT_TOKENS = dict.fromkeys(prompts.PROMPT_TOKENS, 10 ** 9)
+        prompts.RESOLUTION_MAX_TOKENS = 10 ** 9
+    essay = ("I have been thinking a lot about why I keep failing at this. " * args.essay_chars)[:args.essay_chars]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(args.turns):
+            resolution = "learn Python because " + essay[:4000] if i % 10 == 3 else "learn Python"
+            phase = "intake" if (i // args.essay_every) % 2 else "active"
+            storage.save_user(first_id + i, f"user{i}", resolution, phase=phase)
+
+    sizes, normal, essays = [], [], []
+    for i in range(args.turns):
+        pasted = i % args.essay_every == 0
+        chars = fake.input_chars
+        start = time.perf_counter()
+        await brain.engine().ainvoke({"chat_id": first_id + i, "user_input": essay if pasted else "What now?",
+                                      "is_proactive": False, "response": None, "phase": None})
+        (essays if pasted else normal).append(time.perf_counter() - start)
+        sizes.append(fake.input_chars - chars)
+    label = "budgeted" if budgeted else "unbounded"
+    print(f"{label:>9}: input chars per call p50 {statistics.median(sizes):.0f}, max {max(sizes)}; "
+          f"mean turn {statistics.mean(normal) * 1000:.0f} ms normal, {statistics.mean(essays) * 1000:.0f} ms with an essay")
+    return max(sizes)
+
+
+async def main(args):
+    tmp = tempfile.mkdtemp()
+    os.environ.update(GEMINI_API_KEY="fake", USER_DB_FILE=os.path.join(tmp, "users.sqlite3"),
+                      LEGACY_USER_DB_FILE=os.path.join(tmp, "missing.json"), MENTOR_CACHE_SIZE="0")
+    from app.core.metrics import MODEL_TOKENS, PROMPT_TRIMS
+    from app.core.config import PROMPT_TOKENS_INTAKE, PROMPT_TOKENS_ACTIVE
+
+    print(f"{args.turns} turns (intake and active in alternating runs), an essay of {args.essay_chars} chars every "
+          f"{args.essay_every}, budgets intake {PROMPT_TOKENS_INTAKE} / active {PROMPT_TOKENS_ACTIVE} tokens")
+    budgeted = await run(args, True, 0)
+    tokens = dict(MODEL_TOKENS.values)
+    trims = dict(PROMPT_TRIMS.values)
+    unbounded = await run(args, False, args.turns)
+
+    print("recorded tokens (budgeted run):")
+    for phase in sorted({phase for _, phase, _ in tokens}):
+        counts = {kind: sum(v for (_, p, k), v in tokens.items() if p == phase and k == kind)
+                  for kind in ("prompt", "cached", "completion")}
+        print(f"  {phase:>9}: {counts['prompt']} uncached prompt, {counts['cached']} cached, "
+              f"{counts['completion']} completion")
+    print("trimmed fields: " + ", ".join(f"{phase}/{field} x{n}" for (phase, field), n in sorted(trims.items())))
+    ok = budgeted < unbounded and tokens
+    print("✅ prompts stay within budget" if ok else "❌ prompt budget check failed")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--essay-chars", type=int, default=40000)
+    parser.add_argument("--essay-every", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency in seconds")
+    parser.add_argument("--prefill", type=float, default=0.02, help="seconds per 1000 uncached input chars")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,81 @@
+"""End-to-end check of sharded mode on one machine.
+
+Seeds users whose reminder is due in the next minute or two, starts the app
+under `uvicorn --workers N` with SHARD_COUNT shards on one shared SQLite
+store (fake Telegram and Gemini servers, no network), waits for the fire
+time and verifies that every user got exactly one reminder.
+
+    python -m benchmarks.shard_check --workers 3 --shards 8 --users 300
+"""
+import argparse
+import collections
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from benchmarks import fake_gemini, fake_telegram
+from benchmarks.fake_gemini import free_port, serve
+
+
+def main(args):
+    tg_port, gemini_port, app_port = free_port(), free_port(), free_port()
+    serve(fake_telegram.create_app(), tg_port)
+    serve(fake_gemini.create_app(latency=0.05), gemini_port)
+    tg_url = f"http://127.0.0.1:{tg_port}"
+
+    # Leave time for the workers to start and split the leases.
+    now = datetime.now()
+    fire = (now + timedelta(minutes=1 if now.second < 30 else 2)).replace(second=0, microsecond=0)
+    minute = fire.strftime("%H:%M")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "users.sqlite3")
+        env = dict(os.environ, USER_DB_FILE=db_file, LEGACY_USER_DB_FILE=db_file + ".none",
+                   DEFAULT_TIMEZONE="", SHARD_COUNT=str(args.shards), SHARD_LEASE_TTL="6",
+                   TELEGRAM_TOKEN="123:fake", TELEGRAM_API_BASE=tg_url,
+                   GEMINI_API_KEY="fake", GEMINI_BASE_URL=f"http://127.0.0.1:{gemini_port}/",
+                   TELEGRAM_WEBHOOK_URL=f"http://127.0.0.1:{app_port}", TELEGRAM_WEBHOOK_SECRET="s",
+                   TELEGRAM_GLOBAL_RATE="1000", MENTOR_CACHE_SIZE="0")
+        seed = ("import sys\nfrom app import storage\n"
+                "for c in range(1, int(sys.argv[1]) + 1):\n"
+                "    storage.save_user(c, f'user{c}', 'learn Python', phase='active', reminder_time=sys.argv[2])\n"
+                "storage.close()\n")
+        subprocess.run([sys.executable, "-c", seed, str(args.users), minute], env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+
+        print(f"🚀 {args.workers} workers, {args.shards} shards, {args.users} users due at {minute}")
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            env=env, stdout=subprocess.PIPE if args.quiet else None, stderr=subprocess.STDOUT,
+        )
+        try:
+            wait = (fire - datetime.now()).total_seconds() + args.settle
+            print(f"⏳ Waiting {wait:.0f}s for the reminders...")
+            time.sleep(wait)
+            chat_ids = httpx.get(f"{tg_url}/_test/sent", params={"chats": True}).json()["chat_ids"]
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    counts = collections.Counter(chat_ids)
+    missing = [c for c in range(1, args.users + 1) if counts[c] == 0]
+    duplicated = [c for c, n in counts.items() if n > 1]
+    print(f"📬 {len(chat_ids)} sends: {len(counts)} users reached, "
+          f"{len(missing)} missing, {len(duplicated)} duplicated")
+    return 0 if not missing and not duplicated else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--settle", type=float, default=15, help="seconds to wait after the fire time")
+    parser.add_argument("--quiet", action="store_true", help="hide the workers' logs")
+    sys.exit(main(parser.parse_args()))
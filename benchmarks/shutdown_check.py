@@ -0,0 +1,92 @@
+"""Checks that a redeploy under load drops no replies.
+
+Runs main:app in webhook mode against the fake Telegram and Gemini servers,
+posts N chat updates, and sends SIGTERM while their replies are still being
+generated, as a rolling restart would. Counts the replies that reached the
+fake Telegram server and how long the process took to exit, with the drain
+(SHUTDOWN_GRACE) and without it (SHUTDOWN_GRACE=0).
+
+    python -m benchmarks.shutdown_check --updates 100 --latency 1.0
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import fake_gemini, fake_telegram
+from benchmarks.fake_gemini import free_port, serve
+from benchmarks.webhook_load import SECRET, seed_users, wait_until
+
+
+async def run(args, grace, tg_url, gemini_url, db_file, first_chat):
+    port = free_port()
+    app_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ,
+               TELEGRAM_TOKEN="123:fake", TELEGRAM_API_BASE=tg_url,
+               GEMINI_API_KEY="fake", GEMINI_BASE_URL=gemini_url, MENTOR_CACHE_SIZE="0",
+               USER_DB_FILE=db_file, LEGACY_USER_DB_FILE=db_file + ".none",
+               UPDATE_CONCURRENCY=str(args.updates), SHUTDOWN_GRACE=str(grace),
+               TELEGRAM_WEBHOOK_URL=app_url, TELEGRAM_WEBHOOK_SECRET=SECRET)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    async with httpx.AsyncClient(timeout=30) as http:
+        async def ready():
+            try:
+                return (await http.get(app_url + "/")).json().get("bot") == "Running"
+            except httpx.HTTPError:
+                return False
+
+        if not await wait_until(ready, 60):
+            proc.kill()
+            raise RuntimeError("app did not start")
+        base = (await http.get(f"{tg_url}/_test/sent")).json()["sent"]
+        updates = [fake_telegram.make_update(base + i + 1, first_chat + i, "What should I do today?")
+                   for i in range(args.updates)]
+        await asyncio.gather(*(http.post(app_url + "/telegram/webhook", json=u,
+                                         headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+                               for u in updates))
+        await asyncio.sleep(args.kill_after)  # replies are mid-generation now
+        start = time.monotonic()
+        proc.terminate()  # SIGTERM, as the platform sends on redeploy
+        await asyncio.to_thread(proc.wait)
+        exit_time = time.monotonic() - start
+        # Streamed replies are a send plus edits: count chats reached.
+        sent = (await http.get(f"{tg_url}/_test/sent", params={"chats": True})).json()["chat_ids"][base:]
+        answered = len(set(sent) & {u["message"]["chat"]["id"] for u in updates})
+    label = f"grace {grace:g}s"
+    print(f"{label:>10}: {answered}/{args.updates} replies delivered, process exited {exit_time:.1f}s after SIGTERM")
+    return answered, exit_time
+
+
+async def main(args):
+    tg_port, gemini_port = free_port(), free_port()
+    serve(fake_telegram.create_app(), tg_port)
+    serve(fake_gemini.create_app(latency=args.latency), gemini_port)
+    tg_url = f"http://127.0.0.1:{tg_port}"
+    gemini_url = f"http://127.0.0.1:{gemini_port}/"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "users.sqlite3")
+        seed_users(db_file, range(2 * args.updates))
+        await run(args, 0, tg_url, gemini_url, db_file, 1)
+        answered, exit_time = await run(args, args.grace, tg_url, gemini_url, db_file, args.updates + 1)
+    ok = answered == args.updates and exit_time < args.grace
+    print("✅ nothing dropped" if ok else "❌ shutdown check failed")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=1.0, help="fake model latency in seconds")
+    parser.add_argument("--kill-after", type=float, default=0.5, help="seconds between the posts and SIGTERM")
+    parser.add_argument("--grace", type=float, default=20.0)
+    sys.exit(asyncio.run(main(parser.parse_args())))
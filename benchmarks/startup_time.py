@@ -0,0 +1,100 @@
+"""Cold-start cost of the Render entry point.
+
+1. `python -X importtime -c "import main"` in a fresh interpreter, with the
+   slowest modules by cumulative import time.
+2. A real `uvicorn main:app` boot against the fake Telegram and Gemini
+   servers: time until `/` answers (what the host's health check sees) and
+   until it reports the bot as running.
+
+    python -m benchmarks.startup_time --top 15
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import fake_gemini, fake_telegram
+from benchmarks.fake_gemini import free_port, serve
+
+
+def import_profile(env):
+    """[(cumulative_us, self_us, module)] for `import main`, slowest first."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                          env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            rows.append((int(fields[1]), int(fields[0]), fields[2].rstrip()))
+        except ValueError:
+            continue  # the header line
+    return sorted(rows, reverse=True)
+
+
+async def boot_times(env, timeout):
+    """Seconds from spawning uvicorn to the first 200 on `/`, and to "Running"."""
+    port = free_port()
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    first_ok = running = None
+    try:
+        async with httpx.AsyncClient(timeout=5) as http:
+            while time.monotonic() - started < timeout and running is None:
+                with contextlib.suppress(httpx.HTTPError):
+                    r = await http.get(f"http://127.0.0.1:{port}/")
+                    if r.status_code == 200:
+                        now = time.monotonic() - started
+                        first_ok = first_ok or now
+                        if r.json().get("bot") == "Running":
+                            running = now
+                await asyncio.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return first_ok, running
+
+
+async def main(args):
+    tg_port, gemini_port = free_port(), free_port()
+    serve(fake_telegram.create_app(), tg_port)
+    serve(fake_gemini.create_app(), gemini_port)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   TELEGRAM_TOKEN="123:fake", TELEGRAM_API_BASE=f"http://127.0.0.1:{tg_port}",
+                   GEMINI_API_KEY="fake", GEMINI_BASE_URL=f"http://127.0.0.1:{gemini_port}/",
+                   USER_DB_FILE=os.path.join(tmp, "users.sqlite3"),
+                   LEGACY_USER_DB_FILE=os.path.join(tmp, "missing.json"))
+
+        rows = import_profile(env)
+        total = next((cumulative for cumulative, _, name in rows if name.strip() == "main"), 0)
+        print(f"import main: {total / 1e6:.3f}s")
+        print(f"{'cumulative':>11} {'self':>9}  module")
+        for cumulative, own, name in rows[:args.top]:
+            print(f"{cumulative / 1e3:>9.1f}ms {own / 1e3:>7.1f}ms  {name}")
+
+        for run in range(1, args.runs + 1):
+            first_ok, running = await boot_times(env, args.timeout)
+            health = f"{first_ok:.2f}s" if first_ok else "timed out"
+            bot = f"{running:.2f}s" if running else "timed out"
+            print(f"boot {run}: / answers after {health}, bot running after {bot}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--runs", type=int, default=3, help="uvicorn boots to time")
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,98 @@
+"""Write-throughput benchmark for app/storage.py.
+
+Each size runs in a fresh interpreter with its own temporary database so the
+module-level store starts empty. For comparison it also times one write of the
+old rewrite-the-whole-JSON approach at the same size, and one reminder tick
+(popping the users due at 08:00 off the scheduler heap) against the full
+population.
+
+    python -m benchmarks.storage_bench            # 10k, 100k, 1M
+    python -m benchmarks.storage_bench 10000      # custom sizes
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SIZES = [10_000, 100_000, 1_000_000]
+
+
+def run_one(n):
+    """Runs inside the child process. Prints one JSON line of results."""
+    import contextlib
+    import io
+
+    from app import storage
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for i in range(n):
+            minute = f"{i // 60 % 24:02d}:{i % 60:02d}"
+            storage.save_user(i, f"user{i}", "learn Python", phase="active", reminder_time=minute)
+        save_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        storage.flush()
+        flush_s = time.perf_counter() - start
+
+        # Steady state: a small batch of updates on top of a full store.
+        batch = 1000
+        start = time.perf_counter()
+        for i in range(batch):
+            storage.save_user(i, f"user{i}", "go to the gym", phase="active")
+        storage.flush()
+        update_s = time.perf_counter() - start
+
+    # One scheduler tick: pop the users due at 08:00 off the heap.
+    from datetime import datetime, timedelta, timezone
+    from app.services.scheduler import ReminderScheduler, next_fire
+
+    scheduler = ReminderScheduler(fire=None)
+    fire_at = next_fire({"reminder_time": "08:00"}, datetime.now(timezone.utc))
+    scheduler.load(storage.get_all_users(), now=fire_at - timedelta(seconds=1))
+    start = time.perf_counter()
+    due = [chat_id for group in scheduler.pop_due(fire_at).values() for chat_id in group]
+    tick_us = (time.perf_counter() - start) * 1e6
+
+    legacy_file = os.path.join(os.path.dirname(storage.DB_FILE), "legacy.json")
+    start = time.perf_counter()
+    with open(legacy_file, "w") as f:
+        json.dump(storage.USER_DB, f)
+    legacy_s = time.perf_counter() - start
+
+    print(json.dumps({
+        "users": n,
+        "save_per_s": n / save_s,
+        "initial_flush_s": flush_s,
+        "update_batch_ms": update_s * 1000,
+        "legacy_write_ms": legacy_s * 1000,
+        "due": len(due),
+        "tick_us": tick_us,
+    }))
+
+
+def main(sizes):
+    print(f"{'users':>10} {'save_user/s':>14} {'flush all (s)':>14} {'1k updates (ms)':>16} {'legacy 1 write (ms)':>20} {'tick (us)':>10} {'due':>6}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ,
+                       USER_DB_FILE=os.path.join(tmp, "users.sqlite3"),
+                       LEGACY_USER_DB_FILE=os.path.join(tmp, "missing.json"),
+                       USER_DB_FLUSH_INTERVAL="3600")
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.storage_bench", "--child", str(n)],
+                env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"{r['users']:>10} {r['save_per_s']:>14,.0f} {r['initial_flush_s']:>14.2f} "
+                  f"{r['update_batch_ms']:>16.1f} {r['legacy_write_ms']:>20.1f} "
+                  f"{r['tick_us']:>10.1f} {r['due']:>6}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        run_one(int(sys.argv[2]))
+    else:
+        main([int(a) for a in sys.argv[1:]] or SIZES)
@@ -0,0 +1,76 @@
+"""Time-to-first-byte for a long mentor answer, buffered vs streamed.
+
+Runs one ACTIVE-phase chat against the fake Gemini server twice:
+  * buffered: BRAIN_ENGINE.ainvoke, then one reply_text (the old path)
+  * streamed: app.bot.reply_streaming (first chunk sent, then edits)
+
+    python -m benchmarks.streaming_bench [first_token_s] [words]
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_gemini import create_app, free_port, serve
+
+
+class FakeMessage:
+    """Records when the user would see text; stands in for telegram.Message."""
+
+    def __init__(self, start):
+        self.start = start
+        self.events = []
+
+    async def reply_text(self, text):
+        self.events.append(("send", time.perf_counter() - self.start, len(text)))
+        return self
+
+    async def edit_text(self, text):
+        self.events.append(("edit", time.perf_counter() - self.start, len(text)))
+        return self
+
+
+async def main(first_token, words):
+    port = free_port()
+    tmp = tempfile.mkdtemp()
+    os.environ.update(
+        GEMINI_API_KEY="fake",
+        GEMINI_BASE_URL=f"http://127.0.0.1:{port}/",
+        USER_DB_FILE=os.path.join(tmp, "users.sqlite3"),
+        LEGACY_USER_DB_FILE=os.path.join(tmp, "missing.json"),
+        STREAM_EDIT_INTERVAL="0.5",
+        MENTOR_CACHE_SIZE="0",  # time the model path
+    )
+    from app import bot, brain, storage
+
+    reply = " ".join(f"Step{i}" for i in range(words))
+    server = serve(create_app(latency=first_token, reply=reply, chunk_delay=0.02), port)
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage.save_user(1, "bench", "learn Python", phase="active")
+    state = {"chat_id": 1, "user_input": "Give me a 7-day plan", "is_proactive": False,
+             "response": None, "phase": "active"}
+
+    start = time.perf_counter()
+    buffered = FakeMessage(start)
+    result = await brain.BRAIN_ENGINE.ainvoke(state)
+    await buffered.reply_text(result["response"])
+
+    start = time.perf_counter()
+    streamed = FakeMessage(start)
+    await bot.reply_streaming(streamed, state)
+
+    for label, message in (("buffered", buffered), ("streamed", streamed)):
+        first, last = message.events[0], message.events[-1]
+        print(f"{label:>9}: first text at {first[1] * 1000:7.0f} ms, final at {last[1] * 1000:7.0f} ms, "
+              f"{len(message.events)} Telegram calls")
+
+    server.should_exit = True
+    await brain.http_session.aclose()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(main(float(args[0]) if args else 0.3, int(args[1]) if len(args) > 1 else 150))
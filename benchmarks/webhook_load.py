@@ -0,0 +1,136 @@
+"""Load generator: updates per second in polling mode vs webhook mode.
+
+Runs the real app (main:app under uvicorn) against the fake Telegram and
+fake Gemini servers, then pushes N synthetic text updates from registered
+users and times until the bot has sent N replies.
+
+  polling: updates are queued on the fake server and fetched via getUpdates
+  webhook: updates are POSTed to the app's webhook route with the secret
+
+    python -m benchmarks.webhook_load --updates 1000 --workers 2 --latency 0.2
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks import fake_gemini, fake_telegram
+from benchmarks.fake_gemini import free_port, serve
+
+SECRET = "bench-secret"
+
+
+def seed_users(db_file, chat_ids):
+    env = dict(os.environ, USER_DB_FILE=db_file, LEGACY_USER_DB_FILE=db_file + ".none")
+    code = ("import sys\n"
+            "from app import storage\n"
+            "for c in range(1, int(sys.argv[1]) + 1):\n"
+            "    storage.save_user(c, f'user{c}', 'learn Python', phase='active', reminder_time='03:33')\n"
+            "storage.close()\n")
+    subprocess.run([sys.executable, "-c", code, str(len(chat_ids))], env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+async def wait_until(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if await predicate():
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+async def run_mode(mode, args, tg_url, gemini_url, db_file):
+    port = free_port()
+    app_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ,
+               TELEGRAM_TOKEN="123:fake", TELEGRAM_API_BASE=tg_url,
+               GEMINI_API_KEY="fake", GEMINI_BASE_URL=gemini_url, MENTOR_CACHE_SIZE="0",
+               USER_DB_FILE=db_file, LEGACY_USER_DB_FILE=db_file + ".none",
+               UPDATE_CONCURRENCY=str(args.concurrency),
+               TELEGRAM_WEBHOOK_URL=app_url if mode == "webhook" else "",
+               TELEGRAM_WEBHOOK_SECRET=SECRET)
+    workers = args.workers if mode == "webhook" else 1  # only one process may poll
+    if workers > 1:
+        env["SHARD_COUNT"] = str(4 * workers)  # several workers need sharded mode
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        async with httpx.AsyncClient(timeout=30) as http:
+            async def sent():
+                return (await http.get(f"{tg_url}/_test/sent")).json()["sent"]
+
+            async def ready():
+                with contextlib.suppress(httpx.HTTPError):
+                    return (await http.get(app_url + "/")).json().get("bot") == "Running"
+                return False
+
+            if not await wait_until(ready, 60):
+                raise RuntimeError("app did not start")
+            await asyncio.sleep(2)  # let every worker finish booting, not just the first
+
+            base = await sent()
+            updates = [fake_telegram.make_update(base + i + 1, (i % args.chats) + 1, "What should I do today?")
+                       for i in range(args.updates)]
+            start = time.monotonic()
+            if mode == "polling":
+                await http.post(f"{tg_url}/_test/updates", json=updates)
+            else:
+                slots = asyncio.Semaphore(64)
+
+                async def post(update):
+                    async with slots:
+                        r = await http.post(app_url + "/telegram/webhook", json=update,
+                                            headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+                        r.raise_for_status()
+
+                await asyncio.gather(*(post(u) for u in updates))
+
+            async def done():
+                return await sent() - base >= args.updates
+
+            finished = await wait_until(done, args.timeout)
+            elapsed = time.monotonic() - start
+            answered = await sent() - base
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    status = "" if finished else " (timed out)"
+    print(f"{mode:>8}: {answered}/{args.updates} replies in {elapsed:6.2f}s "
+          f"= {answered / elapsed:7.1f} updates/s  [{workers} worker(s)]{status}")
+
+
+async def main(args):
+    tg_port, gemini_port = free_port(), free_port()
+    serve(fake_telegram.create_app(), tg_port)
+    serve(fake_gemini.create_app(latency=args.latency), gemini_port)
+    tg_url = f"http://127.0.0.1:{tg_port}"
+    gemini_url = f"http://127.0.0.1:{gemini_port}/"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "users.sqlite3")
+        seed_users(db_file, range(args.chats))
+        modes = ["polling", "webhook"] if args.mode == "both" else [args.mode]
+        for mode in modes:
+            await run_mode(mode, args, tg_url, gemini_url, db_file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["polling", "webhook", "both"], default="both")
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--chats", type=int, default=500, help="distinct registered users sending updates")
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn workers in webhook mode")
+    parser.add_argument("--concurrency", type=int, default=16, help="UPDATE_CONCURRENCY per worker")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake model latency in seconds")
+    parser.add_argument("--timeout", type=float, default=120)
+    asyncio.run(main(parser.parse_args()))
@@ -1,12 +1,27 @@
-import vertexai
-from vertexai.generative_models import GenerativeModel
-from dotenv import load_dotenv
+"""Finds which Vertex AI region/model pairs answer, and how fast.
+
+Probes every pair in REGIONS x MODELS at once, each under its own
+deadline, and writes the ranked results (fastest working pair first) to
+MODEL_RANKING_FILE. The bot reads that file at startup to try the fastest
+working model first. A ranking younger than --max-age is reused unless
+--refresh is given.
+
+    python find_working_model.py [--timeout 20] [--refresh]
+"""
+import argparse
+import json
 import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
 
 load_dotenv()
 
 # 1. Your Project ID
-PROJECT_ID = "gen-lang-client-0633619694"
+PROJECT_ID = os.getenv("GOOGLE_CLOUD_PROJECT", "gen-lang-client-0633619694")
 
 # 2. The Combinations we will test
 REGIONS = ["us-central1", "us-west1", "us-east4", "northamerica-northeast1", "us-east1"]
@@ -18,47 +33,123 @@ MODELS = [
     "gemini-pro"             # Oldest Alias
 ]
 
-print(f"🚀 Starting Scanner for Project: {PROJECT_ID}")
-print("------------------------------------------------")
+PROMPT = "Say 'Success' if you can hear me."
+RANKING_FILE = os.getenv("MODEL_RANKING_FILE", "model_ranking.json")
 
-found_winner = False
+# vertexai.init sets process-wide state, so a region is bound to its model
+# under this lock; the model keeps its location for the calls that follow.
+_INIT_LOCK = threading.Lock()
 
-for region in REGIONS:
-    if found_winner: break
-    
-    print(f"\n🌍 Checking Region: {region}...")
-    try:
-        # Initialize the Cloud Connection for this region
+
+def vertex_model(region, model_name):
+    import vertexai  # only the real prober needs the Vertex SDK
+    from vertexai.generative_models import GenerativeModel
+
+    with _INIT_LOCK:
         vertexai.init(project=PROJECT_ID, location=region)
+        return GenerativeModel(model_name)
+
+
+def _status(error):
+    message = str(error)
+    if "404" in message:
+        return "not_found"
+    if "403" in message:
+        return "denied"
+    return "error"
+
+
+def probe(region, model_name, make_model, result):
+    """Fills `result` with the status and latency of one pair (runs in a thread)."""
+    start = time.perf_counter()
+    try:
+        make_model(region, model_name).generate_content(PROMPT)
     except Exception as e:
-        print(f"   Constructor failed for {region}")
-        continue
-
-    for model_name in MODELS:
-        print(f"   👉 Testing Model: {model_name}...", end=" ")
-        try:
-            # Try to load and run the model
-            model = GenerativeModel(model_name)
-            response = model.generate_content("Say 'Success' if you can hear me.")
-            
-            # IF WE GET HERE, IT WORKED!
-            print("✅ SUCCESS!")
-            print("\n🎉 WINNER FOUND! 🎉")
-            print(f"Use this in main.py:")
-            print(f'LOCATION = "{region}"')
-            print(f'model = GenerativeModel("{model_name}")')
-            found_winner = True
-            break
-        except Exception as e:
-            # If it fails, just print a small x and keep going
-            error_msg = str(e)
-            if "404" in error_msg:
-                print("❌ (Not Found)")
-            elif "403" in error_msg:
-                print("🔒 (Permission Denied)")
-            else:
-                print(f"⚠️ ({error_msg[:20]}...)")
-
-if not found_winner:
-    print("\n❌ Scanner finished. No working combination found.")
-    print("This means the API is disabled or your account has absolutely no access.")
\ No newline at end of file
+        result.update(status=_status(e), error=str(e)[:200])
+    else:
+        result.update(status="ok")
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def probe_all(regions, models, make_model=vertex_model, timeout=20.0):
+    """Probes every (region, model) pair concurrently; a pair that has not
+    answered `timeout` seconds after the start is recorded as "timeout".
+
+    Returns the results ranked: working pairs by latency, then the rest."""
+    started = time.monotonic()
+    probes = []
+    for region in regions:
+        for model_name in models:
+            result = {"region": region, "model": model_name, "status": "timeout", "latency_ms": None}
+            # Daemon threads: a probe stuck past its deadline never blocks exit.
+            thread = threading.Thread(target=probe, args=(region, model_name, make_model, result), daemon=True)
+            thread.start()
+            probes.append((thread, result))
+    for thread, result in probes:
+        thread.join(max(0.0, started + timeout - time.monotonic()))
+        if thread.is_alive():
+            result.update(status="timeout", latency_ms=None)
+    results = [dict(result) for _, result in probes]
+    results.sort(key=lambda r: (r["status"] != "ok", r["latency_ms"] if r["status"] == "ok" else 0))
+    return results
+
+
+def load(path, max_age):
+    """The saved ranking if it is younger than `max_age` seconds, else None."""
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+        probed_at = datetime.fromisoformat(saved["probed_at"])
+    except (OSError, ValueError, KeyError):
+        return None
+    if (datetime.now(timezone.utc) - probed_at).total_seconds() > max_age:
+        return None
+    return saved
+
+
+def save(path, results):
+    saved = {"probed_at": datetime.now(timezone.utc).isoformat(), "project": PROJECT_ID, "results": results}
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(saved, f, indent=2)
+    os.replace(tmp, path)  # readers never see half a file
+    return saved
+
+
+def report(saved):
+    icons = {"ok": "✅", "not_found": "❌", "denied": "🔒", "timeout": "⏱️", "error": "⚠️"}
+    for r in saved["results"]:
+        latency = f"{r['latency_ms']:.0f} ms" if r["latency_ms"] is not None else "-"
+        print(f"   {icons.get(r['status'], '?')} {r['region']:<24} {r['model']:<22} {latency:>9}  {r['status']}")
+    best = next((r for r in saved["results"] if r["status"] == "ok"), None)
+    if best is None:
+        print("\n❌ Scanner finished. No working combination found.")
+        print("This means the API is disabled or your account has absolutely no access.")
+        return 1
+    print("\n🎉 FASTEST WORKING PAIR 🎉")
+    print(f'LOCATION = "{best["region"]}"')
+    print(f'model = GenerativeModel("{best["model"]}")')
+    return 0
+
+
+def main(args):
+    saved = None if args.refresh else load(args.output, args.max_age)
+    if saved:
+        print(f"📄 Using ranking from {saved['probed_at']} ({args.output}); --refresh to probe again")
+        return report(saved)
+    print(f"🚀 Probing {len(REGIONS)} regions x {len(MODELS)} models for project {PROJECT_ID} "
+          f"(deadline {args.timeout:.0f}s)")
+    print("------------------------------------------------")
+    start = time.perf_counter()
+    saved = save(args.output, probe_all(REGIONS, MODELS, timeout=args.timeout))
+    print(f"   done in {time.perf_counter() - start:.1f}s, ranking written to {args.output}\n")
+    return report(saved)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timeout", type=float, default=20.0, help="deadline per probe, seconds")
+    parser.add_argument("--output", default=RANKING_FILE)
+    parser.add_argument("--max-age", type=float, default=86400.0, help="reuse a ranking this young, seconds")
+    parser.add_argument("--refresh", action="store_true", help="probe even if a recent ranking exists")
+    sys.exit(main(parser.parse_args()))
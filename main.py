@@ -1,17 +1,28 @@
 import os
 import asyncio
+import fcntl
+import hmac
+import re
+import time
 import uvicorn  # <--- NEW IMPORT
-from datetime import datetime
-from fastapi import FastAPI
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from telegram.request import HTTPXRequest 
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 
 # Import your modules
-from app.bot import start, save_goal, handle_chat, WAITING_FOR_RES
-from app.storage import get_all_users
-from app.brain import BRAIN_ENGINE
+# Only light modules here: telegram, google-genai and langgraph take seconds
+# to import and are loaded by boot() after the health route is already up.
+from app import storage
+from app.agents import memory
+from app.core import metrics
+from app.storage import get_all_users, add_listener
+from app.core.config import (TELEGRAM_API_BASE, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_PATH,
+                             TELEGRAM_WEBHOOK_SECRET, UPDATE_CONCURRENCY, USER_DB_FILE,
+                             SHARD_COUNT, SHARD_LEASE_TTL, STORE_REFRESH_INTERVAL, SHUTDOWN_GRACE)
+from app.services.opik_guardrails import GUARDRAILS
+from app.services.outbox import OUTBOX
+from app.services.scheduler import ReminderScheduler, dispatch_proactive
+from app.services.sharding import ShardCoordinator, shard_of
 
 load_dotenv()
 
@@ -21,90 +32,254 @@ TOKEN = os.getenv("TELEGRAM_TOKEN")
 PORT = int(os.environ.get("PORT", 10000))
 
 app = FastAPI()
-scheduler = AsyncIOScheduler()
 
-# Global variable to hold the bot application
+# Global variable to hold the bot application (set once it is running)
 ptb_app = None
+# app.brain, once boot() has imported it
+brain = None
+boot_task = None
+# Why boot() failed, if it did: `/` then answers 503 so the platform restarts us
+boot_error = None
+sync_task = None
+# Set once shutdown starts: webhook updates are refused so Telegram redelivers them
+draining = False
 
-async def proactive_cycle(application):
-    """Checks for reminders and triggers the proactive AI message."""
-    users = get_all_users()
-    if not users: return
-    
-    # Get current time (e.g., "00:00")
-    now_str = datetime.now().strftime("%H:%M")
-    print(f"⏰ Tick: {now_str} ...")
-    
-    for chat_id, data in users.items():
-        if data.get("phase") != "active":
-            continue
-            
-        user_time = data.get("reminder_time") 
-        
-        if user_time != now_str:
-            continue
-            
-        print(f"   🔔 Waking up for {data.get('name', chat_id)} (Scheduled: {user_time})")
-        
+async def fire_reminders(due, scheduled_at):
+    """Generates concurrently and sends through the Telegram rate limiter."""
+    await dispatch_proactive(ptb_app, due, scheduled_at)
+
+# Sleeps until the next user is due instead of polling every minute
+scheduler = ReminderScheduler(fire_reminders)
+
+def load_shards(gained):
+    """A shard just became ours: heap its users."""
+    scheduler.load({chat_id: data for chat_id, data in get_all_users().items()
+                    if shard_of(chat_id, SHARD_COUNT) in gained})
+
+# Sharded mode only: leases decide which process fires which users
+shards = ShardCoordinator(USER_DB_FILE, SHARD_COUNT, SHARD_LEASE_TTL, on_gain=load_shards) if SHARD_COUNT else None
+# Unsharded mode: held for the life of the process (see claim_store)
+store_lock = None
+
+def claim_store():
+    """Without SHARD_COUNT this process fires every reminder and keeps the only
+    live copy of the users, so it must be the only one on USER_DB_FILE: a
+    second worker would double every reminder and overwrite this one's rows."""
+    global store_lock
+    lock = open(USER_DB_FILE + ".lock", "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        raise RuntimeError(f"another process is already serving {USER_DB_FILE}; "
+                           "run one worker, or set SHARD_COUNT to run several") from None
+    store_lock = lock
+
+async def sync_store():
+    """Sharded mode: pick up users that other processes saved."""
+    while True:
+        await asyncio.sleep(STORE_REFRESH_INTERVAL)
         try:
-            # We run the blocking AI engine in a separate thread to not freeze the bot
-            result = await asyncio.to_thread(
-                BRAIN_ENGINE.invoke, 
-                {
-                    "chat_id": chat_id, 
-                    "is_proactive": True, 
-                    "response": None,
-                    "phase": "active"
-                }
-            )
-            
-            if result.get("response"):
-                await application.bot.send_message(chat_id=chat_id, text=f"⚡ {result['response']}")
+            # SQLite may wait up to busy_timeout for another process: not on the loop
+            storage.notify(await asyncio.to_thread(storage.pull))
         except Exception as e:
-            print(f"   ❌ Brain Error: {e}")
+            print(f"❌ Store refresh failed: {e}")
+
+def load_heavy():
+    """Runs in a worker thread: the imports and clients that dominate a cold boot."""
+    from app import brain as brain_module
+    import app.bot  # noqa: F401 (telegram.ext comes with it)
+    brain_module.router()
+    brain_module.engine()
+    return brain_module
 
 @app.on_event("startup")
 async def startup():
-    global ptb_app
+    global boot_task
     print("🚀 Starting ResolveAI System...")
+    if TELEGRAM_WEBHOOK_URL and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", TELEGRAM_WEBHOOK_SECRET):
+        # Without a secret anyone could POST forged updates to the webhook
+        raise RuntimeError("TELEGRAM_WEBHOOK_URL needs TELEGRAM_WEBHOOK_SECRET: "
+                           "1-256 characters from A-Z, a-z, 0-9, _ and -")
+    if not shards:
+        claim_store()  # fails the worker right away, before it takes any update
+    # Return right away so uvicorn starts answering health checks; the bot
+    # comes up in the background.
+    boot_task = asyncio.create_task(boot())
+
+async def boot():
+    global boot_error
+    try:
+        await start_bot()
+    except Exception as e:
+        boot_error = e
+        print(f"❌ Boot failed: {e}")
+        raise
+
+async def start_bot():
+    global ptb_app, brain, sync_task
+    began = time.perf_counter()
+    brain = await asyncio.to_thread(load_heavy)
+
+    from telegram.ext import Application, CommandHandler, MessageHandler, filters
+    from app.bot import start, handle_chat, set_timezone, ChatOrderedProcessor
+    from app.services.telegram_request import MeteredRequest
 
     # --- THE NETWORK FIX ---
-    t_request = HTTPXRequest(connection_pool_size=8, connect_timeout=60, read_timeout=60, write_timeout=60)
+    t_request = MeteredRequest(connection_pool_size=max(8, UPDATE_CONCURRENCY), connect_timeout=60, read_timeout=60, write_timeout=60)
     
     # Build the App
-    ptb_app = Application.builder().token(TOKEN).request(t_request).build()
+    application = (Application.builder()
+               .token(TOKEN)
+               .base_url(f"{TELEGRAM_API_BASE}/bot")
+               .request(t_request)
+               .concurrent_updates(ChatOrderedProcessor(UPDATE_CONCURRENCY))  # in order within a chat
+               .build())
     
-    # Handlers
-    conv = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
-        states={WAITING_FOR_RES: [MessageHandler(filters.TEXT & ~filters.COMMAND, save_goal)]},
-        fallbacks=[]
-    )
-    ptb_app.add_handler(conv)
-    ptb_app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_chat))
+    # Handlers (onboarding state is in the user's row, see app/bot.py, so any worker can continue it)
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("timezone", set_timezone))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_chat))
     
     # Initialize & Start
-    await ptb_app.initialize()
-    await ptb_app.start()
+    await application.initialize()
+    await application.start()
+    ptb_app = application
     
-    # Start Polling (Non-blocking)
-    asyncio.create_task(ptb_app.updater.start_polling())
+    if TELEGRAM_WEBHOOK_URL:
+        # Webhook mode: Telegram POSTs updates to telegram_webhook below
+        await ptb_app.bot.set_webhook(
+            url=TELEGRAM_WEBHOOK_URL + TELEGRAM_WEBHOOK_PATH,
+            secret_token=TELEGRAM_WEBHOOK_SECRET,
+            max_connections=100,
+        )
+        print(f"🪝 Webhook set: {TELEGRAM_WEBHOOK_URL}{TELEGRAM_WEBHOOK_PATH}")
+    else:
+        # Start Polling (Non-blocking)
+        asyncio.create_task(ptb_app.updater.start_polling())
     
-    # Scheduler
-    scheduler.add_job(
-        proactive_cycle, 
-        'interval', 
-        seconds=60, 
-        args=[ptb_app],
-        misfire_grace_time=120, 
-        coalesce=True
-    )
+    # Outbox: retries failed reminder sends and anything left from before a restart
+    OUTBOX.start(ptb_app.bot)
+
+    # Scheduler: build the heap once, then re-heap on every schedule change
+    add_listener(scheduler.reschedule)
+    if shards:
+        if not TELEGRAM_WEBHOOK_URL:
+            print("⚠️ SHARD_COUNT is set without TELEGRAM_WEBHOOK_URL: only one process may poll.")
+        scheduler.owns = shards.owns  # the heap fills as leases are won
+        shards.start()
+        sync_task = asyncio.create_task(sync_store())
+    else:
+        scheduler.load(get_all_users())
     scheduler.start()
-    print(f"✅ ResolveAI Online on Port {PORT}")
+    print(f"✅ ResolveAI Online on Port {PORT} (bot ready in {time.perf_counter() - began:.1f}s)")
+
+async def _within(awaitable, deadline, what):
+    """Awaits until `deadline` (monotonic); past it, cancels and says so."""
+    task = asyncio.ensure_future(awaitable)
+    done, _ = await asyncio.wait({task}, timeout=max(0.0, deadline - time.monotonic()))
+    if not done:
+        task.cancel()
+        print(f"⚠️ Shutdown grace ran out, cancelled {what}")
+    await asyncio.gather(task, return_exceptions=True)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stops taking updates, gives in-flight replies and reminders up to
+    SHUTDOWN_GRACE seconds, then stops every loop and flushes the store."""
+    global draining
+    draining = True
+    began = time.monotonic()
+    deadline = began + SHUTDOWN_GRACE
+    print(f"🛑 Shutting down: draining in-flight work (up to {SHUTDOWN_GRACE:.0f}s)...")
+    if boot_task and not boot_task.done():
+        boot_task.cancel()
+        await asyncio.gather(boot_task, return_exceptions=True)
+    if sync_task:
+        sync_task.cancel()
+
+    # 1. No new updates (webhook posts already get 503 via `draining`) and no
+    #    new reminder ticks, while the work already started drains below
+    await scheduler.halt()
+    if ptb_app:
+        if ptb_app.updater and ptb_app.updater.running:
+            await ptb_app.updater.stop()
+        # 2. Answer what was already received: stop() waits for running handlers
+        stopping = asyncio.ensure_future(ptb_app.stop())
+        done, _ = await asyncio.wait({stopping}, timeout=max(0.0, deadline - time.monotonic()))
+        if not done:
+            from app.bot import cancel_replies
+            print(f"⚠️ Shutdown grace ran out, cancelled {cancel_replies()} chat replies")
+            await _within(stopping, time.monotonic() + 5, "the remaining update handlers")
+    # 3. Reminder groups already firing finish or are cancelled
+    cancelled = await scheduler.stop(drain=max(0.0, deadline - time.monotonic()))
+    if cancelled:
+        print(f"⚠️ Shutdown grace ran out, cancelled {cancelled} reminder groups")
+    folds = memory.inflight()
+    if folds:
+        await _within(asyncio.gather(*folds, return_exceptions=True), deadline, "memory summaries")
+
+    # 4. Hand everything over and close
+    if shards:
+        await shards.stop()  # releases leases so another process takes the shards at once
+    await OUTBOX.stop()
+    await GUARDRAILS.stop()  # sends the last batch of traces
+    if ptb_app:
+        await ptb_app.shutdown()
+    if brain:
+        await brain.http_session.aclose()
+    storage.close()
+    print(f"👋 Shutdown complete in {time.monotonic() - began:.1f}s")
 
 @app.get("/")
 def home():
-    return {"status": "Online", "bot": "Running"}
+    """Answers from the first moment uvicorn listens, while the bot boots."""
+    if draining:
+        return {"status": "Online", "bot": "Stopping"}
+    if boot_error is not None:
+        return JSONResponse({"status": "Online", "bot": "Failed", "error": str(boot_error)}, status_code=503)
+    return {"status": "Online", "bot": "Running" if ptb_app else "Starting"}
+
+@app.post(TELEGRAM_WEBHOOK_PATH)
+async def telegram_webhook(request: Request):
+    """Webhook mode: verify Telegram's secret and queue the update for PTB."""
+    if not TELEGRAM_WEBHOOK_URL:
+        raise HTTPException(status_code=404)
+    # Bytes: compare_digest raises on non-ASCII str, and any mismatch is a 403
+    secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "").encode()
+    if not hmac.compare_digest(secret, TELEGRAM_WEBHOOK_SECRET.encode()):
+        raise HTTPException(status_code=403)
+    if ptb_app is None or draining:
+        raise HTTPException(status_code=503)  # booting or stopping: Telegram retries
+
+    from telegram import Update
+    update = Update.de_json(await request.json(), ptb_app.bot)
+    await ptb_app.update_queue.put(update)
+    return {"ok": True}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/models")
+def model_health():
+    """Per-model circuit state, call/error counters and average latency."""
+    if brain is None:
+        raise HTTPException(status_code=503)
+    return brain.ROUTER.stats()
+
+@app.get("/health/queue")
+def queue_health():
+    """LLM work queue: depth, running, drops and wait time per priority class."""
+    if brain is None:
+        raise HTTPException(status_code=503)
+    return brain.LLM_QUEUE.stats()
+
+@app.get("/health/outbox")
+def outbox_health():
+    """Reminder outbox: pending, sent and abandoned messages."""
+    return OUTBOX.stats()
 
 # --- CRITICAL MISSING PIECE ---
 if __name__ == "__main__":